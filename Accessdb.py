@@ -1,26 +1,362 @@
-import pyodbc
+import os
+import re
+import time
+from contextlib import contextmanager
+import pandas as pd
+from QueryCache import read_sql_cached
+from QueryProfiler import profile_connection
 
 #全部程式accessdb讀取程式
 
 # 預設 Access 資料庫路徑（全專案共用）
 DEFAULT_ACCESS_PATH = r'D:\113年後資料\系辦辦公相關\IEET認證\python程式\PythonIEET\PythonIEET\IEETdatabase.accdb'
 
+# 資料庫後端：access (預設) / sqlite / duckdb，可由環境變數 IEET_DB_BACKEND 切換
+DB_BACKEND = os.environ.get('IEET_DB_BACKEND', 'access').strip().lower()
+
+# 指定資料庫檔案路徑 (選填)，設定後所有程式皆使用此檔案；
+# 未設定時，非 Access 後端沿用原路徑並將副檔名換成 .sqlite / .duckdb
+DB_PATH_OVERRIDE = os.environ.get('IEET_DB_PATH')
+
+# 批次寫入每次 executemany 的筆數
+DEFAULT_CHUNK_SIZE = 1000
+
+# 分批讀取查詢結果時，每批 (fetchmany) 的筆數
+DEFAULT_ARRAYSIZE = 20000
+
+# 預先讀取既有鍵值時，IN 條件最多展開的值數量 (超過則改為讀取整張表的鍵值)
+MAX_PREFETCH_IN_VALUES = 200
+
+
+def normalize_key_value(val):
+    """將鍵值統一轉為乾淨字串 (None/NaN 轉空字串、去除空白與結尾 .0)，供記憶體內比對使用"""
+    if val is None or (isinstance(val, float) and val != val):
+        return ""
+    s = str(val).strip()
+    if s.endswith('.0'):
+        s = s[:-2]
+    return s
+
+# ==========================================
+# 資料庫後端 (Access / SQLite / DuckDB)
+# ==========================================
+class AccessBackend:
+    """Microsoft Access (ODBC)，需安裝 Access Database Engine 驅動程式 (僅限 Windows)"""
+    name = 'access'
+    file_ext = '.accdb'
+
+    def connect(self, db_path):
+        import pyodbc
+        conn_str = (
+            r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
+            rf'DBQ={db_path};'
+        )
+        return pyodbc.connect(conn_str)
+
+    def translate(self, sql):
+        return sql
+
+    def list_tables(self, conn):
+        return [t.table_name for t in conn.cursor().tables(tableType='TABLE')]
+
+    def list_columns(self, conn, table):
+        return [row.column_name for row in conn.cursor().columns(table=table)]
+
+    def list_indexes(self, conn, table):
+        """回傳 {索引名稱: [欄位, ...]} (依索引內欄位順序)"""
+        indexes = {}
+        for row in conn.cursor().statistics(table):
+            if row.index_name is None:  # 資料表統計資訊列，不是索引
+                continue
+            indexes.setdefault(row.index_name, []).append((row.ordinal_position, row.column_name))
+        return {name: [c for _, c in sorted(cols)] for name, cols in indexes.items()}
+
+
+class SQLiteBackend:
+    """內嵌 SQLite 檔案 (Python 內建，不需額外驅動程式)"""
+    name = 'sqlite'
+    file_ext = '.sqlite'
+
+    _top_pattern = re.compile(r'^\s*SELECT\s+TOP\s+(\d+)\s+(.*)$', re.IGNORECASE | re.DOTALL)
+
+    def connect(self, db_path):
+        import sqlite3
+        return _TranslatingConnection(sqlite3.connect(db_path), self.translate)
+
+    def translate(self, sql):
+        # Access 的 SELECT TOP n 改寫為 LIMIT n；@@IDENTITY 改為 last_insert_rowid()
+        m = self._top_pattern.match(sql)
+        if m:
+            sql = f"SELECT {m.group(2).rstrip().rstrip(';')} LIMIT {m.group(1)}"
+        return sql.replace('@@IDENTITY', 'last_insert_rowid()')
+
+    def list_tables(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        return [r[0] for r in cursor.fetchall()]
+
+    def list_columns(self, conn, table):
+        cursor = conn.cursor()
+        cursor.execute(f'PRAGMA table_info("{table}")')
+        return [r[1] for r in cursor.fetchall()]
+
+    def list_indexes(self, conn, table):
+        cursor = conn.cursor()
+        cursor.execute(f'PRAGMA index_list("{table}")')
+        names = [r[1] for r in cursor.fetchall()]
+        indexes = {}
+        for name in names:
+            cursor.execute(f'PRAGMA index_info("{name}")')
+            indexes[name] = [r[2] for r in sorted(cursor.fetchall())]
+        return indexes
+
+
+class DuckDBBackend(SQLiteBackend):
+    """內嵌 DuckDB 檔案 (需 pip install duckdb)，GROUP BY 等分析查詢採向量化執行"""
+    name = 'duckdb'
+    file_ext = '.duckdb'
+
+    _bracket_pattern = re.compile(r'\[([^\[\]]+)\]')
+
+    def connect(self, db_path):
+        import duckdb
+        conn = duckdb.connect(db_path)
+        conn.begin()
+        return _TranslatingConnection(conn, self.translate, share_cursor=True)
+
+    def translate(self, sql):
+        # DuckDB 不支援 [欄位] 寫法，改為 "欄位"；
+        # DuckDB 的自動編號由 sequence 產生、沒有「上一筆新增的編號」，@@IDENTITY 無法對應，直接拒絕
+        if '@@IDENTITY' in sql.upper():
+            raise ValueError(
+                "DuckDB 後端不支援 SELECT @@IDENTITY。請改用 AccessHelper.bulk_insert / upsert_many / "
+                "replace_partition 批次寫入，再以鍵值欄位查回自動編號 (參考 CoursedataRead.py 的新課程寫入)")
+        sql = super().translate(sql)
+        return self._bracket_pattern.sub(r'"\1"', sql)
+
+    def list_tables(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_type='BASE TABLE' ORDER BY table_name")
+        return [r[0] for r in cursor.fetchall()]
+
+    def list_columns(self, conn, table):
+        cursor = conn.cursor()
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name=? ORDER BY ordinal_position", (table,))
+        return [r[0] for r in cursor.fetchall()]
+
+    def list_indexes(self, conn, table):
+        cursor = conn.cursor()
+        cursor.execute("SELECT index_name, sql FROM duckdb_indexes() WHERE table_name=?", (table,))
+        indexes = {}
+        for name, sql in cursor.fetchall():
+            # 由 CREATE INDEX ... ON t (a, b) 取出欄位清單
+            cols = sql[sql.rindex('(') + 1:sql.rindex(')')] if sql and '(' in sql else ''
+            indexes[name] = [c.strip().strip('"[]') for c in cols.split(',') if c.strip()]
+        return indexes
+
+
+BACKENDS = {b.name: b for b in (AccessBackend(), SQLiteBackend(), DuckDBBackend())}
+
+
+def get_backend(name=None):
+    """依名稱 (預設為 DB_BACKEND 設定) 取得資料庫後端物件"""
+    name = (name or DB_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"不支援的資料庫後端: {name} (可用: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def resolve_db_path(db_path=DEFAULT_ACCESS_PATH, backend=None):
+    """
+    依後端設定決定實際使用的資料庫檔案路徑。
+    有設定 IEET_DB_PATH 時一律使用該路徑；否則非 Access 後端將副檔名換成對應的檔案格式。
+    """
+    if DB_PATH_OVERRIDE:
+        return os.path.abspath(DB_PATH_OVERRIDE)
+    backend = get_backend(backend)
+    root, ext = os.path.splitext(os.path.abspath(db_path))
+    if ext.lower() in ('.accdb', '.mdb') and backend.file_ext != ext.lower():
+        return root + backend.file_ext
+    return root + ext
+
+
+def db_identity(db_path=DEFAULT_ACCESS_PATH, backend=None):
+    """
+    資料庫識別字串 (後端 + 實際檔案路徑)。
+    本機快取、鍵值索引與快照狀態以此區分不同的資料庫，切換 IEET_DB_BACKEND / IEET_DB_PATH 時不會誤用別的資料庫的狀態。
+    """
+    backend = get_backend(backend)
+    return f"{backend.name}:{resolve_db_path(db_path, backend.name)}"
+
+
+def connect(db_path=DEFAULT_ACCESS_PATH, backend=None):
+    """
+    依後端設定建立資料庫連線 (取代各程式自行組 Access 連線字串)。
+    回傳的連線物件可直接交給 pd.read_sql 及 cursor().execute 使用，SQL 仍以 Access 語法撰寫。
+    所有查詢皆會記錄於查詢效能報告 (見 QueryProfiler.py)。
+    """
+    return profile_connection(get_backend(backend).connect(resolve_db_path(db_path, backend)))
+
+
+def iter_query(conn, table, columns=None, where=None, params=(), arraysize=DEFAULT_ARRAYSIZE, dtypes=None, order_by=None):
+    """
+    分批讀取資料表，每次產出一個 DataFrame (記憶體用量只與 arraysize 有關，與資料表大小無關)。
+    conn: 資料庫連線 (connect() 或 AccessHelper.conn)
+    table: 資料表名稱
+    columns: 只讀取的欄位 list，預設全部欄位
+    where: SQL WHERE 條件（不含 WHERE），於資料庫端先過濾
+    params: 條件對應的參數 tuple
+    arraysize: 每批 fetchmany 的筆數
+    dtypes: 欄位型別 dict (例如 {'成績': 'float64'})，確保每批的型別一致
+    order_by: SQL ORDER BY 欄位 (不含 ORDER BY)，需要同一組資料連續出現時使用
+    """
+    sql = f"SELECT {','.join(columns) if columns else '*'} FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+
+    cursor = conn.cursor()
+    cursor.arraysize = arraysize
+    cursor.execute(sql, params)
+    names = [d[0] for d in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(arraysize)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records([tuple(r) for r in rows], columns=names)
+            if dtypes:
+                chunk = chunk.astype(dtypes)
+            yield chunk
+    finally:
+        cursor.close()
+
+
+class _TranslatingCursor:
+    """包裝 DB-API cursor：執行前先將 Access 語法轉為目標後端語法，並容忍 pyodbc 專屬屬性"""
+
+    def __init__(self, cursor, translate, conn, shared=False):
+        self._cursor = cursor
+        self._translate = translate
+        self._conn = conn
+        self._shared = shared
+        self.fast_executemany = False
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(self._translate(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(self._translate(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        # 共用連線的 cursor 不可真的關閉 (pd.read_sql 讀完會呼叫 close)
+        if not self._shared:
+            self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TranslatingConnection:
+    """包裝 SQLite/DuckDB 連線，使其行為與 pyodbc 的 Access 連線一致"""
+
+    def __init__(self, conn, translate, share_cursor=False):
+        self._conn = conn
+        self._translate = translate
+        self._share_cursor = share_cursor  # DuckDB 的 cursor() 會開新交易，改為共用同一連線
+        self.autocommit = False
+
+    def cursor(self):
+        raw = self._conn if self._share_cursor else self._conn.cursor()
+        return _TranslatingCursor(raw, self._translate, self, shared=self._share_cursor)
+
+    def commit(self):
+        self._conn.commit()
+        if self._share_cursor:
+            self._conn.begin()
+
+    def rollback(self):
+        self._conn.rollback()
+        if self._share_cursor:
+            self._conn.begin()
+
+    def close(self):
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
 class AccessHelper:
     """
     AccessHelper 類別：提供 Access 資料庫的連線、查詢重複、插入資料等常用功能。
     """
 
-    def __init__(self, db_path=DEFAULT_ACCESS_PATH):
+    def __init__(self, db_path=DEFAULT_ACCESS_PATH, backend=None):
         """
         初始化 AccessHelper，建立資料庫連線。
         db_path: Access 資料庫檔案路徑，預設為全域 DEFAULT_ACCESS_PATH。
+        backend: 資料庫後端 ('access' / 'sqlite' / 'duckdb')，預設依 IEET_DB_BACKEND 環境變數。
         """
-        self.conn_str = (
-            r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-            rf'DBQ={db_path};'
-        )
-        self.conn = pyodbc.connect(self.conn_str)
+        self.backend = get_backend(backend)
+        self.db_path = resolve_db_path(db_path, backend)
+        self.db_id = f"{self.backend.name}:{self.db_path}"  # 同 db_identity()
+        self.conn = profile_connection(self.backend.connect(self.db_path))
         self.cursor = self.conn.cursor()
+        self._txn = None            # 目前交易狀態 (見 transaction())
+        self.last_txn_stats = None  # 最近一次交易的寫入筆數、耗時與每秒筆數
+
+    @contextmanager
+    def transaction(self, commit_every=None, report=True):
+        """
+        交易範圍 (unit of work)：範圍內 insert_row / bulk_insert / upsert_many 不再逐筆 commit。
+        用法：with db.transaction(commit_every=1000): ...
+        commit_every: 每累積 N 筆寫入就 commit 一次；None 表示範圍結束時才一次 commit (全有或全無)
+        report: 結束時是否印出寫入筆數與每秒筆數
+        發生例外時 rollback 尚未 commit 的部分並重新拋出例外。
+        巢狀呼叫時併入最外層交易，由最外層負責 commit / rollback。
+        """
+        if self._txn is not None:
+            yield self
+            return
+
+        self._txn = {'commit_every': commit_every, 'pending': 0, 'rows': 0}
+        start = time.perf_counter()
+        try:
+            yield self
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            rows = self._txn['rows']
+            self._txn = None
+            elapsed = time.perf_counter() - start
+            rate = rows / elapsed if elapsed > 0 else 0.0
+            self.last_txn_stats = {'rows': rows, 'seconds': elapsed, 'rows_per_sec': rate}
+        if report:
+            print(f"交易完成：共寫入 {rows} 筆，耗時 {elapsed:.2f} 秒 ({rate:.0f} 筆/秒)")
+
+    def _after_write(self, row_count):
+        """寫入後的 commit 處理：交易外立即 commit；交易內依 commit_every 累積後再 commit"""
+        if self._txn is None:
+            self.conn.commit()
+            return
+        self._txn['rows'] += row_count
+        self._txn['pending'] += row_count
+        commit_every = self._txn['commit_every']
+        if commit_every and self._txn['pending'] >= commit_every:
+            self.conn.commit()
+            self._txn['pending'] = 0
 
     def is_duplicate(self, table, where_clause, params):
         """
@@ -40,11 +376,12 @@ class AccessHelper:
         table: 資料表名稱
         columns: 欄位名稱 list
         values: 欄位值 tuple
+        在 transaction() 範圍外會立即 commit；範圍內則依 commit_every 批次 commit。
         """
         placeholders = ','.join(['?'] * len(columns))
         sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
         self.cursor.execute(sql, values)
-        self.conn.commit()
+        self._after_write(1)
 
     def bulk_insert(self, table, columns, rows):
         """
@@ -52,13 +389,129 @@ class AccessHelper:
         table: 資料表名稱
         columns: 欄位名稱 list
         rows: 欄位值的 list of tuple
-        使用 fast_executemany 提升效率。
+        使用 fast_executemany 提升效率；commit 方式同 insert_row。
         """
         placeholders = ','.join(['?'] * len(columns))
         sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({placeholders})"
         self.cursor.fast_executemany = True  # 提升批次插入效率
         self.cursor.executemany(sql, rows)
-        self.conn.commit()
+        self._after_write(len(rows))
+
+    def replace_partition(self, table, partition_columns, partition_values, columns, rows, dry_run=False):
+        """
+        以分割區為單位取代資料：刪除分割區內的舊資料後批次插入新資料，於同一個交易內完成
+        (取代逐筆查重再 UPDATE / INSERT)。
+        partition_columns: 分割區欄位 list (例如 ['學年度', '學期'])
+        partition_values: 分割區的值 tuple
+        columns: 新資料的欄位名稱 list
+        rows: 新資料的 list of tuple (應全部屬於該分割區)
+        dry_run: True 時只計算會刪除與新增的筆數，不寫入
+        回傳 {'deleted': 刪除筆數, 'inserted': 新增筆數}
+        """
+        where = ' AND '.join(f'[{c}]=?' for c in partition_columns)
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", tuple(partition_values))
+        deleted = self.cursor.fetchone()[0]
+        if dry_run:
+            return {'deleted': deleted, 'inserted': len(rows)}
+        with self.transaction(report=False):
+            self.cursor.execute(f"DELETE FROM {table} WHERE {where}", tuple(partition_values))
+            if rows:
+                self.bulk_insert(table, columns, rows)
+        return {'deleted': deleted, 'inserted': len(rows)}
+
+    def iter_query(self, table, columns=None, where=None, params=(), arraysize=DEFAULT_ARRAYSIZE, dtypes=None,
+                   order_by=None):
+        """
+        分批讀取資料表，逐批產出 DataFrame，參數說明同模組函式 iter_query。
+        適合 STscore 這類大型資料表的累計運算，避免一次載入整張表。
+        """
+        return iter_query(self.conn, table, columns, where, params, arraysize, dtypes, order_by)
+
+    def read_sql_cached(self, sql, tables=None):
+        """
+        讀取查詢結果並快取為 Parquet (見 QueryCache.py)。
+        資料表與資料庫檔案未變動時直接讀取本機快取，跳過 ODBC 讀取。
+        tables: 查詢涉及的資料表 list，預設由 SQL 自動判斷
+        """
+        return read_sql_cached(self.conn, sql, tables, db_id=self.db_id, db_path=self.db_path)
+
+    def upsert_many(self, table, key_columns, columns, rows, on_conflict="skip", chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        以集合方式批次寫入多筆資料 (取代逐筆 is_duplicate + insert_row)。
+        table: 資料表名稱
+        key_columns: 判斷重複用的鍵欄位 list (須包含於 columns)
+        columns: 欄位名稱 list
+        rows: 欄位值的 list of tuple (順序與 columns 一致)
+        on_conflict: "skip" 遇到重複略過；"update" 遇到重複以新值更新非鍵欄位 (columns 只有鍵欄位時沒有可更新的值，一律計為略過)
+        chunk_size: 每次 executemany 的筆數
+        流程：一次查詢取回既有鍵值 -> 記憶體內比對 -> 分批 executemany，全部於同一交易內完成
+        (若在 transaction() 範圍內呼叫，則併入該交易並依其 commit_every 設定 commit)。
+        回傳 dict：{'inserted': 新增筆數, 'skipped': 略過筆數, 'updated': 更新筆數}
+        """
+        if on_conflict not in ("skip", "update"):
+            raise ValueError(f"on_conflict 只接受 'skip' 或 'update'，收到: {on_conflict}")
+
+        key_idx = [columns.index(k) for k in key_columns]
+        value_idx = [i for i in range(len(columns)) if i not in key_idx]
+        update_existing = on_conflict == "update" and bool(value_idx)  # 只有鍵欄位時沒有可更新的值，視同略過
+        rows = [tuple(r) for r in rows]
+        existing = self._fetch_existing_keys(table, key_columns, rows, key_idx)
+
+        to_insert = []
+        to_update = []
+        skipped = 0
+        seen = set()
+        for row in rows:
+            key = tuple(normalize_key_value(row[i]) for i in key_idx)
+            if key in existing or key in seen:
+                if update_existing:
+                    to_update.append(row)
+                else:
+                    skipped += 1
+                continue
+            seen.add(key)
+            to_insert.append(row)
+
+        insert_sql = f"INSERT INTO {table} ({','.join(columns)}) VALUES ({','.join(['?'] * len(columns))})"
+        update_sql = (
+            f"UPDATE {table} SET {', '.join(f'{columns[i]}=?' for i in value_idx)} "
+            f"WHERE {' AND '.join(f'{k}=?' for k in key_columns)}"
+        )
+        update_params = [tuple(row[i] for i in value_idx) + tuple(row[i] for i in key_idx) for row in to_update]
+
+        with self.transaction(report=False):
+            self.cursor.fast_executemany = True
+            for i in range(0, len(to_insert), chunk_size):
+                chunk = to_insert[i:i + chunk_size]
+                self.cursor.executemany(insert_sql, chunk)
+                self._after_write(len(chunk))
+            for i in range(0, len(update_params), chunk_size):
+                chunk = update_params[i:i + chunk_size]
+                self.cursor.executemany(update_sql, chunk)
+                self._after_write(len(chunk))
+
+        return {'inserted': len(to_insert), 'skipped': skipped, 'updated': len(to_update)}
+
+    def _fetch_existing_keys(self, table, key_columns, rows, key_idx):
+        """
+        一次查詢取回資料表中與本批資料相關的既有鍵值，回傳正規化後的 tuple set。
+        若第一個鍵欄位的相異值不多，僅以 IN 條件讀取該範圍；否則讀取整張表的鍵值。
+        """
+        first_values = {}
+        for row in rows:
+            v = row[key_idx[0]]
+            first_values.setdefault(normalize_key_value(v), v)
+
+        sql = f"SELECT {','.join(key_columns)} FROM {table}"
+        params = ()
+        if 0 < len(first_values) <= MAX_PREFETCH_IN_VALUES:
+            sql += f" WHERE {key_columns[0]} IN ({','.join(['?'] * len(first_values))})"
+            params = tuple(first_values.values())
+        elif not first_values:
+            return set()
+
+        self.cursor.execute(sql, params)
+        return {tuple(normalize_key_value(v) for v in r) for r in self.cursor.fetchall()}
 
     def close(self):
         """
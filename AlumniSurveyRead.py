@@ -1,10 +1,14 @@
+import argparse
 import pandas as pd
 import os
 from Accessdb import AccessHelper
+from ImportManifest import check_import, record_import
+from IngestEngine import IngestEngine, iter_frame_batches
+from DataValidation import split_valid_rows
 
 # 畢業系友流向問卷匯入程式
 
-def import_alumni_survey():
+def import_alumni_survey(force=False):
     # 1. 設定檔案路徑
     # 這裡假設您將檔案放在 "input_files\畢業系友流向問券" 資料夾下
     # 請修改檔名以符合您實際放入的檔案
@@ -21,6 +25,13 @@ def import_alumni_survey():
         print(f"預期路徑: {data_path}")
         return
 
+    # 同一份檔案 (內容未變動) 已匯入過就不再讀檔比對
+    db = AccessHelper()
+    skip, content_hash = check_import(db.conn, data_path, table_name, force=force, backend=db.backend.name)
+    if skip:
+        db.close()
+        return
+
     # 2. 自動判斷副檔名並讀取
     ext = os.path.splitext(data_path)[1].lower()
     df = pd.DataFrame()
@@ -39,9 +50,11 @@ def import_alumni_survey():
                 df = pd.read_csv(data_path, encoding='cp950')
         else:
             print(f"不支援的檔案格式: {ext}")
+            db.close()
             return
     except Exception as e:
         print(f"讀取檔案發生嚴重錯誤: {e}")
+        db.close()
         return
 
     # 3. 定義欄位對照表 (Key: 題目關鍵字, Value: 資料庫欄位)
@@ -97,7 +110,6 @@ def import_alumni_survey():
     db_data = db_data.where(pd.notnull(db_data), None)
 
     # 5. 寫入 Access
-    db = AccessHelper()
     columns = list(db_data.columns)
     
     repeat_count = 0
@@ -105,28 +117,30 @@ def import_alumni_survey():
     error_count = 0
 
     print(f"開始寫入資料庫 [{table_name}] ...")
-    
-    for idx, row in db_data.iterrows():
-        try:
-            # 防重複機制：使用 'id' (填寫順序) 
-            if row['id'] is None:
-                continue
-                
-            where = "id=?"
-            params = (row['id'],)
-            
-            if db.is_duplicate(table_name, where, params):
-                repeat_count += 1
-                continue
-            
-            # 插入資料
-            values = tuple(row[col] for col in columns)
-            db.insert_row(table_name, columns, values)
-            import_count += 1
-            
-        except Exception as e:
-            error_count += 1
-            print(f"第 {idx+1} 筆寫入錯誤: {e}")
+
+    # 整批檢核 (id 必填、問卷選項)，不合格的列寫入拒收檔；以 'id' (填寫順序) 防重複
+    db_data = split_valid_rows(db_data, table_name, data_path)
+
+    # 管線寫入：生產者逐批將 NaN 轉為 None，寫入者逐批以集合方式比對後寫入 (整份檔案同一交易)
+    def produce_batches():
+        for chunk in iter_frame_batches(db_data):
+            yield [tuple(None if pd.isna(v) else v for v in row) for row in chunk.itertuples(index=False, name=None)]
+
+    result = {'inserted': 0, 'skipped': 0, 'updated': 0}
+
+    def write_batch(batch):
+        for k, v in db.upsert_many(table_name, ['id'], columns, batch).items():
+            result[k] += v
+
+    try:
+        with db.transaction(report=False):
+            IngestEngine(write_batch, label=table_name).run(produce_batches())
+        repeat_count = result['skipped']
+        import_count = result['inserted']
+        record_import(db.conn, data_path, table_name, import_count, content_hash, backend=db.backend.name)
+    except Exception as e:
+        error_count = len(db_data)
+        print(f"批次寫入錯誤 (本次未寫入任何資料): {e}")
 
     db.close()
     
@@ -139,9 +153,13 @@ def import_alumni_survey():
     print("="*40)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="畢業系友流向問卷匯入")
+    parser.add_argument('--force', action='store_true', help="檔案已匯入過仍強制重新匯入")
+    args = parser.parse_args()
+
     # 確保資料夾存在，若不存在自動建立 (方便使用者)
     if not os.path.exists(r'input_files\畢業系友流向問券'):
         os.makedirs(r'input_files\畢業系友流向問券')
         print(r"已建立資料夾: input_files\畢業系友流向問券，請將檔案放入後再執行。")
     else:
-        import_alumni_survey()
\ No newline at end of file
+        import_alumni_survey(force=args.force)
\ No newline at end of file
@@ -0,0 +1,79 @@
+from datetime import datetime
+import pandas as pd
+from Accessdb import get_backend
+
+# 異動紀錄 (change log)：匯入程式每寫入一批資料，就在同一個交易內記錄這批資料涉及的分割區
+# (例如 STscore 的 學年度+學期+課號)；分析程式的增量模式只重新計算紀錄中的分割區，處理完再清除紀錄
+# 新增一個學期的成績後，重新分析的成本只與該學期有關，不必重算全部歷史資料
+
+# 各來源資料表對應的紀錄表與分割區鍵值
+CHANGE_LOGS = {
+    'STscore': {'table': 'STscoreChangeLog', 'key_columns': ['學年度', '學期', '課號']},
+}
+
+# 各後端的文字與時間欄位型別 (資料表不存在時自動建立)
+_COLUMN_TYPES = {
+    'access': ('TEXT(255)', 'DATETIME'),
+    'sqlite': ('TEXT', 'TEXT'),
+    'duckdb': ('VARCHAR', 'TIMESTAMP'),
+}
+
+
+def _spec(source_table):
+    spec = CHANGE_LOGS[source_table]
+    return spec['table'], spec['key_columns']
+
+
+def ensure_changelog_table(conn, source_table, backend=None):
+    """紀錄表不存在時依後端建立 (DDL 會 commit，請在寫入交易開始前呼叫)"""
+    backend = get_backend(backend)
+    log_table, key_columns = _spec(source_table)
+    if log_table.lower() in (t.lower() for t in backend.list_tables(conn)):
+        return
+    text_type, time_type = _COLUMN_TYPES[backend.name]
+    cols = ', '.join(f'[{c}] {text_type}' for c in key_columns)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE {log_table} ({cols}, logged_at {time_type})")
+    conn.commit()
+
+
+def log_partitions(cursor, source_table, partitions, backend=None):
+    """
+    記錄異動的分割區 (不 commit，與資料寫入同一個交易)。
+    cursor: 寫入資料用的 cursor
+    partitions: 分割區鍵值的 list of tuple (順序同 CHANGE_LOGS 的 key_columns)
+    """
+    if not partitions:
+        return
+    log_table, key_columns = _spec(source_table)
+    logged_at = datetime.now().replace(microsecond=0)
+    if get_backend(backend).name == 'sqlite':
+        logged_at = logged_at.isoformat(' ')  # sqlite3 不再內建 datetime 轉換
+    placeholders = ','.join(['?'] * (len(key_columns) + 1))
+    cursor.executemany(
+        f"INSERT INTO {log_table} ({', '.join(f'[{c}]' for c in key_columns)}, logged_at) VALUES ({placeholders})",
+        [tuple(p) + (logged_at,) for p in partitions]
+    )
+
+
+def dirty_partitions(conn, source_table, backend=None):
+    """讀取待重新計算的分割區 (不重複)，回傳 DataFrame (欄位為分割區鍵值)"""
+    ensure_changelog_table(conn, source_table, backend)
+    log_table, key_columns = _spec(source_table)
+    cols = ', '.join(f'[{c}]' for c in key_columns)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT DISTINCT {cols} FROM {log_table}")
+    return pd.DataFrame.from_records([tuple(r) for r in cursor.fetchall()], columns=key_columns)
+
+
+def clear_partitions(cursor, source_table, partitions=None):
+    """
+    清除已處理的分割區紀錄 (不 commit，與分析結果寫入同一個交易)。
+    partitions: 分割區鍵值的 list of tuple；None 表示清除全部 (完整重新計算後)
+    """
+    log_table, key_columns = _spec(source_table)
+    if partitions is None:
+        cursor.execute(f"DELETE FROM {log_table}")
+        return
+    where = ' AND '.join(f'[{c}]=?' for c in key_columns)
+    cursor.executemany(f"DELETE FROM {log_table} WHERE {where}", [tuple(p) for p in partitions])
@@ -1,34 +1,56 @@
-import pyodbc
+import argparse
 import os
+import time
+from Accessdb import connect, get_backend, resolve_db_path
 
 #資料庫結構檢測
 # 資料庫路徑
 db_path = 'IEETdatabase.accdb'
 
+# 各匯入/分析程式比對重複資料時使用的查詢鍵 (資料表 -> 欄位)
+# 沒有對應的複合索引時，每次比對都是整張表掃描
+LOOKUP_KEYS = {
+    'STscore':             ['學年度', '學期', '課號', '學號'],
+    'STscoreAnalyze':      ['學年度', '學期', '課號', '分數區間'],
+    'CourseScoreProfile':  ['學年度', '學期', '課號'],
+    'LeavDepUdata':        ['uid', 'sem', 'sqnum'],
+    'LeavDepGdata':        ['uid', 'sem', 'sqnum'],
+    'LDUdataAnalyze':      ['sem', 'qid'],
+    'LDGdataAnalyze':      ['sem', 'qid'],
+    'LDTabulationState':   ['source', 'sem'],
+    'Questionnaire':       ['學年', '學期', '對象', '欄位序號', '題型'],
+    'Courses':             ['academic_year', 'semester', 'dept_code', 'course_code'],
+    'Course_SDGs':         ['course_id'],
+    'Course_Competencies': ['course_id'],
+    'GradRankU':           ['StudentID', 'AcademicYear', 'Semester', 'Class'],
+    'GradRankG':           ['StudentID', 'AcademicYear', 'Semester'],
+    'AlumniSurvey':        ['id'],
+    'EmployerSurvey':      ['id'],
+}
+
+# 計時比對查詢時重複執行的次數
+PROBE_REPEAT = 20
+
 def check_schema():
-    if not os.path.exists(db_path):
-        print(f"找不到資料庫檔案: {db_path}")
+    full_db_path = resolve_db_path(db_path)
+    if not os.path.exists(full_db_path):
+        print(f"找不到資料庫檔案: {full_db_path}")
         return
 
-    full_db_path = os.path.abspath(db_path)
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        rf'DBQ={full_db_path};'
-    )
+    backend = get_backend()
 
     try:
-        conn = pyodbc.connect(conn_str)
-        cursor = conn.cursor()
+        conn = connect(db_path)
         
         # 取得所有資料表
-        tables = [t.table_name for t in cursor.tables(tableType='TABLE')]
+        tables = backend.list_tables(conn)
         
-        print(f"=== 資料庫 {db_path} 結構檢測 ===")
+        print(f"=== 資料庫 {full_db_path} 結構檢測 ({backend.name}) ===")
         
         for table in tables:
             print(f"\n[資料表: {table}]")
             # 取得該表的所有欄位
-            columns = [row.column_name for row in cursor.columns(table=table)]
+            columns = backend.list_columns(conn, table)
             print("  欄位清單:", columns)
             
             # 特別檢查 Courses 表的關鍵欄位
@@ -46,5 +68,91 @@ def check_schema():
     except Exception as e:
         print(f"讀取資料庫失敗: {e}")
 
+def index_covers(index_cols, key_cols):
+    """索引的前 N 個欄位 (N = 查詢鍵欄位數) 恰好是查詢鍵時，等值比對可直接使用該索引"""
+    return len(index_cols) >= len(key_cols) and set(index_cols[:len(key_cols)]) == set(key_cols)
+
+def time_probe(conn, table, key_cols):
+    """以資料表中的一組實際鍵值重複執行比對查詢，回傳平均毫秒數 (資料表為空時回傳 None)"""
+    cursor = conn.cursor()
+    cols = ', '.join(f'[{c}]' for c in key_cols)
+    cursor.execute(f"SELECT TOP 1 {cols} FROM [{table}]")
+    sample = cursor.fetchone()
+    if sample is None:
+        return None
+
+    where = ' AND '.join(f'[{c}]=?' for c in key_cols)
+    sql = f"SELECT COUNT(*) FROM [{table}] WHERE {where}"
+    start = time.perf_counter()
+    for _ in range(PROBE_REPEAT):
+        cursor.execute(sql, tuple(sample))
+        cursor.fetchone()
+    return (time.perf_counter() - start) / PROBE_REPEAT * 1000
+
+def advise_indexes(create=False):
+    """
+    索引建議：檢查各查詢鍵是否已有對應的複合索引，列出缺少的索引。
+    create=True 時建立缺少的索引，並比較建立前後的比對查詢耗時。
+    """
+    full_db_path = resolve_db_path(db_path)
+    if not os.path.exists(full_db_path):
+        print(f"找不到資料庫檔案: {full_db_path}")
+        return
+
+    backend = get_backend()
+    conn = connect(db_path)
+    tables = set(backend.list_tables(conn))
+
+    print(f"\n=== 索引建議 ({backend.name}) ===")
+    missing = []
+    for table, key_cols in LOOKUP_KEYS.items():
+        if table not in tables:
+            print(f"  [SKIP] {table}: 資料表不存在")
+            continue
+        columns = backend.list_columns(conn, table)
+        absent = [c for c in key_cols if c not in columns]
+        if absent:
+            print(f"  [SKIP] {table}: 找不到欄位 {absent}")
+            continue
+
+        indexes = backend.list_indexes(conn, table)
+        covering = [name for name, cols in indexes.items() if index_covers(cols, key_cols)]
+        if covering:
+            print(f"  [OK] {table}({', '.join(key_cols)}) 已有索引 {covering[0]}")
+        else:
+            print(f"  [MISSING] {table}({', '.join(key_cols)}) 沒有對應索引，比對查詢會整張表掃描")
+            missing.append((table, key_cols))
+
+    if not missing:
+        print("所有查詢鍵皆已有索引。")
+    elif not create:
+        print(f"\n共缺少 {len(missing)} 個索引，加上 --create 參數即可建立。")
+    else:
+        print(f"\n開始建立 {len(missing)} 個索引...")
+        cursor = conn.cursor()
+        for table, key_cols in missing:
+            index_name = f"idx_{table}_lookup"
+            before = time_probe(conn, table, key_cols)
+            cols = ', '.join(f'[{c}]' for c in key_cols)
+            try:
+                cursor.execute(f"CREATE INDEX [{index_name}] ON [{table}] ({cols})")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"  [FAIL] {index_name}: {e}")
+                continue
+            after = time_probe(conn, table, key_cols)
+            if before is None:
+                print(f"  [CREATED] {index_name} (資料表為空，未計時)")
+            else:
+                print(f"  [CREATED] {index_name}: 比對查詢 {before:.2f} ms -> {after:.2f} ms")
+
+    conn.close()
+
 if __name__ == "__main__":
-    check_schema()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="資料庫結構檢測與索引建議")
+    parser.add_argument('--create', action='store_true', help="建立缺少的查詢鍵索引")
+    args = parser.parse_args()
+
+    check_schema()
+    advise_indexes(create=args.create)
\ No newline at end of file
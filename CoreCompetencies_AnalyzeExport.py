@@ -59,7 +59,7 @@ FROM Course_Matrix AS M
 INNER JOIN Courses AS C ON M.course_id = C.id
 WHERE M.course_score_AVG IS NOT NULL
 """
-df_matrix_all = pd.read_sql(sql, db.conn)
+df_matrix_all = db.read_sql_cached(sql)
 
 # 清理 dept_code 資料 (去除空白)
 if not df_matrix_all.empty:
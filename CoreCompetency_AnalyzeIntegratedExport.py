@@ -286,15 +286,15 @@ def export_integrated_report(df_survey, df_grade, filename_prefix):
 # 4. 主程式執行
 # ==========================================
 print("讀取資料庫...")
-df_u_survey = pd.read_sql("SELECT * FROM LDUdataAnalyze", db.conn)
-df_g_survey = pd.read_sql("SELECT * FROM LDGdataAnalyze", db.conn)
+df_u_survey = db.read_sql_cached("SELECT * FROM LDUdataAnalyze")
+df_g_survey = db.read_sql_cached("SELECT * FROM LDGdataAnalyze")
 
 sql_matrix = """
 SELECT M.*, C.dept_code 
 FROM Course_Matrix AS M
 INNER JOIN Courses AS C ON M.course_id = C.id
 """
-df_matrix_all = pd.read_sql(sql_matrix, db.conn)
+df_matrix_all = db.read_sql_cached(sql_matrix)
 if not df_matrix_all.empty:
     df_matrix_all['dept_code'] = df_matrix_all['dept_code'].astype(str).str.strip()
 
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from Accessdb import get_backend, iter_query
+from ScoreDistribution import BIN_SCHEMES, bucket_codes
+from DataNormalize import clean_key
+
+# 課程成績概況 (course score profile)：每門課 (學年度, 學期, 課號) 一列，
+# 以一次向量化 groupby 算出人數、平均、中位數、標準差、P10/P25/P75/P90、及格率、退選人數與十分一段的分數分布
+# 由 STscoreAnalyze 在讀取 STscore 的同一次掃描中寫入；Course_Matrix_Builder 直接讀取這張表的平均分數，
+# 不再自行掃描 STscore、也不再有另一套清洗規則
+
+PROFILE_TABLE = 'CourseScoreProfile'
+PROFILE_KEYS = ['學年度', '學期', '課號']
+PROFILE_COLUMNS = PROFILE_KEYS + [
+    '課程名稱', '人數', '平均分數', '中位數', '標準差', 'P10', 'P25', 'P75', 'P90', '及格率', '退選人數', '分數分布'
+]
+PASS_SCORE = 60
+WITHDRAW_SCORE = 999
+WITHDRAW_MARK = '退選'
+_PERCENTILES = {'P10': 0.10, 'P25': 0.25, 'P75': 0.75, 'P90': 0.90}
+
+# 各後端建立概況表的 SQL (資料表不存在時自動建立)
+_COLUMN_TYPES = {
+    'access': ('TEXT(255)', 'LONG', 'DOUBLE'),
+    'sqlite': ('TEXT', 'INTEGER', 'REAL'),
+    'duckdb': ('VARCHAR', 'BIGINT', 'DOUBLE'),
+}
+_INT_COLUMNS = ['人數', '退選人數']
+_TEXT_COLUMNS = PROFILE_KEYS + ['課程名稱', '分數分布']
+
+
+def ensure_profile_table(conn, backend=None):
+    """概況表不存在時依後端建立"""
+    backend = get_backend(backend)
+    if PROFILE_TABLE.lower() in (t.lower() for t in backend.list_tables(conn)):
+        return
+    text_type, int_type, float_type = _COLUMN_TYPES[backend.name]
+    cols = ', '.join(
+        f"[{c}] {text_type if c in _TEXT_COLUMNS else int_type if c in _INT_COLUMNS else float_type}"
+        for c in PROFILE_COLUMNS
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE {PROFILE_TABLE} ({cols})")
+    conn.commit()
+
+
+def profile_scores(df):
+    """
+    計算課程成績概況。
+    df: STscore 的資料列 (需含 學年度、學期、課號、課程名稱、成績、等第成績，包含退選的列)
+    規則：成績 999 或等第成績為「退選」者計入退選人數；其餘成績非空值者為有效成績，統計值皆以有效成績計算
+    回傳欄位同 PROFILE_COLUMNS 的 DataFrame (鍵值為字串；只有一人時標準差為 NaN)
+    """
+    if df.empty:
+        return pd.DataFrame(columns=PROFILE_COLUMNS)
+    df = df[df[PROFILE_KEYS].notna().all(axis=1)]
+    scores = df['成績'].astype('float64')
+    withdrawn = (scores == WITHDRAW_SCORE) | (df['等第成績'].astype(object).fillna('').astype(str).str.strip() == WITHDRAW_MARK)
+    valid = ~withdrawn & scores.notna()
+
+    keys = [df[c] for c in PROFILE_KEYS]
+    out = pd.DataFrame({
+        '課程名稱': df['課程名稱'].groupby(keys).first(),
+        '退選人數': withdrawn.groupby(keys).sum(),
+    })
+
+    # 有效成績：同一個 groupby 算出各項統計
+    valid_scores = scores[valid]
+    grouped = valid_scores.groupby([k[valid] for k in keys])
+    stats = grouped.agg(['count', 'mean', 'median', 'std'])
+    stats.columns = ['人數', '平均分數', '中位數', '標準差']
+    if len(valid_scores):
+        quantiles = grouped.quantile(list(_PERCENTILES.values())).unstack()
+        quantiles.columns = list(_PERCENTILES)
+    else:  # 整個學期都是退選 (沒有有效成績)
+        quantiles = pd.DataFrame(index=stats.index, columns=list(_PERCENTILES), dtype='float64')
+    stats = stats.join(quantiles)
+    stats['及格率'] = (valid_scores >= PASS_SCORE).groupby([k[valid] for k in keys]).mean()
+    out = out.join(stats)
+
+    # 十分一段的分數分布 (與 STscoreAnalyze 的分數區間相同)，存成以逗號分隔的人數
+    labels = BIN_SCHEMES['ten']['labels']
+    group_index = out.index.get_indexer(pd.MultiIndex.from_arrays([k[valid] for k in keys]))
+    codes = bucket_codes(valid_scores.to_numpy(), 'ten')
+    in_bin = codes >= 0
+    histogram = np.bincount(group_index[in_bin] * len(labels) + codes[in_bin],
+                            minlength=len(out) * len(labels)).reshape(len(out), len(labels))
+    out['分數分布'] = [','.join(map(str, row)) for row in histogram]
+
+    out['人數'] = out['人數'].fillna(0).astype('int64')
+    out['退選人數'] = out['退選人數'].astype('int64')
+    out = out.reset_index()
+    out.columns = PROFILE_KEYS + list(out.columns[len(PROFILE_KEYS):])
+    for col in PROFILE_KEYS:
+        out[col] = out[col].astype(str)
+    return out[PROFILE_COLUMNS]
+
+
+def read_profile(conn, columns=None):
+    """讀取課程成績概況 (預設全部欄位)；概況表不存在時回傳 None"""
+    backend = get_backend()
+    if PROFILE_TABLE.lower() not in (t.lower() for t in backend.list_tables(conn)):
+        return None
+    columns = columns or PROFILE_COLUMNS
+    frames = list(iter_query(conn, PROFILE_TABLE, columns=[f'[{c}]' for c in columns]))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def semester_keys(df, semester_cols=('學年度', '學期')):
+    """
+    每列的學期鍵值，正規化為字串 tuple (例如 ('113', '1'))。
+    STscore、異動紀錄、分析結果與概況表的學年度 / 學期欄位型別可能不同 (文字或整數)，比對前一律先轉換。
+    """
+    return list(zip(*(clean_key(df[c]) for c in semester_cols)))
+
+
+def iter_semester_frames(chunks, semester_cols=('學年度', '學期')):
+    """
+    將依學期排序 (ORDER BY 學年度, 學期) 分批讀取的資料重新切成每學期一個 DataFrame。
+    中位數、百分位數需要整門課的成績，一次只在記憶體保留一個學期。
+    """
+    semester_cols = list(semester_cols)
+    pending = []  # 目前學期尚未輸出的資料
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        keys = chunk[semester_cols]
+        starts = np.flatnonzero((keys != keys.shift()).any(axis=1).to_numpy())  # 每個學期在本批的起始位置
+        for start, end in zip(starts, list(starts[1:]) + [len(chunk)]):
+            part = chunk.iloc[start:end]
+            if pending and tuple(pending[-1].iloc[-1][semester_cols]) != tuple(part.iloc[0][semester_cols]):
+                yield pd.concat(pending, ignore_index=True)
+                pending = []
+            pending.append(part)
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
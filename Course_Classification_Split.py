@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from ExcelCache import read_excel_cached
 
 # ==========================================
 # 檔案路徑設定
@@ -105,7 +106,7 @@ def generate_split_classification_list():
 
     print("讀取成績資料檔中...")
     try:
-        df = pd.read_excel(input_file)
+        df = read_excel_cached(input_file)
     except Exception as e:
         print(f"讀取失敗：{e}")
         return
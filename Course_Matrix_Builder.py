@@ -1,7 +1,12 @@
-import pyodbc
+import numpy as np
 import pandas as pd
 import os
 import warnings
+from Accessdb import connect, resolve_db_path, iter_query
+from DataNormalize import to_int, to_float, clean_key, to_db_values
+from CourseScoreProfile import (PROFILE_TABLE, PROFILE_KEYS, PROFILE_COLUMNS, read_profile, profile_scores,
+                                iter_semester_frames, semester_keys)
+from ChangeLog import dirty_partitions
 
 # 忽略 SQLAlchemy 的警告
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -47,66 +52,105 @@ peo_rules = {
     'PEO_Global': [4, 5]
 }
 
+# 能力描述開頭的全形數字對照 (１~５ -> 1~5)
+FULLWIDTH_DIGITS = str.maketrans('１２３４５', '12345')
+SMC_COLUMNS = [f'smc_{i}' for i in range(11)]
+
 # ==========================================
 # 2. 資料庫連線
 # ==========================================
 def get_db_connection():
-    full_db_path = os.path.abspath(db_path)
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        rf'DBQ={full_db_path};'
-    )
-    return pyodbc.connect(conn_str)
+    # 依 IEET_DB_BACKEND 設定連線 (預設 Access)
+    return connect(db_path)
 
 # ==========================================
 # 3. 功能模組
 # ==========================================
 
+def profile_from_scores(conn, semesters=None):
+    """
+    以 CourseScoreProfile 相同的計算規則，依學期分批讀取 STscore 計算課程成績概況 (不寫入資料庫)。
+    semesters: 只計算指定的 [(學年度, 學期), ...]；None 表示全部學期
+    """
+    columns = ['[學年度]', '[學期]', '[課號]', '[課程名稱]', '[成績]', '[等第成績]']
+    queries = [(None, ())] if semesters is None else [("[學年度]=? AND [學期]=?", tuple(s)) for s in semesters]
+    parts = []
+    for where, params in queries:
+        chunks = iter_query(conn, 'STscore', columns=columns, where=where, params=params, order_by="[學年度], [學期]")
+        parts += [profile_scores(df_semester) for df_semester in iter_semester_frames(chunks)]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=PROFILE_COLUMNS)
+
+
+def load_course_profiles(conn):
+    """
+    讀取課程成績概況 (CourseScoreProfile，由 STscoreAnalyze 在分析成績時一併寫入)。
+    概況表不存在或沒有資料時 (尚未執行 STscoreAnalyze)，改以相同的計算規則依學期分批讀取 STscore 計算，不寫入資料庫。
+    以下學期的概況同樣改由 STscore 重新計算，其餘學期沿用概況表：
+    - STscore 異動紀錄中還有尚未重新分析的學期 (匯入後尚未執行 STscoreAnalyze，概況已過期)
+    - STscore 有成績、概況表卻沒有資料的學期 (例如升級前已分析過的資料庫，概況表只有之後增量分析的學期)
+    """
+    df_profile = read_profile(conn, columns=PROFILE_KEYS + ['人數', '平均分數'])
+    if df_profile is None or df_profile.empty:
+        print(f"提示：{PROFILE_TABLE} 沒有資料 (請先執行 STscoreAnalyze)，改為直接由 STscore 計算。")
+        return profile_from_scores(conn)
+
+    # STscore 現有的學期 (正規化鍵值 -> 資料庫中的原始值，查詢時使用原始值)
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT [學年度], [學期] FROM STscore")
+    df_semesters = pd.DataFrame.from_records([tuple(r) for r in cursor.fetchall()], columns=['學年度', '學期'])
+    score_semesters = dict(zip(semester_keys(df_semesters), df_semesters.itertuples(index=False, name=None)))
+
+    profile_keys = pd.Series(semester_keys(df_profile), index=df_profile.index, dtype=object)
+    dirty = set(semester_keys(dirty_partitions(conn, 'STscore')))
+    missing = set(score_semesters) - set(profile_keys)
+    if not dirty and not missing:
+        return df_profile
+
+    if dirty:
+        print(f"提示：STscore 有 {len(dirty)} 個學期的異動尚未重新分析 ({PROFILE_TABLE} 已過期，"
+              f"請執行 STscoreAnalyze --incremental)，這些學期改為直接由 STscore 計算。")
+    if missing - dirty:
+        print(f"提示：{PROFILE_TABLE} 缺少 {len(missing - dirty)} 個學期的資料 (請執行 STscoreAnalyze 完整重新計算)，"
+              f"這些學期改為直接由 STscore 計算。")
+    # 去掉過期的學期後接上重新計算的結果 (STscore 已沒有成績的學期只去掉，不重新計算)
+    stale = dirty | missing
+    semesters = [score_semesters[key] for key in sorted(stale) if key in score_semesters]
+    fresh = profile_from_scores(conn, semesters)[PROFILE_KEYS + ['人數', '平均分數']]
+    return pd.concat([df_profile[~profile_keys.isin(stale)], fresh], ignore_index=True)
+
+
 def calculate_course_averages(conn):
     """
-    從 STscore 計算每門課的平均分
-    規則：排除 '退選' 與 分數 999
+    取得每門課的平均分 (課程成績概況的平均分數)
+    規則：排除 '退選' 與 分數 999 (見 CourseScoreProfile.profile_scores)
     """
-    print("正在計算各課程平均分數 (排除退選)...")
-    
-    # 讀取成績資料
-    sql = "SELECT [學年度], [學期], [課號], [成績], [等第成績] FROM STscore"
+    print("正在讀取各課程平均分數 (排除退選)...")
+
     try:
-        df_score = pd.read_sql(sql, conn)
+        df_profile = load_course_profiles(conn)
     except Exception as e:
-        print(f"讀取 STscore 失敗: {e}")
-        return pd.DataFrame() 
+        print(f"讀取課程成績概況失敗: {e}")
+        return pd.DataFrame()
 
-    # 資料清洗
-    df_score['成績'] = pd.to_numeric(df_score['成績'], errors='coerce')
-    
-    # 排除無效成績 (999 或 退選)
-    # 注意：這裡將所有相關欄位轉為字串再去除空白，確保比對準確
-    df_valid = df_score[
-        (df_score['成績'] != 999) & 
-        (df_score['等第成績'].astype(str).str.strip() != '退選') &
-        (df_score['成績'].notna())
-    ].copy()
-
-    if len(df_valid) == 0:
+    # 只有退選、沒有有效成績的課程沒有平均分數
+    df_valid = df_profile[to_int(df_profile['人數']).fillna(0) > 0].copy()
+    if df_valid.empty:
         print("警告：沒有有效的成績資料可供計算。")
         return pd.DataFrame()
 
     # 型別標準化 (確保能跟 Courses 表對上)
     try:
-        # 將學年度/學期轉為整數，去除 .0
-        df_valid['學年度'] = pd.to_numeric(df_valid['學年度'], errors='coerce').fillna(0).astype(int)
-        df_valid['學期'] = pd.to_numeric(df_valid['學期'], errors='coerce').fillna(0).astype(int)
-        df_valid['課號'] = df_valid['課號'].astype(str).str.strip()
+        # 將學年度/學期轉為整數，去除 .0；課號與 STscoreRead 使用相同的鍵值正規化
+        df_valid['學年度'] = to_int(df_valid['學年度']).fillna(0).astype(int)
+        df_valid['學期'] = to_int(df_valid['學期']).fillna(0).astype(int)
+        df_valid['課號'] = clean_key(df_valid['課號'])
     except Exception as e:
         print(f"型別轉換錯誤: {e}")
 
-    # 分組計算平均
-    avg_df = df_valid.groupby(['學年度', '學期', '課號'])['成績'].mean().reset_index()
-    avg_df.rename(columns={'成績': 'avg_score'}, inplace=True)
-    avg_df['avg_score'] = avg_df['avg_score'].round(2)
+    avg_df = df_valid[['學年度', '學期', '課號']].copy()
+    avg_df['avg_score'] = to_float(df_valid['平均分數']).round(2)
     
-    print(f"已計算 {len(avg_df)} 門課程的平均成績。")
+    print(f"已取得 {len(avg_df)} 門課程的平均成績。")
     return avg_df
 
 def build_matrix():
@@ -153,120 +197,79 @@ def build_matrix():
         print(f"讀取 Courses 失敗: {e}")
         return
     
-    # 5. 聚合運算 (Aggregation)
-    matrix_data = {} 
-    
+    # 5. 聚合運算 (Aggregation)：整欄向量化計算，不逐列處理
     print(f"正在處理 {len(df_courses)} 筆課程能力資料...")
-    
-    for _, row in df_courses.iterrows():
-        c_id = row['course_id']
-        
-        # 初始化
-        if c_id not in matrix_data:
-            matrix_data[c_id] = {
-                'course_id': c_id,
-                'academic_year': int(row['academic_year']),
-                'semester': int(row['semester']),
-                'course_code': str(row['course_code']).strip(),
-                'course_name': row['course_name'],
-                # K1~K5
-                1: False, 2: False, 3: False, 4: False, 5: False,
-                # 平均分 (初始化為 None)
-                'course_score_AVG': None
-            }
-        
-        # 處理 K 能力
-        comp_desc = str(row['competency_desc']).strip()
-        if comp_desc and comp_desc != 'None':
-            k_num = 0
-            try:
-                # 嘗試解析開頭數字
-                first_char = comp_desc[0]
-                if first_char in '１２３４５': # 全形
-                    k_num = {'１':1, '２':2, '３':3, '４':4, '５':5}[first_char]
-                elif first_char.isdigit(): 
-                    k_num = int(first_char)
-            except: 
-                pass
-            
-            # 檢查 SMC 是否有勾選 (Access CheckBox: True/-1/1)
-            has_assessment = any(row[f'smc_{i}'] for i in range(11))
-            
-            if has_assessment and 1 <= k_num <= 5:
-                matrix_data[c_id][k_num] = True
-
-    # 6. 合併平均分數
-    # 建立快速查詢表: (year, sem, code) -> score
-    avg_lookup = {}
+
+    # 能力描述開頭的數字 (全形１~５先轉為半形) 即為 K 編號，其他開頭視為無法解析
+    comp_desc = df_courses['competency_desc'].astype(object).map(str).str.strip()
+    first_char = comp_desc.str[:1].str.translate(FULLWIDTH_DIGITS)
+    k_num = pd.to_numeric(first_char.where(first_char.isin(list('12345'))), errors='coerce')
+    # 檢查 SMC 是否有勾選 (Access CheckBox: True/-1/1)，任一欄勾選即有評量
+    has_assessment = df_courses[SMC_COLUMNS].astype(bool).to_numpy().any(axis=1)
+    valid = (comp_desc != '') & (comp_desc != 'None') & has_assessment
+
+    # 每門課的 K1~K5：各列的 one-hot 依 course_id 取最大值 (任一列符合即為 True)
+    k_flags = pd.DataFrame({k: (valid & (k_num == k)).to_numpy() for k in range(1, 6)})
+    k_flags = k_flags.groupby(df_courses['course_id'].to_numpy(), sort=False).max()
+
+    # 課程基本資料取每門課的第一列 (順序同 course_id 第一次出現的順序)
+    df_matrix = df_courses.drop_duplicates('course_id')[['course_id', 'academic_year', 'semester', 'course_code', 'course_name']]
+    df_matrix = df_matrix.reset_index(drop=True)
+    df_matrix['academic_year'] = df_matrix['academic_year'].astype(int)
+    df_matrix['semester'] = df_matrix['semester'].astype(int)
+    df_matrix['course_code'] = df_matrix['course_code'].astype(object).map(str).str.strip()
+
+    # 6. 合併平均分數 (依 學年度、學期、課號 對應)
     if not df_avgs.empty:
-        for _, row in df_avgs.iterrows():
-            key = (row['學年度'], row['學期'], row['課號'])
-            avg_lookup[key] = row['avg_score']
+        df_avgs = df_avgs.drop_duplicates(['學年度', '學期', '課號'], keep='last').rename(
+            columns={'學年度': 'academic_year', '學期': 'semester', '課號': 'course_code', 'avg_score': 'course_score_AVG'})
+        df_matrix = df_matrix.merge(df_avgs, on=['academic_year', 'semester', 'course_code'], how='left')
+    else:
+        df_matrix['course_score_AVG'] = None
 
-    # 填入平均分
-    for c_id, data in matrix_data.items():
-        key = (data['academic_year'], data['semester'], data['course_code'])
-        if key in avg_lookup:
-            data['course_score_AVG'] = avg_lookup[key]
+    # 教育目標：K 旗標矩陣 (課程數 x 5) 乘上規則矩陣 (5 x 教育目標數)，任一對應的 K 符合即符合
+    k_matrix = k_flags.loc[df_matrix['course_id'].to_numpy(), list(range(1, 6))].to_numpy()
+    rule_matrix = np.array([[k in req_k for req_k in peo_rules.values()] for k in range(1, 6)])
+    peo_matrix = (k_matrix.astype(int) @ rule_matrix.astype(int)) > 0
+    for i in range(1, 6):
+        df_matrix[f'K{i}'] = k_matrix[:, i - 1]
+    for j, peo_key in enumerate(peo_rules):
+        df_matrix[peo_key] = peo_matrix[:, j]
 
-    # 7. 寫入資料庫
+    # 7. 寫入資料庫 (fast_executemany 一次寫入)
     print("正在寫入資料庫 Course_Matrix ...")
-    
+
     # 準備欄位順序 (排除 matrix_id，因為它是自動編號)
-    columns = [
-        col_map['course_id'], col_map['academic_year'], col_map['semester'], 
-        col_map['course_code'], col_map['course_name'], col_map['course_score_AVG'],
-        col_map['K1'], col_map['K2'], col_map['K3'], col_map['K4'], col_map['K5'],
-        col_map['PEO_Theory'], col_map['PEO_Tech'], col_map['PEO_Team'], 
-        col_map['PEO_Innov'], col_map['PEO_Global']
-    ]
-    
+    keys = ['course_id', 'academic_year', 'semester', 'course_code', 'course_name', 'course_score_AVG',
+            'K1', 'K2', 'K3', 'K4', 'K5', 'PEO_Theory', 'PEO_Tech', 'PEO_Team', 'PEO_Innov', 'PEO_Global']
+    columns = [col_map[k] for k in keys]
+
     # 加上 [] 保護欄位名稱
     safe_columns = [f"[{c}]" for c in columns]
     placeholders = ",".join(["?"] * len(columns))
     insert_sql = f"INSERT INTO Course_Matrix ({','.join(safe_columns)}) VALUES ({placeholders})"
-    
+
     conn.autocommit = False
-    count = 0
-    
+
     try:
-        for c_id, data in matrix_data.items():
-            # K 列表
-            my_k_list = [k for k in range(1, 6) if data[k]]
-            
-            # PEO 判定 (交集)
-            peo_results = {}
-            for peo_key, req_k in peo_rules.items():
-                peo_results[peo_key] = bool(set(my_k_list) & set(req_k))
-            
-            # 參數準備 (確保順序與 columns 一致)
-            params = (
-                data['course_id'], data['academic_year'], data['semester'], 
-                data['course_code'], data['course_name'], data['course_score_AVG'],
-                data[1], data[2], data[3], data[4], data[5],
-                peo_results['PEO_Theory'], peo_results['PEO_Tech'], 
-                peo_results['PEO_Team'], peo_results['PEO_Innov'], 
-                peo_results['PEO_Global']
-            )
-            
-            cursor.execute(insert_sql, params)
-            count += 1
-            
+        rows = to_db_values(df_matrix[keys])
+        cursor.fast_executemany = True
+        cursor.executemany(insert_sql, rows)
         conn.commit()
         print("-" * 30)
-        print(f"成功更新 {count} 筆資料 (含平均分數、能力指標、教育目標)。")
-        
+        print(f"成功更新 {len(rows)} 筆資料 (含平均分數、能力指標、教育目標)。")
+
     except Exception as e:
         conn.rollback()
         print(f"寫入過程發生錯誤: {e}")
         # 進階除錯資訊
         import traceback
         traceback.print_exc()
-    
+
     conn.close()
 
 if __name__ == "__main__":
-    if os.path.exists(db_path):
+    if os.path.exists(resolve_db_path(db_path)):
         build_matrix()
     else:
-        print(f"找不到資料庫: {db_path}")
\ No newline at end of file
+        print(f"找不到資料庫: {resolve_db_path(db_path)}")
\ No newline at end of file
@@ -1,7 +1,12 @@
+import argparse
 import pandas as pd
-import pyodbc
 import os
 import numpy as np
+from Accessdb import connect
+from ExcelCache import read_excel_cached
+from DataNormalize import to_bool, to_flag
+from ImportManifest import check_import, record_import
+from IngestEngine import IngestEngine, iter_frame_batches
 
 # 課程資料匯入程式（含課程分類、SDGs、核心能力）
 # ==========================================
@@ -15,16 +20,15 @@ class_file = r'input_files\課程分類表\課程分類表1150127.xlsx'
 # 原始課程資料 (維持不變)
 raw_file = r'input_files\開課課程資料\電機系109-113學年度開課課程資料(工程認證用)匯入.xlsx'
 
+# 以 IN 條件批次刪除子表資料時，每次最多的 id 數量
+DELETE_CHUNK_SIZE = 200
+
 # ==========================================
 # 2. 工具函式 (完全保留原有邏輯)
 # ==========================================
 def get_db_connection():
-    full_db_path = os.path.abspath(db_path)
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        rf'DBQ={full_db_path};'
-    )
-    return pyodbc.connect(conn_str)
+    # 依 IEET_DB_BACKEND 設定連線 (預設 Access)
+    return connect(db_path)
 
 def read_file_robust(filepath):
     """智慧讀取函式"""
@@ -35,33 +39,35 @@ def read_file_robust(filepath):
     print(f"正在讀取: {os.path.basename(filepath)}...")
     
     if ext in ['.xlsx', '.xls']:
-        return pd.read_excel(filepath)
+        # 檔案內容未變動時直接使用解析快取
+        return read_excel_cached(filepath)
     else:
         try:
             return pd.read_csv(filepath, encoding='utf-8')
         except:
             return pd.read_csv(filepath, encoding='big5')
 
-def clean_boolean(val):
-    """處理各種勾選標記轉為 Bit (True/False)"""
-    if pd.isna(val): return False
-    s = str(val).strip().upper()
-    return s in ['1', 'V', 'TRUE', 'YES', 'Y', '1.0']
-
-def clean_smc(val):
-    """SMC 欄位轉布林"""
-    if pd.isna(val): return False
-    try:
-        return True if int(float(val)) == 1 else False
-    except:
-        return False
+def bool_column(df, col, convert):
+    """整欄轉為布林 (向量化)；欄位不存在時整欄為 False"""
+    if col is None or col not in df.columns:
+        return pd.Series(False, index=df.index)
+    return convert(df[col])
 
 # ==========================================
 # 3. 主匯入邏輯 (僅修正課程分類部分)
 # ==========================================
-def import_data():
+def import_data(force=False):
     conn = None
     try:
+        # 分類表與原始課程資料 (內容皆未變動) 都已匯入過就不再讀檔比對
+        conn = get_db_connection()
+        skip_class, class_hash = check_import(conn, class_file, 'Courses', force=force)
+        skip_raw, raw_hash = check_import(conn, raw_file, 'Courses', force=force)
+        if skip_class and skip_raw:
+            return
+        if skip_class or skip_raw:
+            print("-> 另一份來源檔案有變動，仍重新匯入課程資料。")
+
         # --- A. 讀取並整理分類表 (修正邏輯：區分數學與科學) ---
         df_class = read_file_robust(class_file)
         df_class.columns = [c.strip() for c in df_class.columns]
@@ -78,16 +84,15 @@ def import_data():
             print("錯誤：分類表中找不到 '課程名稱' 欄位。")
             return
 
-        class_map = {}
-        for _, row in df_class.iterrows():
-            c_name = str(row[col_name]).strip()
-            # 讀取四個分類標籤
-            class_map[c_name] = {
-                'math': clean_boolean(row.get(col_math, 0)),
-                'science': clean_boolean(row.get(col_science, 0)), # 新增
-                'eng': clean_boolean(row.get(col_eng, 0)),
-                'gen': clean_boolean(row.get(col_gen, 0))
-            }
+        # 讀取四個分類標籤 (整欄轉換勾選標記)
+        df_flags = pd.DataFrame({
+            'math': bool_column(df_class, col_math, to_bool),
+            'science': bool_column(df_class, col_science, to_bool), # 新增
+            'eng': bool_column(df_class, col_eng, to_bool),
+            'gen': bool_column(df_class, col_gen, to_bool)
+        })
+        class_names = df_class[col_name].astype(str).str.strip()
+        class_map = dict(zip(class_names, df_flags.to_dict('records')))
         print(f"分類表載入完成 ({len(class_map)} 筆)。")
 
         # --- B. 讀取原始課程資料 ---
@@ -95,112 +100,126 @@ def import_data():
         df_raw.columns = [c.strip() for c in df_raw.columns]
         print(f"原始課程資料載入完成 ({len(df_raw)} 筆)。")
 
-        # --- C. 寫入資料庫 ---
-        conn = get_db_connection()
+        # SDG 勾選與 SMC 旗標欄位先整欄轉為布林 (向量化)
+        for i in range(1, 18):
+            df_raw[f'SDG{i}'] = bool_column(df_raw, f'SDG{i}', to_bool)
+        for k in range(11):
+            df_raw[f'SMC_{k}'] = bool_column(df_raw, f'SMC_{k}', to_flag)
+
+        # --- C. 寫入資料庫 (批次處理：先整理好所有資料列，再以少數幾次 executemany 寫入) ---
         cursor = conn.cursor()
+        cursor.fast_executemany = True
         
         group_keys = ['學年度', '學期', '開課單位代碼', '課號']
-        grouped = df_raw.groupby(group_keys)
+        # 依鍵值排序 (同 groupby 的順序)，每門課的第一列為課程基本資料
+        df_raw = df_raw.dropna(subset=group_keys).sort_values(group_keys, kind='mergesort')
+        df_raw['_key'] = list(zip(
+            df_raw['學年度'].map(int), df_raw['學期'].map(int),
+            df_raw['開課單位代碼'].map(str), df_raw['課號'].map(str)
+        ))
+        first_rows = df_raw.drop_duplicates(subset='_key', keep='first').to_dict('records')
         
         print("開始寫入 Access 資料庫 (Courses, Course_SDGs, Course_Competencies)...")
-        count_new = 0
-        count_update = 0
         
-        for keys, group in grouped:
-            # 確保型別正確
-            year = int(keys[0])
-            sem = int(keys[1])
-            dept_code = str(keys[2])
-            course_code = str(keys[3])
-            
-            first_row = group.iloc[0]
+        # 1. 一次讀回既有課程的 鍵值 -> id 對照表
+        def load_course_ids():
+            cursor.execute("SELECT [id], [academic_year], [semester], [dept_code], [course_code] FROM [Courses]")
+            return {(int(r[1]), int(r[2]), str(r[3]), str(r[4])): r[0] for r in cursor.fetchall()}
+        course_ids = load_course_ids()
+        
+        # 2. 分成更新 (已存在) 與新增兩批 (分類預設全 False)
+        no_class = {'math': False, 'science': False, 'eng': False, 'gen': False}
+        update_params = []
+        insert_params = []
+        for first_row in first_rows:
+            year, sem, dept_code, course_code = first_row['_key']
             course_name = str(first_row['課程名稱']).strip()
-            credits_val = float(first_row['學分數']) if pd.notna(first_row['學分數']) else 0.0
-            
-            # 取得分類 (預設全 False)
-            cls = class_map.get(course_name, {'math': False, 'science': False, 'eng': False, 'gen': False})
-            
-            # 1. 檢查課程是否存在
-            cursor.execute("""
-                SELECT [id] FROM [Courses] 
-                WHERE [academic_year]=? AND [semester]=? AND [dept_code]=? AND [course_code]=?
-            """, (year, sem, dept_code, course_code))
-            
-            row_exist = cursor.fetchone()
-            
-            if row_exist:
-                # --- 更新模式 (使用新的 is_math, is_science 欄位) ---
-                course_id = row_exist[0]
-                cursor.execute("""
-                    UPDATE [Courses] 
-                    SET [is_math]=?, [is_science]=?, [is_eng_prof]=?, [is_general]=? 
-                    WHERE [id]=?
-                """, (cls['math'], cls['science'], cls['eng'], cls['gen'], course_id))
-                
-                # 刪除舊的子表資料 (以便重新插入)
-                cursor.execute("DELETE FROM [Course_SDGs] WHERE [course_id]=?", (course_id,))
-                cursor.execute("DELETE FROM [Course_Competencies] WHERE [course_id]=?", (course_id,))
-                count_update += 1
+            cls = class_map.get(course_name, no_class)
+            if first_row['_key'] in course_ids:
+                update_params.append((cls['math'], cls['science'], cls['eng'], cls['gen'], course_ids[first_row['_key']]))
             else:
-                # --- 新增模式 (使用新的 is_math, is_science 欄位) ---
-                cursor.execute("""
-                    INSERT INTO [Courses] (
-                        [academic_year], [semester], [dept_code], [course_code], 
-                        [dept_name], [course_name], [is_required], [credits], [instructor],
-                        [is_math], [is_science], [is_eng_prof], [is_general]
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                credits_val = float(first_row['學分數']) if pd.notna(first_row['學分數']) else 0.0
+                insert_params.append((
                     year, sem, dept_code, course_code,
                     first_row['開課單位'], course_name, first_row['必選修'], credits_val, first_row['授課教師'],
                     cls['math'], cls['science'], cls['eng'], cls['gen']
                 ))
-                cursor.execute("SELECT @@IDENTITY")
-                course_id = cursor.fetchone()[0]
-                count_new += 1
-
-            # 2. 處理 SDGs (保留原有邏輯)
-            sdg_values = []
-            has_any_sdg = False
-            for i in range(1, 18):
-                col_sdg = f'SDG{i}'
-                val = clean_boolean(first_row.get(col_sdg, 0))
-                if val: has_any_sdg = True
-                sdg_values.append(val)
-            
-            if has_any_sdg:
-                sql_sdg = """
-                    INSERT INTO [Course_SDGs] (
-                        [course_id], 
-                        [sdg_1], [sdg_2], [sdg_3], [sdg_4], [sdg_5], 
-                        [sdg_6], [sdg_7], [sdg_8], [sdg_9], [sdg_10], 
-                        [sdg_11], [sdg_12], [sdg_13], [sdg_14], [sdg_15], [sdg_16], [sdg_17]
-                    ) VALUES (?, ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                """
-                cursor.execute(sql_sdg, [course_id] + sdg_values)
-
-            # 3. 處理 Core Competencies (保留原有邏輯)
-            for _, row in group.iterrows():
-                comp_desc = str(row.get('核心能力', '')).strip()
-                if not comp_desc or comp_desc.lower() == 'nan':
-                    continue
-                
-                cap_type = 'General' if ('通識' in comp_desc or '全校' in comp_desc) else 'EE'
-                
-                smc_values = []
-                for k in range(11):
-                    val = clean_smc(row.get(f'SMC_{k}', 0))
-                    smc_values.append(val)
-                
-                sql_comp = """
-                    INSERT INTO [Course_Competencies] (
-                        [course_id], [capability_type], [competency_desc],
-                        [smc_0], [smc_1], [smc_2], [smc_3], [smc_4], 
-                        [smc_5], [smc_6], [smc_7], [smc_8], [smc_9], [smc_10]
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                cursor.execute(sql_comp, [course_id, cap_type, comp_desc] + smc_values)
+        count_update = len(update_params)
+        count_new = len(insert_params)
+        
+        # 3. 已存在的課程：批次更新分類，並以 id 集合批次刪除舊的子表資料 (以便重新插入)
+        if update_params:
+            cursor.executemany("""
+                UPDATE [Courses] 
+                SET [is_math]=?, [is_science]=?, [is_eng_prof]=?, [is_general]=? 
+                WHERE [id]=?
+            """, update_params)
+            old_ids = [p[-1] for p in update_params]
+            for i in range(0, len(old_ids), DELETE_CHUNK_SIZE):
+                chunk = old_ids[i:i + DELETE_CHUNK_SIZE]
+                placeholders = ','.join(['?'] * len(chunk))
+                cursor.execute(f"DELETE FROM [Course_SDGs] WHERE [course_id] IN ({placeholders})", chunk)
+                cursor.execute(f"DELETE FROM [Course_Competencies] WHERE [course_id] IN ({placeholders})", chunk)
+        
+        # 4. 新課程：批次新增後再讀一次對照表取得自動編號 (取代逐筆 SELECT @@IDENTITY)
+        if insert_params:
+            cursor.executemany("""
+                INSERT INTO [Courses] (
+                    [academic_year], [semester], [dept_code], [course_code], 
+                    [dept_name], [course_name], [is_required], [credits], [instructor],
+                    [is_math], [is_science], [is_eng_prof], [is_general]
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, insert_params)
+            course_ids = load_course_ids()
+        
+        # 5. 處理 SDGs (有勾選任一 SDG 的課程才寫入)
+        sdg_rows = []
+        for first_row in first_rows:
+            sdg_values = [bool(first_row[f'SDG{i}']) for i in range(1, 18)]
+            if any(sdg_values):
+                sdg_rows.append([course_ids[first_row['_key']]] + sdg_values)
+        if sdg_rows:
+            cursor.executemany("""
+                INSERT INTO [Course_SDGs] (
+                    [course_id], 
+                    [sdg_1], [sdg_2], [sdg_3], [sdg_4], [sdg_5], 
+                    [sdg_6], [sdg_7], [sdg_8], [sdg_9], [sdg_10], 
+                    [sdg_11], [sdg_12], [sdg_13], [sdg_14], [sdg_15], [sdg_16], [sdg_17]
+                ) VALUES (?, ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            """, sdg_rows)
+        
+        # 6. 處理 Core Competencies (每一列一筆，空白的核心能力略過)
+        #    管線：生產者逐批整理資料列，寫入者同時以 executemany 寫入
+        sql_comp = """
+            INSERT INTO [Course_Competencies] (
+                [course_id], [capability_type], [competency_desc],
+                [smc_0], [smc_1], [smc_2], [smc_3], [smc_4], 
+                [smc_5], [smc_6], [smc_7], [smc_8], [smc_9], [smc_10]
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        smc_cols = [f'SMC_{k}' for k in range(11)]
+        
+        def produce_comp_batches():
+            for chunk in iter_frame_batches(df_raw):
+                if '核心能力' in chunk.columns:
+                    comp_desc = chunk['核心能力'].fillna('').astype(str).str.strip()
+                else:
+                    comp_desc = pd.Series('', index=chunk.index)
+                has_comp = (comp_desc != '') & (comp_desc.str.lower() != 'nan')
+                chunk = chunk[has_comp]
+                comp_desc = comp_desc[has_comp]
+                cap_type = comp_desc.str.contains('通識|全校').map({True: 'General', False: 'EE'})
+                smc = chunk[smc_cols].astype(bool).values.tolist()
+                yield [
+                    [course_ids[key], t, d] + flags
+                    for key, t, d, flags in zip(chunk['_key'], cap_type, comp_desc, smc)
+                ]
+        
+        IngestEngine(lambda batch: cursor.executemany(sql_comp, batch), label='Course_Competencies').run(produce_comp_batches())
 
         conn.commit()
+        record_import(conn, class_file, 'Courses', len(class_map), class_hash)
+        record_import(conn, raw_file, 'Courses', count_new + count_update, raw_hash)
         print("-" * 30)
         print(f"作業完成！")
         print(f"新增課程數: {count_new}")
@@ -216,4 +235,7 @@ def import_data():
         if conn: conn.close()
 
 if __name__ == "__main__":
-    import_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="課程資料匯入")
+    parser.add_argument('--force', action='store_true', help="檔案已匯入過仍強制重新匯入")
+    args = parser.parse_args()
+    import_data(force=args.force)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+# 資料正規化模組：各匯入程式共用的向量化 (整欄) 清洗函式
+# 同一個鍵值不論在哪支程式處理，都會得到完全相同的正規化結果
+
+# 全形數字 ０-９ 轉半形
+_FULLWIDTH_DIGITS = str.maketrans('０１２３４５６７８９', '0123456789')
+
+# 勾選欄位視為 True 的寫法 (去除空白並轉大寫後比對)
+TRUE_MARKS = ['1', 'V', 'TRUE', 'YES', 'Y', '1.0']
+
+
+def fold_fullwidth(series):
+    """全形數字轉半形 (回傳字串欄位，空值維持空值)"""
+    s = series.astype(str).where(series.notna())
+    # 只對含全形數字的列做轉換 (逐字轉換較慢，大多數資料不需要)
+    mask = s.str.contains('[０-９]', regex=True, na=False)
+    if mask.any():
+        s = s.where(~mask, s[mask].str.translate(_FULLWIDTH_DIGITS))
+    return s
+
+
+def clean_key(series):
+    """
+    鍵值欄位統一轉為乾淨字串 (比對用)：
+    空值 -> ''，去除前後空白，全形數字轉半形，去除結尾的 .0 (Excel 把整數讀成浮點數的情況)
+    """
+    if pd.api.types.is_integer_dtype(series):
+        s = series.astype(str)
+    elif pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+        s = series.astype('Int64').astype(str)
+    else:
+        s = fold_fullwidth(series).str.strip().str.removesuffix('.0')
+    return s.where(series.notna(), '').astype(object)
+
+
+def clean_text(series):
+    """文字欄位：去除前後空白，空值與空字串一律轉為 None"""
+    s = series.astype(str).where(series.notna()).str.strip()
+    return s.astype(object).where(s.notna() & (s != ''), None)
+
+
+def to_float(series):
+    """轉為浮點數，無法轉換或空白者為 NaN"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    # 先直接轉換 (數值、布林、一般數字字串)，失敗者再去除空白並轉半形後重試
+    result = pd.to_numeric(series, errors='coerce').astype('float64')
+    retry = result.isna() & series.notna()
+    if retry.any():
+        result[retry] = pd.to_numeric(fold_fullwidth(series[retry]).str.strip(), errors='coerce')
+    return result
+
+
+def to_int(series):
+    """轉為整數 (小數無條件捨去，同 int(float(x)))，無法轉換或空白者為 <NA> (Int64)"""
+    f = to_float(series)
+    f = f.where(np.isfinite(f))
+    return pd.Series(pd.array(np.trunc(f), dtype='Int64'), index=series.index)
+
+
+def to_bool(series):
+    """勾選欄位 (1 / V / TRUE / YES / Y) 轉為 bool，空值為 False"""
+    s = series.astype(str).str.strip().str.upper()
+    return (s.isin(TRUE_MARKS) & series.notna()).astype(bool)
+
+
+def to_flag(series):
+    """數值旗標欄位：整數值為 1 者為 True，其餘 (含空值、無法轉換) 為 False"""
+    return (to_int(series) == 1).fillna(False).astype(bool)
+
+
+def to_db_values(df):
+    """
+    DataFrame 轉為可直接交給 executemany 的 list of tuple：
+    數值轉為 Python 原生型別，空值 (NaN / NA / NaT) 一律轉為 None
+    """
+    obj = df.astype(object)
+    return list(obj.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+# ==========================================
+# 效能比較：舊版逐格處理 vs 向量化
+# 用法：python DataNormalize.py [成績 Excel 檔]
+# ==========================================
+if __name__ == "__main__":
+    import sys
+    import time
+    from ExcelCache import read_excel_cached
+
+    def legacy_clean_key_str(val):
+        if pd.isna(val) or val is None:
+            return ""
+        s = str(val).strip()
+        if s.endswith('.0'):
+            s = s[:-2]
+        return s
+
+    def legacy_clean_int(val):
+        if pd.isna(val) or str(val).strip() == '': return None
+        try: return int(float(str(val).strip()))
+        except: return None
+
+    def legacy_clean_boolean(val):
+        if pd.isna(val): return False
+        return str(val).strip().upper() in TRUE_MARKS
+
+    path = sys.argv[1] if len(sys.argv) > 1 else r'input_files\學生成績\電機系109-113學年度大學部及碩士班博士班學生所有成績.xlsx'
+    df = read_excel_cached(path)
+    print(f"資料筆數: {len(df)}")
+
+    def bench(label, legacy, vectorized, columns):
+        t0 = time.perf_counter()
+        old = {c: df[c].apply(legacy) for c in columns}
+        t1 = time.perf_counter()
+        new = {c: vectorized(df[c]) for c in columns}
+        t2 = time.perf_counter()
+        same = all(
+            [None if pd.isna(a) else a for a in old[c]] == [None if pd.isna(b) else b for b in new[c]]
+            for c in columns
+        )
+        print(f"{label:<12} 逐格 {t1 - t0:.3f} 秒 / 向量化 {t2 - t1:.3f} 秒 "
+              f"({(t1 - t0) / max(t2 - t1, 1e-9):.1f} 倍)，結果{'一致' if same else '不一致'}")
+
+    key_cols = [c for c in ['學年度', '學期', '學號', '課號', '開課系所代碼', '系所代碼'] if c in df.columns]
+    bench('clean_key', legacy_clean_key_str, clean_key, key_cols)
+    bench('to_int', legacy_clean_int, to_int, [c for c in ['學年度', '學期', '成績'] if c in df.columns])
+    bench('to_bool', legacy_clean_boolean, to_bool, [c for c in ['必選修', '等第成績'] if c in df.columns])
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from DataNormalize import fold_fullwidth, to_float
+
+# 匯入前資料檢核：以宣告式的欄位規則整批 (向量化) 檢查，不合格的列寫入拒收檔 (CSV，附原因)，
+# 只有通過檢核的列才交給批次寫入，不再靠資料庫逐筆報錯來發現壞資料
+
+# 拒收檔資料夾
+REJECT_DIR = os.path.join('output_files', 'rejects')
+
+# 欄位規則 (皆為選填)：
+#   required  必填 (空值、空字串不合格)
+#   type      'int' / 'float'，有值時必須可轉為數字 (int 須為整數)
+#   min / max 數值範圍 (含端點)
+#   allowed   允許的值；與 min/max 同時設定時為範圍外的特例 (例如成績 999 表示退選)
+#   pattern   有值時必須包含的文字 (正規表示式)，用於問卷選項
+#   null_marks 視同空值的註記文字 (例如學期平均的「交換生」)，寫入時為 NULL
+# 空值只檢查 required，其餘規則只套用在有值的儲存格
+
+LIKERT_5 = [1, 2, 3, 4, 5]
+IMPORTANCE_PATTERN = '重要|普通'  # 非常重要 / 重要 / 普通 / 不太重要 / 非常不重要
+SATISFACTION_PATTERN = '滿意|普通'  # 非常滿意 / 滿意 / 普通 / 不太滿意 / 非常不滿意
+
+_LEAVDEP_SCHEMA = {
+    'uid': {'required': True},
+    'sem': {'required': True},
+    'sqnum': {'required': True},
+    **{q: {'type': 'int', 'allowed': LIKERT_5} for q in
+       ['A11', 'A12', 'A13', 'A14', 'A15', 'A21', 'A22', 'A23', 'A24', 'A25', 'A26', 'A27', 'A28', 'A29', 'A210', 'A211']},
+}
+
+_EXCHANGE_MARKS = ['交換生']  # 交換學期沒有成績，排名檔以文字註記
+
+_GRADRANK_SCHEMA = {
+    'StudentID': {'required': True},
+    'AcademicYear': {'required': True, 'type': 'int', 'min': 1},
+    'Semester': {'required': True, 'type': 'int', 'allowed': [1, 2]},
+    'Rank': {'type': 'int', 'min': 0},
+    'TotalCredits': {'type': 'float', 'min': 0},
+    'TotalAvg': {'type': 'float', 'min': 0, 'max': 100},
+    'GPA': {'type': 'float', 'min': 0, 'max': 4.3},
+    **{f'Y{y}S{s}_Cred': {'type': 'float', 'min': 0, 'null_marks': _EXCHANGE_MARKS} for y in range(1, 8) for s in (1, 2)},
+    **{f'Y{y}S{s}_Avg': {'type': 'float', 'min': 0, 'max': 100, 'null_marks': _EXCHANGE_MARKS}
+       for y in range(1, 8) for s in (1, 2)},
+}
+
+TABLE_SCHEMAS = {
+    'STscore': {
+        '學年度': {'required': True, 'type': 'int', 'min': 1},
+        '學期': {'required': True, 'type': 'int', 'allowed': [1, 2, 3]},
+        '課號': {'required': True},
+        '學號': {'required': True},
+        '學分數': {'type': 'float', 'min': 0},
+        '成績': {'type': 'float', 'min': 0, 'max': 100, 'allowed': [999]},
+    },
+    'LeavDepUdata': _LEAVDEP_SCHEMA,
+    'LeavDepGdata': _LEAVDEP_SCHEMA,
+    'GradRankU': _GRADRANK_SCHEMA,
+    'GradRankG': _GRADRANK_SCHEMA,
+    'AlumniSurvey': {
+        'id': {'required': True, 'type': 'int'},
+        **{f'Q{i}_{name}_{kind}': {'pattern': IMPORTANCE_PATTERN}
+           for i, name in enumerate(['Theory', 'Tech', 'Team', 'Innov', 'Global'], 1) for kind in ('Imp', 'Sat')},
+    },
+    'EmployerSurvey': {
+        'id': {'required': True, 'type': 'int'},
+        **{f'Q{i}_{name}_Imp': {'pattern': IMPORTANCE_PATTERN}
+           for i, name in enumerate(['Theory', 'Tech', 'Team', 'Innov', 'Global'], 1)},
+        **{f'Q{i}_{name}_Perf': {'pattern': SATISFACTION_PATTERN}
+           for i, name in enumerate(['Theory', 'Tech', 'Team', 'Innov', 'Global'], 7)},
+    },
+}
+
+
+def _column_errors(series, rule):
+    """檢查單一欄位，回傳 [(不合格遮罩, 原因), ...]"""
+    errors = []
+    text = fold_fullwidth(series.astype(object).where(series.notna(), '').astype(str)).str.strip()
+    present = series.notna() & (text != '')
+    if rule.get('null_marks'):
+        present &= ~text.isin(rule['null_marks'])
+
+    if rule.get('required'):
+        errors.append((~present, '必填欄位為空'))
+
+    numeric = None
+    if rule.get('type') in ('int', 'float'):
+        numeric = to_float(series)
+        bad_number = present & numeric.isna()
+        errors.append((bad_number, '不是數字'))
+        if rule['type'] == 'int':
+            errors.append((present & numeric.notna() & (numeric != np.trunc(numeric)), '不是整數'))
+
+    allowed = rule.get('allowed')
+    in_allowed = pd.Series(False, index=series.index)
+    if allowed is not None:
+        in_allowed = numeric.isin(allowed) if numeric is not None else text.isin([str(a) for a in allowed])
+
+    if numeric is not None and ('min' in rule or 'max' in rule):
+        out_of_range = pd.Series(False, index=series.index)
+        if 'min' in rule:
+            out_of_range |= numeric < rule['min']
+        if 'max' in rule:
+            out_of_range |= numeric > rule['max']
+        label = f"{rule.get('min', '')}~{rule.get('max', '')}"
+        if allowed is not None:
+            label += f" 或 {'/'.join(str(a) for a in allowed)}"
+        errors.append((present & out_of_range & ~in_allowed, f'超出範圍 ({label})'))
+    elif allowed is not None:
+        checkable = present & (numeric.notna() if numeric is not None else True)
+        errors.append((checkable & ~in_allowed, f"不在允許值 ({'/'.join(str(a) for a in allowed)})"))
+
+    if rule.get('pattern'):
+        errors.append((present & ~text.str.contains(rule['pattern'], regex=True), '選項不符'))
+    return errors
+
+
+def validate_frame(df, table, schema=None):
+    """
+    依欄位規則整批檢核 DataFrame。
+    table: 資料表名稱 (預設使用 TABLE_SCHEMAS[table])
+    schema: 自訂規則 dict，覆蓋預設
+    回傳 (通過的 DataFrame, 不合格的 DataFrame)；不合格的列多一個 _reject_reason 欄位 (多個原因以 ; 分隔)。
+    df 中沒有的欄位略過不檢查。
+    """
+    schema = schema if schema is not None else TABLE_SCHEMAS.get(table, {})
+    reasons = pd.Series('', index=df.index, dtype=object)
+    for col, rule in schema.items():
+        if col not in df.columns:
+            continue
+        for mask, reason in _column_errors(df[col], rule):
+            mask = mask.fillna(False).astype(bool)
+            if mask.any():
+                reasons[mask] = reasons[mask] + f'{col}: {reason}; '
+
+    bad = reasons != ''
+    rejects = df[bad].copy()
+    rejects['_reject_reason'] = reasons[bad].str.rstrip('; ')
+    return df[~bad], rejects
+
+
+def write_rejects(rejects, table, source_path=None):
+    """將不合格的列寫入 output_files/rejects 下的 CSV (utf-8-sig，Excel 可直接開啟)，回傳檔案路徑"""
+    if rejects.empty:
+        return None
+    os.makedirs(REJECT_DIR, exist_ok=True)
+    source = f"_{os.path.splitext(os.path.basename(source_path))[0]}" if source_path else ''
+    path = os.path.join(REJECT_DIR, f"{table}{source}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    rejects.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def split_valid_rows(df, table, source_path=None, schema=None):
+    """檢核並寫出拒收檔，回傳通過檢核的 DataFrame (有不合格的列時印出筆數與拒收檔路徑)"""
+    valid, rejects = validate_frame(df, table, schema)
+    if not rejects.empty:
+        path = write_rejects(rejects, table, source_path)
+        print(f"警告：[{table}] {len(rejects)} 筆資料未通過檢核，已寫入拒收檔: {path}")
+    return valid
@@ -1,10 +1,14 @@
+import argparse
 import pandas as pd
 import os
 from Accessdb import AccessHelper
+from ImportManifest import check_import, record_import
+from IngestEngine import IngestEngine, iter_frame_batches
+from DataValidation import split_valid_rows
 
 # 畢業生流向雇主問卷匯入程式
 
-def import_employer_survey():
+def import_employer_survey(force=False):
     # 1. 設定檔案路徑 
     # (請確認此路徑指向您電腦上的實際檔案)
     data_path = r'input_files\畢業生流向雇主問券\雇主問卷匯入用1140724.xlsx'
@@ -16,6 +20,13 @@ def import_employer_survey():
         print(f"錯誤：找不到檔案 {data_path}")
         return
 
+    # 同一份檔案 (內容未變動) 已匯入過就不再讀檔比對
+    db = AccessHelper()
+    skip, content_hash = check_import(db.conn, data_path, table_name, force=force, backend=db.backend.name)
+    if skip:
+        db.close()
+        return
+
     # 2. 依副檔名自動選擇讀取方式 (修正錯誤的關鍵)
     ext = os.path.splitext(data_path)[1].lower()
     
@@ -32,9 +43,11 @@ def import_employer_survey():
                 df = pd.read_csv(data_path, encoding='cp950')
         else:
             print(f"不支援的檔案格式: {ext}")
+            db.close()
             return
     except Exception as e:
         print(f"讀取檔案發生錯誤: {e}")
+        db.close()
         return
 
     # 3. 定義欄位對照表 (Key: Excel原標題關鍵字, Value: Access欄位名)
@@ -75,33 +88,35 @@ def import_employer_survey():
     db_data = db_data.where(pd.notnull(db_data), None)
 
     # 5. 寫入 Access 資料庫
-    db = AccessHelper()
     columns = list(db_data.columns)
     
     repeat_count = 0
     import_count = 0
 
     print(f"開始寫入資料庫 [{table_name}] ...")
-    for idx, row in db_data.iterrows():
-        try:
-            # 防重複檢查：使用 'id' (填寫順序)
-            if row['id'] is None:
-                continue
-                
-            where = "id=?"
-            params = (row['id'],)
-            
-            if db.is_duplicate(table_name, where, params):
-                repeat_count += 1
-                continue
-            
-            # 準備插入資料
-            values = tuple(row[col] for col in columns)
-            db.insert_row(table_name, columns, values)
-            import_count += 1
-            
-        except Exception as e:
-            print(f"第 {idx+1} 筆資料寫入失敗: {e}")
+
+    # 整批檢核 (id 必填、問卷選項)，不合格的列寫入拒收檔；以 'id' (填寫順序) 防重複
+    db_data = split_valid_rows(db_data, table_name, data_path)
+
+    # 管線寫入：生產者逐批將 NaN 轉為 None，寫入者逐批以集合方式比對後寫入 (整份檔案同一交易)
+    def produce_batches():
+        for chunk in iter_frame_batches(db_data):
+            yield [tuple(None if pd.isna(v) else v for v in row) for row in chunk.itertuples(index=False, name=None)]
+
+    result = {'inserted': 0, 'skipped': 0, 'updated': 0}
+
+    def write_batch(batch):
+        for k, v in db.upsert_many(table_name, ['id'], columns, batch).items():
+            result[k] += v
+
+    try:
+        with db.transaction(report=False):
+            IngestEngine(write_batch, label=table_name).run(produce_batches())
+        repeat_count = result['skipped']
+        import_count = result['inserted']
+        record_import(db.conn, data_path, table_name, import_count, content_hash, backend=db.backend.name)
+    except Exception as e:
+        print(f"批次寫入失敗 (本次未寫入任何資料): {e}")
 
     db.close()
     print("="*30)
@@ -111,4 +126,7 @@ def import_employer_survey():
     print("="*30)
 
 if __name__ == "__main__":
-    import_employer_survey()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="畢業生流向雇主問卷匯入")
+    parser.add_argument('--force', action='store_true', help="檔案已匯入過仍強制重新匯入")
+    args = parser.parse_args()
+    import_employer_survey(force=args.force)
\ No newline at end of file
@@ -91,7 +91,7 @@ def get_academic_year(date_val):
 # 2. 資料處理
 # ==========================================
 print("正在讀取 EmployerSurvey 資料表...")
-df_raw = pd.read_sql("SELECT * FROM EmployerSurvey", db.conn)
+df_raw = db.read_sql_cached("SELECT * FROM EmployerSurvey")
 
 if df_raw.empty:
     print("錯誤：EmployerSurvey 資料表是空的。")
@@ -0,0 +1,72 @@
+import hashlib
+import importlib.util
+import os
+import pandas as pd
+
+# Excel 解析結果快取：以檔案內容雜湊 (SHA-256) 為鍵，將解析並整理欄位後的 DataFrame 存成 Parquet
+# 同一份活頁簿再次讀取時直接載入快取 (毫秒級)，檔案內容一變動雜湊就不同，會重新解析
+
+# 快取資料夾與開關，可由環境變數調整
+EXCEL_CACHE_DIR = os.environ.get('IEET_EXCEL_CACHE_DIR', os.path.join('cache', 'excel'))
+EXCEL_CACHE_ENABLED = os.environ.get('IEET_EXCEL_CACHE', '1') != '0'
+
+# 有安裝 python-calamine 時改用 calamine 解析 (比 openpyxl 快很多)，否則使用 openpyxl 唯讀模式
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """分段讀取檔案計算 SHA-256 (不需將整個檔案載入記憶體)"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _parse_excel(path, sheet_name, dtype):
+    """解析 Excel 並統一欄位名稱 (轉字串、去除前後空白)"""
+    df = pd.read_excel(path, sheet_name=sheet_name, dtype=dtype, engine=EXCEL_ENGINE)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def read_excel_cached(path, sheet_name=0, dtype=None):
+    """
+    讀取 Excel 活頁簿 (含快取)。
+    path: Excel 檔案路徑
+    sheet_name: 工作表 (預設第一張)
+    dtype: 同 pd.read_excel 的 dtype 參數 (例如 str)
+    回傳欄位名稱已去除空白的 DataFrame。快取命中時不重新解析檔案。
+    """
+    if not EXCEL_CACHE_ENABLED:
+        return _parse_excel(path, sheet_name, dtype)
+
+    # 快取檔名：來源路徑與讀取參數決定前綴，檔案內容雜湊決定後綴
+    source_id = hashlib.sha1(repr((os.path.abspath(path), sheet_name, str(dtype))).encode('utf-8')).hexdigest()[:12]
+    content_hash = file_sha256(path)[:16]
+    prefix = f"{os.path.splitext(os.path.basename(path))[0]}_{source_id}_"
+    base = os.path.join(EXCEL_CACHE_DIR, prefix + content_hash)
+
+    for ext, reader in (('.parquet', pd.read_parquet), ('.pkl', pd.read_pickle)):
+        if os.path.exists(base + ext):
+            try:
+                return reader(base + ext)
+            except Exception:
+                pass  # 快取檔損毀或缺少 pyarrow，重新解析
+
+    df = _parse_excel(path, sheet_name, dtype)
+
+    os.makedirs(EXCEL_CACHE_DIR, exist_ok=True)
+    # 移除同一來源舊版本 (內容已變動) 的快取檔
+    for name in os.listdir(EXCEL_CACHE_DIR):
+        if name.startswith(prefix):
+            os.remove(os.path.join(EXCEL_CACHE_DIR, name))
+    try:
+        df.to_parquet(base + '.parquet.tmp', index=False)
+        os.replace(base + '.parquet.tmp', base + '.parquet')
+    except Exception:
+        # 未安裝 pyarrow 或欄位混合多種型別無法存成 Parquet 時，改存 pickle
+        if os.path.exists(base + '.parquet.tmp'):
+            os.remove(base + '.parquet.tmp')
+        df.to_pickle(base + '.pkl')
+    return df
\ No newline at end of file
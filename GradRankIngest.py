@@ -0,0 +1,242 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from Accessdb import AccessHelper
+from DataNormalize import to_int, to_float, clean_text, to_db_values
+from DataValidation import split_valid_rows
+from ImportManifest import check_import, record_import
+
+# 畢業總成績排名匯入 (大學部 / 碩士班共用)
+# 多個檔案以 process pool 平行解析與型別轉換，再交由單一寫入者 (一個連線) 逐檔批次寫入，每個檔案一個交易
+# 總耗時約等於最大檔案的解析時間加上寫入時間，而不是所有檔案解析時間的總和
+
+# 產生學期成績欄位 (Y1S1...Y7S2)
+SEMESTER_COLS_MAP = {}
+for _i, _ch_num in enumerate(['一', '二', '三', '四', '五', '六', '七']):
+    _y = _i + 1
+    SEMESTER_COLS_MAP[f'第{_ch_num}學年上學期學分數'] = f'Y{_y}S1_Cred'
+    SEMESTER_COLS_MAP[f'第{_ch_num}學年上學期學平均成績'] = f'Y{_y}S1_Avg'
+    SEMESTER_COLS_MAP[f'第{_ch_num}學年下學期學分數'] = f'Y{_y}S2_Cred'
+    SEMESTER_COLS_MAP[f'第{_ch_num}學年下學期學平均成績'] = f'Y{_y}S2_Avg'
+
+# 各學制的設定：資料夾、資料表、檔名過濾、基本欄位映射與防重複鍵值
+RANK_SPECS = {
+    'U': {
+        'label': '大學部',
+        'folder': r'input_files\畢業總成績排名\大學部',
+        'table': 'GradRankU',
+        'name_keywords': ('大學部',),
+        'basic_map': {
+            '學年': 'AcademicYear', '學期': 'Semester', '系所名稱': 'DeptName',
+            '年級': 'Grade', '班別': 'Class', '名次': 'Rank',
+            '學號': 'StudentID', '姓名': 'stName', '入學管道': 'EntryChannel',
+            '總學分數': 'TotalCredits', '總平均分數': 'TotalAvg', 'GPA': 'GPA',
+            '註記1': 'Note1', '註記2': 'Note2'
+        },
+        'key_columns': ['StudentID', 'AcademicYear', 'Semester', 'Class'],  # 學號+學年+學期+班別
+    },
+    'G': {
+        'label': '研究所',
+        'folder': r'input_files\畢業總成績排名\碩士班',
+        'table': 'GradRankG',  # 已移除 Class 欄位
+        'name_keywords': ('碩士', '電機碩'),
+        'basic_map': {
+            '學年': 'AcademicYear', '學期': 'Semester', '系所名稱': 'DeptName',
+            '年級': 'Grade', '名次': 'Rank',
+            '學號': 'StudentID', '姓名': 'stName', '入學管道': 'EntryChannel',
+            '總學分數': 'TotalCredits', '總平均分數': 'TotalAvg', 'GPA': 'GPA',
+            '註記1': 'Note1', '註記2': 'Note2'
+        },
+        'key_columns': ['StudentID', 'AcademicYear', 'Semester'],  # 學號+學年+學期
+    },
+}
+
+INT_DB_COLS = ['AcademicYear', 'Semester', 'Rank']
+FLOAT_DB_COLS = ['TotalCredits', 'TotalAvg', 'GPA'] + list(SEMESTER_COLS_MAP.values())
+
+
+def db_columns_for(kind):
+    """寫入順序：基本欄位 + 所有學期欄位"""
+    db_columns_ordered = list(RANK_SPECS[kind]['basic_map'].values())
+    for y in range(1, 8):
+        db_columns_ordered.extend([f'Y{y}S1_Cred', f'Y{y}S1_Avg', f'Y{y}S2_Cred', f'Y{y}S2_Avg'])
+    return db_columns_ordered
+
+
+def list_rank_files(kind):
+    """列出資料夾中檔名符合學制的 Excel / CSV 檔案"""
+    spec = RANK_SPECS[kind]
+    if not os.path.exists(spec['folder']):
+        print(f"提示：資料夾不存在 ({spec['folder']})")
+        return []
+    files = []
+    for file in sorted(os.listdir(spec['folder'])):
+        full_path = os.path.join(spec['folder'], file)
+        if not (os.path.isfile(full_path) and file.lower().endswith(('.xlsx', '.xls', '.csv'))):
+            continue
+        # [關鍵過濾] 只處理檔名包含學制關鍵字的檔案
+        if any(k in file for k in spec['name_keywords']):
+            files.append(full_path)
+    return files
+
+
+def compile_column_plan(kind, headers):
+    """
+    依檔案標題列編譯欄位計畫 (每個檔案只做一次)。
+    回傳依寫入順序排列的 list of (資料庫欄位, 檔案欄位或 None, 轉換函式)；
+    檔案中沒有的欄位為 None，寫入 NULL。
+    """
+    full_map = {**RANK_SPECS[kind]['basic_map'], **SEMESTER_COLS_MAP}
+    source_of = {db_col: csv_col for csv_col, db_col in full_map.items() if csv_col in headers}
+    plan = []
+    for db_col in db_columns_for(kind):
+        if db_col in INT_DB_COLS: convert = to_int
+        elif db_col in FLOAT_DB_COLS: convert = to_float
+        else: convert = clean_text
+        plan.append((db_col, source_of.get(db_col), convert))
+    return plan
+
+
+def parse_rank_file(kind, file_path):
+    """
+    讀取並整理一個排名檔 (於子行程執行，不連線資料庫)。
+    回傳 (寫入欄位 list, 資料列 list of tuple, 解析秒數)；無法讀取時資料列為 None。
+    """
+    start = time.perf_counter()
+    try:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in ['.xls', '.xlsx']:
+            df = pd.read_excel(file_path, dtype=str)
+        elif ext == '.csv':
+            try: df = pd.read_csv(file_path, encoding='utf-8', dtype=str)
+            except: df = pd.read_csv(file_path, encoding='cp950', dtype=str)
+        else:
+            return None, None, time.perf_counter() - start
+    except Exception as e:
+        print(f"[失敗] 讀取失敗 ({os.path.basename(file_path)}): {e}")
+        return None, None, time.perf_counter() - start
+
+    # 欄位計畫每個檔案只編譯一次：先依計畫取出原始欄位並檢核，再整欄轉換組成寫入用的資料列
+    plan = compile_column_plan(kind, df.columns)
+    raw = pd.DataFrame({db_col: df[csv_col] if csv_col else None for db_col, csv_col, _ in plan}, index=df.index)
+    raw = raw[clean_text(raw['StudentID']).notna()]  # 沒有學號的列 (空白列) 不匯入
+    raw = split_valid_rows(raw, RANK_SPECS[kind]['table'], file_path)
+    out = pd.DataFrame({db_col: convert(raw[db_col]) for db_col, _, convert in plan}, index=raw.index)
+
+    return list(out.columns), to_db_values(out), time.perf_counter() - start
+
+
+def write_rank_file(db, kind, file_path, columns, rows, content_hash):
+    """單一寫入者：一個檔案一個交易，以集合方式比對鍵值後批次寫入；回傳 (新增, 重複略過, 寫入秒數)"""
+    spec = RANK_SPECS[kind]
+    start = time.perf_counter()
+    with db.transaction(report=False):
+        result = db.upsert_many(spec['table'], spec['key_columns'], columns, rows)
+    record_import(db.conn, file_path, spec['table'], result['inserted'], content_hash, backend=db.backend.name)
+    return result['inserted'], result['skipped'], time.perf_counter() - start
+
+
+def import_rank_file(kind, file_path, force=False, db=None):
+    """匯入單一排名檔 (不經 process pool)"""
+    spec = RANK_SPECS[kind]
+    file_name = os.path.basename(file_path)
+    if not any(k in file_name for k in spec['name_keywords']):
+        return
+    print(f"\n[{spec['label']}] 正在處理: {file_name} ...")
+    if not os.path.exists(file_path):
+        print(f"錯誤：找不到檔案 {file_path}")
+        return
+
+    own_db = db is None
+    db = db or AccessHelper()
+    try:
+        skip, content_hash = check_import(db.conn, file_path, spec['table'], force=force, backend=db.backend.name)
+        if skip:
+            return
+        columns, rows, _ = parse_rank_file(kind, file_path)
+        if rows is None:
+            return
+        try:
+            inserted, skipped, _ = write_rank_file(db, kind, file_path, columns, rows, content_hash)
+        except Exception as e:
+            print(f"[失敗] {file_name} 寫入失敗，本檔未寫入任何資料: {e}")
+            return
+        print(f"[完成] {file_name}。新增: {inserted}，重複略過: {skipped}")
+    finally:
+        if own_db:
+            db.close()
+
+
+def ingest_rank_folders(kinds=('U', 'G'), force=False, workers=None):
+    """
+    平行匯入多個學制資料夾中的所有排名檔。
+    kinds: 學制 ('U' 大學部 / 'G' 研究所)
+    force: True 時已匯入過的檔案也重新匯入
+    workers: 解析用的行程數，預設為 CPU 核心數
+    結束時印出每個檔案的解析、寫入秒數與筆數。
+    """
+    wall_start = time.perf_counter()
+    db = AccessHelper()
+    summary = []
+
+    # 1. 列出檔案並先以匯入紀錄過濾 (雜湊比對在主行程完成)
+    jobs = []
+    for kind in kinds:
+        spec = RANK_SPECS[kind]
+        print(f"--- [{spec['label']}] 開始掃描資料夾: {spec['folder']} ---")
+        for file_path in list_rank_files(kind):
+            skip, content_hash = check_import(db.conn, file_path, spec['table'], force=force, backend=db.backend.name)
+            if skip:
+                summary.append((spec['label'], os.path.basename(file_path), 0.0, 0.0, 0, 0, '已匯入略過'))
+            else:
+                jobs.append((kind, file_path, content_hash))
+
+    # 2. 子行程平行解析，主行程依完成順序逐檔寫入
+    try:
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(parse_rank_file, kind, file_path): (kind, file_path, content_hash)
+                           for kind, file_path, content_hash in jobs}
+                for future in as_completed(futures):
+                    kind, file_path, content_hash = futures[future]
+                    label, file_name = RANK_SPECS[kind]['label'], os.path.basename(file_path)
+                    try:
+                        columns, rows, parse_secs = future.result()
+                    except Exception as e:
+                        print(f"[失敗] [{label}] {file_name} 解析失敗: {e}")
+                        summary.append((label, file_name, 0.0, 0.0, 0, 0, '解析失敗'))
+                        continue
+                    if rows is None:
+                        summary.append((label, file_name, parse_secs, 0.0, 0, 0, '讀取失敗'))
+                        continue
+                    try:
+                        inserted, skipped, write_secs = write_rank_file(db, kind, file_path, columns, rows, content_hash)
+                        status = '完成'
+                    except Exception as e:
+                        inserted, skipped, write_secs, status = 0, 0, 0.0, '寫入失敗'
+                        print(f"[失敗] [{label}] {file_name} 寫入失敗，本檔未寫入任何資料: {e}")
+                    else:
+                        print(f"[完成] [{label}] {file_name}。新增: {inserted}，重複略過: {skipped}")
+                    summary.append((label, file_name, parse_secs, write_secs, inserted, skipped, status))
+    finally:
+        db.close()
+
+    # 3. 每個檔案的耗時摘要
+    print("=" * 60)
+    print(f"{'學制':<4} {'解析(秒)':>8} {'寫入(秒)':>8} {'新增':>6} {'重複':>6}  狀態  檔案")
+    for label, file_name, parse_secs, write_secs, inserted, skipped, status in summary:
+        print(f"{label:<4} {parse_secs:>10.2f} {write_secs:>10.2f} {inserted:>8} {skipped:>8}  {status}  {file_name}")
+    print(f"共 {len(summary)} 個檔案，總耗時 {time.perf_counter() - wall_start:.2f} 秒")
+    print("=" * 60)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="畢業總成績排名平行匯入 (大學部與碩士班)")
+    parser.add_argument('--force', action='store_true', help="檔案已匯入過仍強制重新匯入")
+    parser.add_argument('--workers', type=int, default=None, help="解析用的行程數 (預設為 CPU 核心數)")
+    parser.add_argument('--only', choices=list(RANK_SPECS), help="只匯入指定學制 (U 大學部 / G 研究所)")
+    args = parser.parse_args()
+    ingest_rank_folders([args.only] if args.only else list(RANK_SPECS), force=args.force, workers=args.workers)
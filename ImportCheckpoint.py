@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+# 匯入檢查點：大型匯入 (例如 STscore) 每提交一批，就記錄來源檔案中已處理並提交到的位置 (offset) 與累計統計
+# 中途中斷後再次執行時，來源檔案雜湊相同就從上次提交的位置之後繼續清洗、比對與寫入，
+# 已提交的部分不再寫入；比對用的鍵值索引 (KeyHashIndex) 也是逐批更新並持久化，不必重建全部歷史資料的比對指紋
+# 檢查點只記錄位置與統計 (不存寫入計畫)，清洗與比對仍在匯入管線的生產者中逐批進行
+# 檢查點依資料庫識別 (Accessdb.db_identity) 分開存放：改用其他資料庫或後端匯入同一份檔案時不會沿用，
+# 否則會略過前 offset 列，這些資料永遠不會寫入新的資料庫
+
+# 檢查點資料夾，可由環境變數調整
+CHECKPOINT_DIR = os.environ.get('IEET_CHECKPOINT_DIR', os.path.join('cache', 'checkpoint'))
+CHECKPOINT_VERSION = 2  # 檢查點格式版本 (舊版存有整份寫入計畫，格式不同時捨棄)
+
+
+def _base(name, db_id):
+    digest = hashlib.sha1(db_id.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{name}_{digest}")
+
+
+def _path(name, db_id):
+    return _base(name, db_id) + '.json'
+
+
+class ImportCheckpoint:
+    """
+    ImportCheckpoint 類別：記錄單一匯入工作 (資料表 + 資料庫) 的來源雜湊、已提交位置與累計統計。
+    寫入流程：begin_batch(結束位置, 累計統計, 檢查用鍵值) -> 資料庫 commit -> commit_batch()
+    """
+
+    def __init__(self, name, content_hash, db_id, offset=0, pending=None, stats=None):
+        self.name = name
+        self.content_hash = content_hash
+        self.db_id = db_id  # 資料庫識別 (見 Accessdb.db_identity)
+        self.offset = offset  # 已處理並提交的來源列數 (來源中 offset 之前的列都已處理完畢)
+        self.pending = pending  # 正在提交的批次 {'offset', 'stats', 'probe'} (提交成功前中斷時保留)
+        self.stats = stats or {}  # 處理到 offset 為止的累計統計 (新增、重複筆數等)，續傳時沿用
+
+    @classmethod
+    def create(cls, name, content_hash, db_id, stats=None):
+        """建立新的檢查點"""
+        checkpoint = cls(name, content_hash, db_id, stats=stats)
+        checkpoint._save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, name, content_hash, db_id):
+        """
+        讀取同一資料庫、同一來源 (雜湊相同) 的檢查點，沒有或來源已變動時回傳 None。
+        來源已變動的舊檢查點會被刪除。
+        """
+        path = _path(name, db_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') != CHECKPOINT_VERSION:
+                print(f"-> 檢查點格式已變更，捨棄舊的檢查點 ({name})。")
+                discard_checkpoint(name, db_id)
+                return None
+            if state.get('db_id') != db_id:
+                print(f"-> 檢查點屬於其他資料庫，捨棄 ({name})。")
+                discard_checkpoint(name, db_id)
+                return None
+            if state.get('content_hash') != content_hash:
+                print(f"-> 來源檔案已變動，捨棄舊的檢查點 ({name})。")
+                discard_checkpoint(name, db_id)
+                return None
+            return cls(name, content_hash, db_id, state['offset'], state.get('pending'), state.get('stats'))
+        except Exception as e:
+            print(f"-> 檢查點無法讀取，重新開始匯入 ({e})")
+            discard_checkpoint(name, db_id)
+            return None
+
+    def _save(self):
+        # 先寫暫存檔再取代，中斷時不會留下寫到一半的檢查點
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        path = _path(self.name, self.db_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': CHECKPOINT_VERSION,
+                'content_hash': self.content_hash,
+                'db_id': self.db_id,
+                'offset': self.offset,
+                'pending': self.pending,
+                'stats': self.stats,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def begin_batch(self, end, stats, probe):
+        """
+        提交前記錄正在寫入的批次 (資料庫 commit 前呼叫)。
+        end: 這一批提交後的來源位置；stats: 處理到 end 為止的累計統計
+        probe: 這一批第一筆寫入資料的鍵值 (續傳時檢查該批是否已提交)
+        """
+        self.pending = {'offset': end, 'stats': stats, 'probe': list(probe)}
+        self._save()
+
+    def commit_batch(self):
+        """資料庫 commit 成功後推進已提交位置與累計統計"""
+        self.offset, self.stats = self.pending['offset'], self.pending['stats']
+        self.pending = None
+        self._save()
+
+    def settle_pending(self, batch_committed):
+        """
+        續傳前處理上次中斷時正在提交的批次。
+        batch_committed: 檢查該批次是否已寫入資料庫的函式 (參數為 begin_batch 記錄的鍵值)
+        commit 與檢查點更新之間中斷時，該批次其實已寫入，推進位置避免重複寫入。
+        """
+        if self.pending is None:
+            return
+        if batch_committed(self.pending['probe']):
+            self.offset, self.stats = self.pending['offset'], self.pending['stats']
+        self.pending = None
+        self._save()
+
+    def finish(self):
+        """全部寫入完成後刪除檢查點"""
+        discard_checkpoint(self.name, self.db_id)
+
+
+def discard_checkpoint(name, db_id):
+    """刪除檢查點"""
+    old_paths = (os.path.join(CHECKPOINT_DIR, name + '.json'), os.path.join(CHECKPOINT_DIR, name + '_plan.pkl'))
+    for path in (_path(name, db_id),) + old_paths:  # 含舊版 (未區分資料庫) 的檢查點與寫入計畫檔
+        if os.path.exists(path):
+            os.remove(path)
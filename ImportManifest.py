@@ -0,0 +1,87 @@
+import os
+from datetime import datetime
+from Accessdb import get_backend
+from ExcelCache import file_sha256
+
+# 匯入紀錄 (import manifest)：每次匯入成功後記錄來源檔案的內容雜湊、大小、目標資料表與匯入筆數
+# 匯入程式執行前先比對雜湊，同一份檔案 (內容未變動) 已匯入過就直接略過，
+# 不必重新讀檔、逐筆比對資料庫；需要強制重新匯入時加上 --force 參數
+
+MANIFEST_TABLE = 'ImportManifest'
+
+# 各後端建立紀錄表的 SQL (資料表不存在時自動建立)
+MANIFEST_DDL = {
+    'access': (
+        f"CREATE TABLE {MANIFEST_TABLE} (source_path TEXT(255), content_hash TEXT(64), file_size LONG, "
+        "target_table TEXT(64), rows_imported LONG, imported_at DATETIME)"
+    ),
+    'sqlite': (
+        f"CREATE TABLE {MANIFEST_TABLE} (source_path TEXT, content_hash TEXT, file_size INTEGER, "
+        "target_table TEXT, rows_imported INTEGER, imported_at TEXT)"
+    ),
+    'duckdb': (
+        f"CREATE TABLE {MANIFEST_TABLE} (source_path VARCHAR, content_hash VARCHAR, file_size BIGINT, "
+        "target_table VARCHAR, rows_imported BIGINT, imported_at TIMESTAMP)"
+    ),
+}
+
+
+def ensure_manifest_table(conn, backend=None):
+    """紀錄表不存在時依後端建立"""
+    backend = get_backend(backend)
+    if MANIFEST_TABLE.lower() in (t.lower() for t in backend.list_tables(conn)):
+        return
+    cursor = conn.cursor()
+    cursor.execute(MANIFEST_DDL[backend.name])
+    conn.commit()
+
+
+def find_import(conn, content_hash, target_table, backend=None):
+    """查詢同一內容是否已匯入目標資料表，回傳 (來源路徑, 匯入筆數, 匯入時間) 或 None"""
+    ensure_manifest_table(conn, backend)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT source_path, rows_imported, imported_at FROM {MANIFEST_TABLE} "
+        "WHERE content_hash=? AND target_table=?",
+        (content_hash, target_table)
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+def check_import(conn, path, target_table, force=False, backend=None):
+    """
+    匯入前檢查檔案是否已匯入過。
+    conn: 資料庫連線 (connect() 或 AccessHelper.conn)
+    path: 來源檔案路徑
+    target_table: 目標資料表名稱
+    force: True 時一律重新匯入 (對應 --force)
+    回傳 (是否略過, 內容雜湊)；內容雜湊可直接交給 record_import，避免重複計算。
+    """
+    content_hash = file_sha256(path)
+    if force:
+        return False, content_hash
+    found = find_import(conn, content_hash, target_table, backend)
+    if found is None:
+        return False, content_hash
+    source_path, rows_imported, imported_at = found
+    print(f"[略過] {os.path.basename(path)}：內容與 {imported_at} 匯入 {target_table} 的檔案相同 "
+          f"({os.path.basename(source_path)}，{rows_imported} 筆)，如需重新匯入請加上 --force")
+    return True, content_hash
+
+
+def record_import(conn, path, target_table, rows_imported, content_hash=None, backend=None):
+    """匯入成功後寫入一筆紀錄 (立即 commit)"""
+    backend = get_backend(backend)
+    ensure_manifest_table(conn, backend.name)
+    imported_at = datetime.now().replace(microsecond=0)
+    if backend.name == 'sqlite':
+        imported_at = imported_at.isoformat(' ')  # sqlite3 不再內建 datetime 轉換
+    cursor = conn.cursor()
+    cursor.execute(
+        f"INSERT INTO {MANIFEST_TABLE} (source_path, content_hash, file_size, target_table, rows_imported, imported_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (os.path.abspath(path), content_hash or file_sha256(path), os.path.getsize(path),
+         target_table, int(rows_imported), imported_at)
+    )
+    conn.commit()
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+
+# 匯入管線：解析/清理 (生產者) 與資料庫寫入 (寫入者) 同時進行
+# 生產者在背景執行緒逐批產出已清理的資料列，放入有上限的佇列；寫入者在呼叫端執行緒 (持有資料庫連線的執行緒) 逐批寫入
+# 佇列有上限，解析較快時生產者會被擋住等待 (backpressure)，記憶體中最多只有 queue_size 批資料
+
+# 每批資料列數與佇列可容納的批數
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()  # 生產者結束的標記
+
+
+def iter_batches(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """將資料列 list 切成固定大小的批次"""
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
+
+
+def iter_frame_batches(df, batch_size=DEFAULT_BATCH_SIZE):
+    """將 DataFrame 依列切成固定大小的批次 (每批為 DataFrame)"""
+    for i in range(0, len(df), batch_size):
+        yield df.iloc[i:i + batch_size]
+
+
+class IngestEngine:
+    """
+    IngestEngine 類別：以有上限的佇列串接生產者與寫入者的匯入管線。
+    用法：IngestEngine(write_batch).run(產生批次的 generator)
+    """
+
+    def __init__(self, write_batch, queue_size=DEFAULT_QUEUE_SIZE, label='匯入'):
+        """
+        write_batch: 寫入一批資料列的函式 (於呼叫 run 的執行緒執行，可直接使用該執行緒的資料庫連線)
+        queue_size: 佇列最多容納的批數
+        label: 報告中顯示的名稱
+        """
+        self.write_batch = write_batch
+        self.queue_size = queue_size
+        self.label = label
+        self.last_stats = None  # 最近一次執行的統計 (見 run)
+
+    def run(self, batches, report=True):
+        """
+        執行管線。
+        batches: 產生資料批次的 iterable (通常是 generator，於背景執行緒中逐批計算)
+        report: 結束時是否印出吞吐量與 backpressure 統計
+        回傳統計 dict：
+          rows / batches        寫入的筆數與批數
+          seconds / rows_per_sec 總耗時與每秒筆數
+          producer_blocked      生產者因佇列已滿而等待的秒數 (大表示寫入是瓶頸)
+          writer_idle           寫入者因佇列為空而等待的秒數 (大表示解析是瓶頸)
+          max_depth             佇列最大深度
+        任一端發生例外時停止另一端並重新拋出例外。
+        """
+        q = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        stats = {'rows': 0, 'batches': 0, 'producer_blocked': 0.0, 'writer_idle': 0.0, 'max_depth': 0}
+
+        def put(item):
+            # 佇列已滿時等待；寫入端已停止時放棄
+            start = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            stats['producer_blocked'] += time.perf_counter() - start
+
+        def produce():
+            try:
+                for batch in batches:
+                    if stop.is_set():
+                        return
+                    if len(batch):
+                        put(batch)
+                        stats['max_depth'] = max(stats['max_depth'], q.qsize())
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                put(_DONE)
+
+        start = time.perf_counter()
+        producer = threading.Thread(target=produce, name=f'{self.label}-producer', daemon=True)
+        producer.start()
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = q.get()
+                stats['writer_idle'] += time.perf_counter() - wait_start
+                if item is _DONE:
+                    break
+                self.write_batch(item)
+                stats['rows'] += len(item)
+                stats['batches'] += 1
+        finally:
+            stop.set()
+            producer.join()
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = elapsed
+        stats['rows_per_sec'] = stats['rows'] / elapsed if elapsed > 0 else 0.0
+        self.last_stats = stats
+        if report:
+            print(f"[{self.label}] 管線完成：寫入 {stats['rows']} 筆 / {stats['batches']} 批，"
+                  f"耗時 {elapsed:.2f} 秒 ({stats['rows_per_sec']:.0f} 筆/秒)")
+            print(f"[{self.label}] 佇列滿載等待 {stats['producer_blocked']:.2f} 秒 (寫入較慢)，"
+                  f"寫入端等待 {stats['writer_idle']:.2f} 秒 (解析較慢)，"
+                  f"最大佇列深度 {stats['max_depth']}/{self.queue_size}")
+        return stats
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from Accessdb import get_backend
+from DataNormalize import clean_key
+
+# 鍵值雜湊索引：將資料表既有紀錄的比對鍵值 (例如 STscore 的 學年度+學期+課號+學號) 存成排序後的 64 位元雜湊陣列 (.npy)
+# 匯入前以 memory-map 載入並用 searchsorted 整批比對，不必每次 SELECT 全部歷史資料、在 Python 中建立字串 tuple 的 set
+# 每筆紀錄只佔 8 bytes；64 位元雜湊在數百萬筆內發生碰撞的機率可忽略
+#
+# 每次提交一批後只把新增的雜湊寫入小的增量檔 (delta)，比對時主檔與增量檔都查；
+# 增量檔累積到一定大小 (或呼叫 compact) 才合併回主檔
+# 索引依資料庫識別 (後端 + 檔案路徑，見 Accessdb.db_identity) 分開存放，並記錄資料表的標記 (COUNT(*) 與自動編號的 MAX)；
+# 載入時標記與資料庫不符 (例如有人在別處刪除一筆再新增另一筆，筆數相同但最大自動編號不同) 就自動從資料庫重建
+# 資料表沒有自動編號欄位時只能比對筆數
+
+# 索引資料夾，可由環境變數調整
+KEY_INDEX_DIR = os.environ.get('IEET_KEY_INDEX_DIR', os.path.join('cache', 'keyindex'))
+DELTA_MERGE_SIZE = 100000  # 增量檔超過此筆數時合併回主檔
+ID_COLUMNS = ('id', 'ids')  # 自動編號欄位名稱 (不重複使用已刪除的編號)，用於資料表標記
+
+
+def key_hashes(df, key_columns):
+    """以 clean_key 正規化鍵欄位後計算每一列的 64 位元雜湊 (uint64 陣列，順序與 df 相同)"""
+    keys = pd.DataFrame({col: clean_key(df[col]) for col in key_columns})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype=np.uint64)
+
+
+def _table_marker(conn, table):
+    """資料表標記：[筆數, 最大自動編號] (沒有自動編號欄位時只有筆數)"""
+    columns = {c.lower(): c for c in get_backend().list_columns(conn, table)}
+    id_column = next((columns[c] for c in ID_COLUMNS if c in columns), None)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*){f', MAX([{id_column}])' if id_column else ''} FROM {table}")
+    return [None if v is None else int(v) for v in cursor.fetchone()]
+
+
+def _save_array(path, values):
+    # 先寫暫存檔再取代，中斷時不會留下寫到一半的索引
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, values)
+    os.replace(path + '.tmp', path)
+
+
+class KeyHashIndex:
+    """
+    KeyHashIndex 類別：單一資料庫、單一資料表的持久化鍵值雜湊索引。
+    用法：
+        index = KeyHashIndex.open(conn, 'STscore', ['學年度', '學期', '課號', '學號'], db_identity(db_path))
+        exists = index.contains(key_hashes(df, key_columns))
+        ... 提交一批後 index.add(該批雜湊, conn)
+    """
+
+    def __init__(self, table, key_columns, db_id, main, delta, marker):
+        self.table = table
+        self.key_columns = key_columns
+        self.db_id = db_id
+        self.main = main  # 排序後的雜湊 (memory-map 唯讀)
+        self.delta = delta  # 排序後的增量雜湊
+        self.marker = marker  # 索引對應的資料表標記 [筆數, 最大自動編號]
+
+    @staticmethod
+    def _paths(table, db_id):
+        digest = hashlib.sha1(db_id.encode('utf-8')).hexdigest()[:12]
+        base = os.path.join(KEY_INDEX_DIR, f"{table}_{digest}")
+        return base + '.npy', base + '_delta.npy', base + '.json'
+
+    @classmethod
+    def open(cls, conn, table, key_columns, db_id):
+        """載入索引；沒有索引、鍵欄位或資料庫不同、標記與資料庫不符時從資料庫重建"""
+        main_path, delta_path, meta_path = cls._paths(table, db_id)
+        marker = _table_marker(conn, table)
+
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['key_columns'] == list(key_columns) and meta['db_id'] == db_id and meta['marker'] == marker:
+                main = np.load(main_path, mmap_mode='r')
+                delta = np.load(delta_path) if os.path.exists(delta_path) else np.empty(0, dtype=np.uint64)
+                return cls(table, list(key_columns), db_id, main, delta, marker)
+            print(f"-> {table} 鍵值索引與資料庫不一致 (索引 {meta['marker']} / 資料庫 {marker})，重新建立。")
+        except (OSError, ValueError, KeyError):
+            pass  # 沒有索引或索引檔損毀
+        return cls.rebuild(conn, table, key_columns, db_id, marker)
+
+    @classmethod
+    def rebuild(cls, conn, table, key_columns, db_id, marker=None):
+        """從資料庫讀取全部鍵值重建索引"""
+        marker = marker or _table_marker(conn, table)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(f'[{c}]' for c in key_columns)} FROM {table}")
+        df_keys = pd.DataFrame.from_records([tuple(r) for r in cursor.fetchall()], columns=key_columns)
+        hashes = np.unique(key_hashes(df_keys, key_columns))
+        index = cls(table, list(key_columns), db_id, hashes, np.empty(0, dtype=np.uint64), marker)
+        index._save(main=True)
+        index.main = np.load(cls._paths(table, db_id)[0], mmap_mode='r')
+        print(f"-> 已建立 {table} 鍵值索引 ({len(hashes)} 筆不重複鍵值)。")
+        return index
+
+    def __len__(self):
+        return len(self.main) + len(self.delta)
+
+    def _save(self, main=False):
+        os.makedirs(KEY_INDEX_DIR, exist_ok=True)
+        main_path, delta_path, meta_path = self._paths(self.table, self.db_id)
+        if main:
+            _save_array(main_path, np.asarray(self.main))
+        _save_array(delta_path, self.delta)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'key_columns': self.key_columns, 'db_id': self.db_id, 'marker': self.marker}, f, ensure_ascii=False)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    @staticmethod
+    def _member(sorted_values, hashes):
+        if len(sorted_values) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(sorted_values, hashes)
+        pos[pos == len(sorted_values)] = 0
+        return sorted_values[pos] == hashes
+
+    def contains(self, hashes):
+        """整批比對，回傳布林陣列 (True 表示鍵值已存在)"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        return self._member(self.main, hashes) | self._member(self.delta, hashes)
+
+    def add(self, hashes, conn):
+        """
+        資料庫提交一批後加入新的雜湊。
+        conn: 資料庫連線 (重新讀取提交後的資料表標記，下次載入時用來確認索引與資料庫一致)
+        """
+        self.delta = np.union1d(self.delta, np.asarray(hashes, dtype=np.uint64))
+        self.marker = _table_marker(conn, self.table)
+        if len(self.delta) >= DELTA_MERGE_SIZE:
+            self.compact()
+        else:
+            self._save()
+
+    def compact(self):
+        """將增量檔合併回主檔"""
+        if len(self.delta) == 0:
+            return
+        self.main = np.union1d(self.main, self.delta)
+        self.delta = np.empty(0, dtype=np.uint64)
+        self._save(main=True)
+        self.main = np.load(self._paths(self.table, self.db_id)[0], mmap_mode='r')
@@ -21,9 +21,9 @@ if not os.path.exists(OUTPUT_DIR_PATH):
     print(f"已建立資料夾: {OUTPUT_DIR_PATH}")
 
 print("正在讀取資料庫...")
-df_u = pd.read_sql("SELECT * FROM LDUdataAnalyze", db.conn)
-df_g = pd.read_sql("SELECT * FROM LDGdataAnalyze", db.conn)
-df_q = pd.read_sql("SELECT * FROM LeavDepQuest", db.conn)
+df_u = db.read_sql_cached("SELECT * FROM LDUdataAnalyze")
+df_g = db.read_sql_cached("SELECT * FROM LDGdataAnalyze")
+df_q = db.read_sql_cached("SELECT * FROM LeavDepQuest")
 
 def get_quest_map(row):
     """解析問卷題目對照表"""
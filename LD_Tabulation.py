@@ -0,0 +1,196 @@
+import argparse
+from datetime import datetime
+import pandas as pd
+from Accessdb import AccessHelper
+from DataNormalize import to_db_values
+
+# 離系問卷統計引擎 (大學部 / 研究所共用)
+# 題目欄位 (A11...A211) 一次轉成長表 (sem, qid, 答案)，學年總和 ({學年}T) 的列直接接在後面，
+# 一次 crosstab 算出所有 (學期, 題目, 答案) 的人數；不再逐題、逐學期、逐答案比對計數
+# 結果以 upsert_many 集合寫入 (既有的 sem + qid 略過，同原本的 is_duplicate 邏輯)
+#
+# 重新計算模式 (--recompute)：問卷匯出檔為累積快照 (0725 -> 0804 -> 0805)，已統計過的學期之後仍可能增加或更新回覆，
+# 略過模式下這些學期的人數會停在舊值。重新計算模式以狀態表記錄每個學期上次統計時的指紋 (筆數、最大 ids、最新 update_time)，
+# 只重新統計指紋改變的學期 (含該學年的 {學年}T)，以 replace_partition 整批取代，並在同一個交易內更新狀態表
+
+# 各學制的來源資料表與統計結果資料表
+LD_SOURCES = {
+    'U': {'label': '大學部', 'table': 'LeavDepUdata', 'analyze_table': 'LDUdataAnalyze'},
+    'G': {'label': '研究所', 'table': 'LeavDepGdata', 'analyze_table': 'LDGdataAnalyze'},
+}
+
+# 需要統計的題目欄位
+QID_LIST = [
+    'A11', 'A12', 'A13', 'A14', 'A15', 'A21', 'A22', 'A23', 'A24', 'A25', 'A26', 'A27', 'A28', 'A29', 'A210', 'A211'
+]
+ANSWERS = [1, 2, 3, 4, 5]
+COUNT_COLUMNS = [f'count_{ans}' for ans in ANSWERS]
+ANALYZE_COLUMNS = ['sem', 'qid'] + COUNT_COLUMNS + ['total']
+YEAR_SUFFIX = 'T'  # 學年總和的 sem 為 學年 + 'T' (例如 113T)
+
+# 重新計算模式的狀態表：每個學制、每個學期上次統計時的來源資料指紋
+STATE_TABLE = 'LDTabulationState'
+_STATE_TYPES = {
+    'access': ('TEXT(255)', 'LONG', 'DATETIME'),
+    'sqlite': ('TEXT', 'INTEGER', 'TEXT'),
+    'duckdb': ('VARCHAR', 'BIGINT', 'TIMESTAMP'),
+}
+
+
+def tabulate_answers(df, qids=QID_LIST):
+    """
+    統計各學期、各學年各題目 1~5 各答案的人數。
+    df: 含 sem 與題目欄位的 DataFrame
+    回傳欄位同 ANALYZE_COLUMNS 的 DataFrame；每個學期 (與學年) 每題都有一列，沒有人作答的答案為 0。
+    列的順序同原本的逐題迴圈：依題目，先列各學期再列各學年總和。
+    """
+    df = df[df['sem'].notna()]
+    sems = sorted(df['sem'].unique())
+    years = sorted(df['sem'].str[:3].unique())
+    if not sems:
+        return pd.DataFrame(columns=ANALYZE_COLUMNS)
+
+    # 1. 轉成長表，只保留答案為 1~5 的作答
+    long = df.melt(id_vars='sem', value_vars=qids, var_name='qid', value_name='answer')
+    long['answer'] = pd.to_numeric(long['answer'], errors='coerce')
+    long = long[long['answer'].isin(ANSWERS)]
+
+    # 2. 學年總和的列：sem 換成 {學年}T 後接在學期的列後面，一次 crosstab
+    both = pd.concat([long, long.assign(sem=long['sem'].str[:3] + YEAR_SUFFIX)], ignore_index=True)
+    counts = pd.crosstab([both['sem'], both['qid']], both['answer'].astype('int64'))
+
+    # 3. 補齊沒有作答的 (學期, 題目) 與答案，並排成原本的順序
+    order = sems + [f'{y}{YEAR_SUFFIX}' for y in years]
+    full_index = pd.MultiIndex.from_tuples([(s, q) for q in qids for s in order], names=['sem', 'qid'])
+    counts = counts.reindex(index=full_index, columns=ANSWERS, fill_value=0).astype('int64')
+    counts.columns = COUNT_COLUMNS
+    counts['total'] = counts[COUNT_COLUMNS].sum(axis=1)
+    return counts.reset_index()[ANALYZE_COLUMNS]
+
+
+def tabulate_source(db, kind):
+    """讀取一個學制的問卷資料並寫入統計結果，回傳 upsert_many 的結果"""
+    spec = LD_SOURCES[kind]
+    frames = list(db.iter_query(spec['table'], columns=['sem'] + QID_LIST))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['sem'] + QID_LIST)
+    result = tabulate_answers(df)
+    return db.upsert_many(spec['analyze_table'], ['sem', 'qid'], ANALYZE_COLUMNS, to_db_values(result), on_conflict="skip")
+
+
+def ensure_state_table(db):
+    """狀態表不存在時依後端建立 (DDL 會 commit，請在寫入交易開始前呼叫)"""
+    if STATE_TABLE.lower() in (t.lower() for t in db.backend.list_tables(db.conn)):
+        return
+    text_type, int_type, time_type = _STATE_TYPES[db.backend.name]
+    db.cursor.execute(
+        f"CREATE TABLE {STATE_TABLE} (source {text_type}, sem {text_type}, row_count {int_type}, "
+        f"max_ids {int_type}, max_update_time {text_type}, tabulated_at {time_type})"
+    )
+    db.conn.commit()
+
+
+def _fingerprint(row_count, max_ids, max_update_time):
+    # 各後端回傳的型別不同 (例如 update_time 可能是字串或 datetime)，統一後再比較
+    return (int(row_count), None if max_ids is None else int(max_ids),
+            None if max_update_time is None else str(max_update_time))
+
+
+def source_fingerprints(db, kind):
+    """來源資料表目前每個學期的指紋：{sem: (筆數, 最大 ids, 最新 update_time)}"""
+    db.cursor.execute(f"SELECT sem, COUNT(*), MAX(ids), MAX(update_time) FROM {LD_SOURCES[kind]['table']} "
+                      f"WHERE sem IS NOT NULL GROUP BY sem")
+    return {r[0]: _fingerprint(*r[1:]) for r in db.cursor.fetchall()}
+
+
+def stored_fingerprints(db, kind):
+    """狀態表中上次統計時每個學期的指紋"""
+    db.cursor.execute(f"SELECT sem, row_count, max_ids, max_update_time FROM {STATE_TABLE} WHERE source=?", (kind,))
+    return {r[0]: _fingerprint(*r[1:]) for r in db.cursor.fetchall()}
+
+
+def recompute_source(db, kind, dry_run=False):
+    """
+    重新計算模式：只重新統計來源資料有異動 (新增、更新或刪除) 的學期與其學年總和。
+    各學期的統計結果以 replace_partition 整批取代，狀態表在同一個交易內更新 (中斷時兩者一起回復)。
+    回傳 [(sem, 刪除筆數, 新增筆數), ...]
+    """
+    spec = LD_SOURCES[kind]
+    current = source_fingerprints(db, kind)
+    stored = stored_fingerprints(db, kind)
+    changed = sorted({sem for sem in current if stored.get(sem) != current[sem]} | (set(stored) - set(current)))
+    if not changed:
+        return []
+
+    # 1. 學年總和需要整個學年的資料：讀取異動學期所在學年的全部學期
+    years = sorted({sem[:3] for sem in changed})
+    year_sems = [sem for sem in current if sem[:3] in years]
+    frames = []
+    if year_sems:
+        where = f"sem IN ({','.join(['?'] * len(year_sems))})"
+        frames = list(db.iter_query(spec['table'], columns=['sem'] + QID_LIST, where=where, params=tuple(year_sems)))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['sem'] + QID_LIST)
+    result = tabulate_answers(df)
+    rows_by_sem = {sem: to_db_values(part) for sem, part in result.groupby('sem', sort=False)}
+
+    # 2. 逐學期取代統計結果，已不存在的學期 (或學年) 取代為空 = 刪除；再更新狀態表
+    summary = []
+    with db.transaction(report=False):
+        for sem in changed + [f'{y}{YEAR_SUFFIX}' for y in years]:
+            stats = db.replace_partition(spec['analyze_table'], ['sem'], (sem,), ANALYZE_COLUMNS,
+                                         rows_by_sem.get(sem, []), dry_run=dry_run)
+            summary.append((sem, stats['deleted'], stats['inserted']))
+        if not dry_run:
+            tabulated_at = datetime.now().replace(microsecond=0)
+            if db.backend.name == 'sqlite':
+                tabulated_at = tabulated_at.isoformat(' ')
+            db.cursor.executemany(f"DELETE FROM {STATE_TABLE} WHERE source=? AND sem=?", [(kind, sem) for sem in changed])
+            db.cursor.executemany(
+                f"INSERT INTO {STATE_TABLE} (source, sem, row_count, max_ids, max_update_time, tabulated_at) "
+                f"VALUES (?,?,?,?,?,?)",
+                [(kind, sem) + current[sem] + (tabulated_at,) for sem in changed if sem in current]
+            )
+    return summary
+
+
+def run_tabulation(kinds=tuple(LD_SOURCES), recompute=False, dry_run=False):
+    """
+    一次執行多個學制的問卷統計 (同一個連線、同一個交易)。
+    recompute: 重新計算模式 (只取代來源資料有異動的學期)；dry_run: 只列出各學期會刪除與新增的筆數
+    """
+    db = AccessHelper()
+    try:
+        if recompute:
+            ensure_state_table(db)
+        with db.transaction():
+            for kind in kinds:
+                label = LD_SOURCES[kind]['label']
+                if not recompute:
+                    stats = tabulate_source(db, kind)
+                    print(f"[{label}] 統計完成！重複資料：{stats['skipped']} 筆，匯入新資料：{stats['inserted']} 筆")
+                    continue
+                summary = recompute_source(db, kind, dry_run=dry_run)
+                if not summary:
+                    print(f"[{label}] 來源資料沒有異動，不需重新計算。")
+                    continue
+                print(f"[{label}] 重新計算的學期：")
+                print("  sem      刪除舊資料      新增")
+                for sem, deleted, inserted in summary:
+                    print(f"  {sem:<8}{deleted:>10}{inserted:>10}")
+                print(f"[{label}] 重新計算完成！共 {len(summary)} 個學期，"
+                      f"刪除 {sum(s[1] for s in summary)} 筆，新增 {sum(s[2] for s in summary)} 筆")
+        if dry_run:
+            print("dry-run 模式：未寫入資料庫。")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="離系問卷統計 (大學部與研究所)")
+    parser.add_argument('--only', choices=list(LD_SOURCES), help="只統計指定學制 (U 大學部 / G 研究所)")
+    parser.add_argument('--recompute', action='store_true',
+                        help="重新計算來源資料有異動的學期 (取代既有統計結果，而不是略過)")
+    parser.add_argument('--dry-run', action='store_true', help="搭配 --recompute：只列出各學期會刪除與新增的筆數，不寫入資料庫")
+    args = parser.parse_args()
+    if args.dry_run and not args.recompute:
+        parser.error("--dry-run 需搭配 --recompute 使用")
+    run_tabulation([args.only] if args.only else list(LD_SOURCES), recompute=args.recompute, dry_run=args.dry_run)
@@ -1,6 +1,11 @@
+import argparse
 import pandas as pd
 import os
 from Accessdb import AccessHelper
+from ImportManifest import check_import, record_import
+from IngestEngine import IngestEngine, iter_frame_batches
+from DataValidation import split_valid_rows
+from SnapshotDiff import load_snapshot_state, save_snapshot_state, snapshot_hashes, diff_snapshot
 
 # 離系問卷資料讀取程式（大學部）
 
@@ -15,6 +20,18 @@ columns = [
     'A31','A32','A33','A34','A35','A36','update_time'
 ]
 
+parser = argparse.ArgumentParser(description="離系問卷資料匯入")
+parser.add_argument('--force', action='store_true', help="檔案已匯入過仍強制重新匯入")
+parser.add_argument('--full', action='store_true', help="不使用快照差異比對，整份檔案與資料庫比對")
+args = parser.parse_args()
+
+# 同一份檔案 (內容未變動) 已匯入過就不再讀檔比對
+db = AccessHelper()
+skip, content_hash = check_import(db.conn, data_path, table_name, force=args.force, backend=db.backend.name)
+if skip:
+    db.close()
+    raise SystemExit(0)
+
 # 3. 依副檔名自動選擇讀取方式
 ext = os.path.splitext(data_path)[1].lower()
 if ext == '.csv':
@@ -25,24 +42,44 @@ else:
     raise ValueError('不支援的檔案格式')
 
 df = df[columns]
+df = split_valid_rows(df, table_name, data_path)  # 整批檢核 (必填鍵值、Likert 1~5)，不合格的列寫入拒收檔
+key_columns = ['uid', 'sem', 'sqnum']
 
-# 4. 數字欄位轉型
-for col in ['A11','A12','A13','A14','A15','A21','A22','A23','A24','A25','A26','A27','A28','A29','A210','A211']:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
+# 問卷匯出檔為累積快照：有上一次的快照狀態時只保留新增或內容變動的列 (差異匯入)
+previous = None if args.full else load_snapshot_state(table_name, db.conn, table_name, db.db_id)
+if previous is None:
+    hashes = snapshot_hashes(df, key_columns)
+    on_conflict = "skip"
+else:
+    df, hashes, stats = diff_snapshot(df, key_columns, previous)
+    on_conflict = "update"  # 內容變動的列以新值更新
+    print(f"快照差異：新增 {stats['new']} 筆、變動 {stats['changed']} 筆、未變動 {stats['unchanged']} 筆、"
+          f"新快照中消失 {stats['disappeared']} 筆")
 
-# 5. 寫入Access，比對uid、sem和sqnum避免資料重複
-db = AccessHelper()
-repeat_count = 0
-import_count = 0
-
-for _, row in df.iterrows():
-    where = "uid=? AND sem=? AND sqnum=?"
-    params = (row['uid'], row['sem'], row['sqnum'])
-    if db.is_duplicate(table_name, where, params):
-        repeat_count += 1
-        continue
-    db.insert_row(table_name, columns, tuple(row[col] for col in columns))
-    import_count += 1
+# 4. 數字欄位轉型 (管線生產者逐批轉換)
+numeric_cols = ['A11','A12','A13','A14','A15','A21','A22','A23','A24','A25','A26','A27','A28','A29','A210','A211']
+
+def produce_batches():
+    for chunk in iter_frame_batches(df):
+        chunk = chunk.copy()
+        for col in numeric_cols:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+        yield list(chunk.itertuples(index=False, name=None))
+
+# 5. 寫入Access，以集合方式比對uid、sem和sqnum避免資料重複 (寫入者逐批寫入，整份檔案同一交易)
+result = {'inserted': 0, 'skipped': 0, 'updated': 0}
+
+def write_batch(batch):
+    for k, v in db.upsert_many(table_name, key_columns, columns, batch, on_conflict=on_conflict).items():
+        result[k] += v
+
+with db.transaction(report=False):
+    IngestEngine(write_batch, label=table_name).run(produce_batches())
+repeat_count = result['skipped']
+import_count = result['inserted']
+update_count = result['updated']
+save_snapshot_state(table_name, hashes, db.conn, table_name, db.db_id)
+record_import(db.conn, data_path, table_name, import_count + update_count, content_hash, backend=db.backend.name)
 
 db.close()
-print(f"匯入完成！重複資料：{repeat_count} 筆，匯入新資料：{import_count} 筆")
\ No newline at end of file
+print(f"匯入完成！重複資料：{repeat_count} 筆，匯入新資料：{import_count} 筆，更新資料：{update_count} 筆")
\ No newline at end of file
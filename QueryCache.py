@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import pandas as pd
+
+# 查詢結果快取：報表程式重複讀取未變動的資料表時，直接讀取本機 Parquet 檔，跳過緩慢的 ODBC 讀取
+# 快取鍵 = SQL 文字 + 相關資料表的「指紋」(筆數、最大自動編號) + 資料庫檔案的更新時間與大小
+# 資料表沒有逐筆的更新時間欄位，UPDATE (例如課名更正、upsert_many 更新旗標) 不會改變筆數與最大自動編號，
+# 因此以資料庫檔案 (含 SQLite / DuckDB 的 WAL 檔) 的修改時間作為更新時間：任何寫入 (包含在 Access 中手動修改) 提交後都會改變，
+# 只需一次 os.stat，不必掃描整張表。代價是寫入任一資料表後，所有查詢的快取都會重新讀取一次
+
+# 快取資料夾、容量上限 (MB) 與開關，可由環境變數調整
+QUERY_CACHE_DIR = os.environ.get('IEET_QUERY_CACHE_DIR', os.path.join('cache', 'query'))
+QUERY_CACHE_MAX_BYTES = int(os.environ.get('IEET_QUERY_CACHE_MAX_MB', '200')) * 1024 * 1024
+QUERY_CACHE_ENABLED = os.environ.get('IEET_QUERY_CACHE', '1') != '0'
+
+# 各資料表的自動編號欄位 (指紋取最大值；未列出的資料表只使用 COUNT(*))
+TABLE_ID_COLUMNS = {
+    'LDUdataAnalyze': 'id',
+    'LDGdataAnalyze': 'id',
+    'STscoreAnalyze': 'id',
+    'Course_Matrix': 'matrix_id',
+    'Courses': 'id',
+    'EmployerSurvey': 'id',
+}
+
+# 資料庫檔案與寫入時一併更新的附屬檔 (SQLite 的 -wal、DuckDB 的 .wal)
+_DB_FILE_SUFFIXES = ('', '-wal', '.wal')
+
+_table_pattern = re.compile(r'\b(?:FROM|JOIN)\s+\[?(\w+)\]?', re.IGNORECASE)
+
+
+def find_tables(sql):
+    """從 SQL 的 FROM / JOIN 子句找出所有相關資料表名稱"""
+    return sorted(set(_table_pattern.findall(sql)))
+
+
+def table_fingerprint(conn, table):
+    """以一次彙總查詢取得資料表指紋 (筆數、最大自動編號)"""
+    id_col = TABLE_ID_COLUMNS.get(table)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*){f', MAX([{id_col}])' if id_col else ''} FROM {table}")
+    fingerprint = tuple(cursor.fetchone())
+    cursor.close()
+    return fingerprint
+
+
+def database_state(db_path):
+    """資料庫檔案 (與 WAL 檔) 的修改時間與大小，資料庫有任何寫入提交後都會改變"""
+    state = []
+    for suffix in _DB_FILE_SUFFIXES:
+        path = db_path + suffix
+        if os.path.exists(path):
+            st = os.stat(path)
+            state.append((suffix, st.st_mtime_ns, st.st_size))
+    return state
+
+
+def _evict(max_bytes):
+    """依最近使用時間 (mtime) 刪除最舊的快取檔，直到總容量低於上限 (LRU)"""
+    files = []
+    for name in os.listdir(QUERY_CACHE_DIR):
+        if name.endswith('.parquet'):
+            path = os.path.join(QUERY_CACHE_DIR, name)
+            st = os.stat(path)
+            files.append((st.st_mtime, st.st_size, path))
+
+    total = sum(f[1] for f in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def read_sql_cached(conn, sql, tables=None, db_id='', db_path=None):
+    """
+    讀取查詢結果 (read-through cache)。
+    conn: 資料庫連線
+    sql: 查詢 SQL
+    tables: 查詢涉及的資料表 list，預設由 SQL 自動判斷
+    db_id: 資料庫識別字串 (例如檔案路徑)，避免不同資料庫共用快取
+    db_path: 資料庫檔案路徑 (檢查檔案更新時間)；未提供時無法確認資料是否變動，直接讀取資料庫
+    快取命中時直接讀取 Parquet；未命中或快取不可用時讀取資料庫並寫入快取。
+    """
+    if not QUERY_CACHE_ENABLED or not db_path:
+        return pd.read_sql(sql, conn)
+
+    try:
+        fingerprints = [(t, table_fingerprint(conn, t)) for t in (tables or find_tables(sql))]
+        fingerprints.append(('database', database_state(db_path)))
+    except Exception as e:
+        print(f"(查詢快取) 無法取得資料表指紋，改為直接讀取資料庫: {e}")
+        return pd.read_sql(sql, conn)
+
+    normalized_sql = ' '.join(sql.split())
+    key = hashlib.sha256(repr((db_id, normalized_sql, fingerprints)).encode('utf-8')).hexdigest()
+    cache_path = os.path.join(QUERY_CACHE_DIR, f"{key}.parquet")
+
+    if os.path.exists(cache_path):
+        try:
+            df = pd.read_parquet(cache_path)
+            os.utime(cache_path)  # 更新最近使用時間
+            return df
+        except Exception:
+            pass  # 快取檔損毀或缺少 pyarrow，重新讀取資料庫
+
+    df = pd.read_sql(sql, conn)
+    try:
+        os.makedirs(QUERY_CACHE_DIR, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        _evict(QUERY_CACHE_MAX_BYTES)
+    except Exception as e:
+        # 未安裝 pyarrow 或欄位型別無法轉為 Parquet 時不快取，不影響結果
+        print(f"(查詢快取) 結果未快取: {e}")
+    return df
\ No newline at end of file
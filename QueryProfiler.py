@@ -0,0 +1,288 @@
+import atexit
+import heapq
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+# 查詢效能紀錄：統計每種 SQL 樣板的呼叫次數、總耗時、延遲百分位數與讀寫筆數，
+# 程式結束時輸出 JSON 報告，並記錄超過門檻的慢查詢，用來判斷哪些語句最值得批次化
+
+# 開關、報告資料夾與慢查詢門檻 (毫秒)，可由環境變數調整
+QUERY_PROFILE_ENABLED = os.environ.get('IEET_QUERY_PROFILE', '1') != '0'
+QUERY_PROFILE_DIR = os.environ.get('IEET_QUERY_PROFILE_DIR', os.path.join('logs', 'query_profile'))
+SLOW_QUERY_MS = float(os.environ.get('IEET_SLOW_QUERY_MS', '500'))
+
+# 慢查詢紀錄最多保留的筆數
+MAX_SLOW_QUERIES = 200
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r'\b\d+(?:\.\d+)?\b')
+_in_list = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """將 SQL 正規化為樣板：壓縮空白、常數改為 ?、IN (?,?,...) 合併為 IN (?...)"""
+    sql = ' '.join(sql.split())
+    sql = _string_literal.sub('?', sql)
+    sql = _number_literal.sub('?', sql)
+    return _in_list.sub('IN (?...)', sql)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+# 每個樣板保留的延遲抽樣數 (超過時以水塘抽樣替換，百分位數由抽樣估計)
+LATENCY_SAMPLES = 1024
+
+
+class QueryCall:
+    """一次呼叫的耗時與筆數 (execute 之後的 fetch 也會累加進來，直到 cursor 執行下一個語句或關閉)"""
+    __slots__ = ('template', 'secs', 'rows')
+
+    def __init__(self, template):
+        self.template = template
+        self.secs = 0.0
+        self.rows = 0
+
+
+class TemplateStats:
+    """單一 SQL 樣板的累計統計：次數、總耗時、最大耗時、總筆數與固定大小的延遲抽樣"""
+    __slots__ = ('calls', 'total', 'max', 'rows', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = []
+
+    def add(self, secs, rows, rng):
+        self.calls += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+        self.rows += rows
+        if len(self.samples) < LATENCY_SAMPLES:
+            self.samples.append(secs)
+        else:
+            j = rng.randrange(self.calls)
+            if j < LATENCY_SAMPLES:
+                self.samples[j] = secs
+
+
+class QueryProfiler:
+    """收集各 SQL 樣板的執行統計 (全程式共用一個 PROFILER 實例)
+
+    每個樣板只保留累計值與固定大小的抽樣，慢查詢只保留最慢的 MAX_SLOW_QUERIES 筆，
+    記憶體用量不隨呼叫次數增加 (逐列匯入也一樣)
+    """
+
+    def __init__(self):
+        self.stats = {}   # 樣板 -> TemplateStats
+        self.started = time.perf_counter()
+        self._open = {}   # 尚未結算的呼叫 (每個 cursor 最多一筆)
+        self._slow = []   # 慢查詢 min-heap: (秒數, 序號, 樣板, 筆數)
+        self._seq = 0
+        self._rng = random.Random(0)
+        self._lock = threading.Lock()
+        self._registered = False
+
+    def start_call(self, sql):
+        """開始記錄一次呼叫，回傳可累加耗時與筆數的 QueryCall (結束時須呼叫 finish_call)"""
+        call = QueryCall(normalize_sql(sql))
+        with self._lock:
+            self._open[id(call)] = call
+            if not self._registered:
+                atexit.register(self.write_report)
+                self._registered = True
+        return call
+
+    def finish_call(self, call):
+        """結算一次呼叫：併入樣板統計，超過門檻時列入慢查詢"""
+        with self._lock:
+            if self._open.pop(id(call), None) is None:
+                return
+            self._record(call)
+
+    def _record(self, call):
+        self.stats.setdefault(call.template, TemplateStats()).add(call.secs, call.rows, self._rng)
+        if call.secs * 1000 >= SLOW_QUERY_MS:
+            self._seq += 1
+            entry = (call.secs, self._seq, call.template, call.rows)
+            if len(self._slow) < MAX_SLOW_QUERIES:
+                heapq.heappush(self._slow, entry)
+            else:
+                heapq.heappushpop(self._slow, entry)
+
+    def flush(self):
+        """結算所有尚未結束的呼叫 (輸出報告前呼叫)"""
+        with self._lock:
+            for call in list(self._open.values()):
+                self._record(call)
+            self._open.clear()
+
+    def slow_queries(self):
+        """回傳耗時 (含 fetch) 超過 SLOW_QUERY_MS 的呼叫，由慢到快排序"""
+        return [{'sql': template, 'ms': round(secs * 1000, 2), 'rows': rows}
+                for secs, _, template, rows in sorted(self._slow, reverse=True)]
+
+    def summary(self):
+        """回傳依總耗時排序的統計 list (百分位數在呼叫數超過 LATENCY_SAMPLES 時為抽樣估計)"""
+        result = []
+        for template, entry in self.stats.items():
+            latencies = sorted(secs * 1000 for secs in entry.samples)
+            result.append({
+                'sql': template,
+                'calls': entry.calls,
+                'total_ms': round(entry.total * 1000, 2),
+                'mean_ms': round(entry.total * 1000 / entry.calls, 3),
+                'p50_ms': round(_percentile(latencies, 50), 3),
+                'p90_ms': round(_percentile(latencies, 90), 3),
+                'p99_ms': round(_percentile(latencies, 99), 3),
+                'max_ms': round(entry.max * 1000, 3),
+                'rows': entry.rows,
+            })
+        return sorted(result, key=lambda r: r['total_ms'], reverse=True)
+
+    def write_report(self):
+        """輸出 JSON 報告 (程式結束時自動呼叫)"""
+        self.flush()
+        if not self.stats:
+            return None
+        statements = self.summary()
+        script = os.path.splitext(os.path.basename(sys.argv[0] or 'interactive'))[0]
+        report = {
+            'script': script,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'script_seconds': round(time.perf_counter() - self.started, 3),
+            'db_seconds': round(sum(s['total_ms'] for s in statements) / 1000, 3),
+            'slow_query_ms': SLOW_QUERY_MS,
+            'statements': statements,
+            'slow_queries': self.slow_queries(),
+        }
+        try:
+            os.makedirs(QUERY_PROFILE_DIR, exist_ok=True)
+            path = os.path.join(QUERY_PROFILE_DIR, f"{script}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"查詢效能報告已輸出: {path} (資料庫耗時 {report['db_seconds']} 秒 / 總耗時 {report['script_seconds']} 秒)")
+            return path
+        except OSError as e:
+            print(f"查詢效能報告輸出失敗: {e}")
+            return None
+
+
+PROFILER = QueryProfiler()
+
+
+class ProfiledCursor:
+    """包裝 cursor：記錄每次 execute / executemany 與後續 fetch 的耗時與筆數
+
+    一次呼叫在 cursor 執行下一個語句、關閉或被回收時結算
+    """
+
+    def __init__(self, cursor):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_call', None)
+
+    def _begin(self, sql):
+        self._finish()
+        call = PROFILER.start_call(sql)
+        object.__setattr__(self, '_call', call)
+        return call
+
+    def _finish(self):
+        if self._call is not None:
+            PROFILER.finish_call(self._call)
+            object.__setattr__(self, '_call', None)
+
+    def execute(self, sql, *params):
+        call = self._begin(sql)
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        finally:
+            call.secs += time.perf_counter() - start
+            rowcount = getattr(self._cursor, 'rowcount', -1)
+            if isinstance(rowcount, int) and rowcount > 0:
+                call.rows += rowcount
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        call = self._begin(sql)
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        finally:
+            call.secs += time.perf_counter() - start
+            call.rows += len(seq_of_params)
+        return self
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        if self._call is not None:
+            call = self._call
+            call.secs += time.perf_counter() - start
+            call.rows += 0 if result is None else (1 if method == 'fetchone' else len(result))
+        return result
+
+    def fetchone(self):
+        return self._fetch('fetchone')
+
+    def fetchmany(self, *args):
+        return self._fetch('fetchmany', *args)
+
+    def fetchall(self):
+        return self._fetch('fetchall')
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # fast_executemany、arraysize 等屬性直接設定到原始 cursor
+        setattr(self._cursor, name, value)
+
+
+class ProfiledConnection:
+    """包裝資料庫連線，使所有 cursor 都經過 ProfiledCursor 記錄"""
+
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+
+    def cursor(self):
+        return ProfiledCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # autocommit 等屬性直接設定到原始連線
+        setattr(self._conn, name, value)
+
+
+def profile_connection(conn):
+    """依 IEET_QUERY_PROFILE 設定包裝連線 (停用時原樣回傳)"""
+    return ProfiledConnection(conn) if QUERY_PROFILE_ENABLED else conn
\ No newline at end of file
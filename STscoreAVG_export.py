@@ -8,7 +8,7 @@ db = AccessHelper()
 
 # 2. 讀取 STscoreAnalyze 資料表，只取 total 的資料
 sql = "SELECT 學年度, 學期, 課號, 課程名稱, 平均分數, 學生總數 FROM STscoreAnalyze WHERE 分數區間='total'"
-df = pd.read_sql(sql, db.conn)
+df = db.read_sql_cached(sql)
 
 db.close()
 
@@ -1,129 +1,209 @@
+import argparse
+import os
 import pandas as pd
+from datetime import datetime
 from Accessdb import AccessHelper
+from DataNormalize import to_db_values, clean_key
+from ChangeLog import ensure_changelog_table, dirty_partitions, clear_partitions
+from ScoreDistribution import BIN_SCHEMES, accumulate_scores, empty_accumulated, merge_accumulated, distribution_frame
+from CourseScoreProfile import (PROFILE_TABLE, PROFILE_COLUMNS, WITHDRAW_SCORE, ensure_profile_table,
+                                profile_scores, iter_semester_frames, semester_keys)
 
 # 1. 設定來源資料表與分析結果資料表名稱
 source_table = 'STscore'         # 原始成績資料表
 analyze_table = 'STscoreAnalyze' # 分析結果資料表
 
-# 2. 連接 Access 資料庫
+# 2. 分數區間 (分布統計用) 由 ScoreDistribution.BIN_SCHEMES 定義：寫入資料表使用十分一段 ('ten')，
+#    以 --scheme 可在同一次計算另外輸出五分一段 ('five') 或等第 ('letter') 的分布 (CSV)
+parser = argparse.ArgumentParser(description="學生成績分布分析")
+parser.add_argument('--scheme', action='append', default=[], choices=[s for s in BIN_SCHEMES if s != 'ten'],
+                    help="另外輸出的分段方式 (可重複指定)")
+parser.add_argument('--incremental', action='store_true',
+                    help="只重新計算 STscoreRead 異動紀錄中的課程所在的學期")
+parser.add_argument('--dry-run', action='store_true', help="只列出各學期會刪除與新增的筆數，不寫入資料庫")
+args = parser.parse_args()
+schemes = ['ten'] + list(dict.fromkeys(args.scheme))
+group_cols = ['學年度', '學期', '課號', '課程名稱']
+partition_cols = ['學年度', '學期']  # 寫入時以學期為單位整批取代
+
+# 3. 連接 Access 資料庫
 db = AccessHelper()
+ensure_changelog_table(db.conn, source_table)
+ensure_profile_table(db.conn)
+
+# 學期鍵值一律以正規化字串 (CourseScoreProfile.semester_keys) 比對；各資料表的學年度 / 學期欄位型別可能不同
+# (例如異動紀錄為文字、STscore 為整數)，查詢與刪除時再轉回該資料表欄位的型別
+_column_types = {}
+
+
+def native_semester(table, semester):
+    """正規化的學期鍵值轉為資料表欄位實際的型別 (讀一筆資料判斷，整數欄位以整數查詢、文字欄位以字串查詢)"""
+    if table not in _column_types:
+        db.cursor.execute(f"SELECT TOP 1 {', '.join(partition_cols)} FROM {table}")
+        row = db.cursor.fetchone()
+        _column_types[table] = [type(v) for v in row] if row else [str] * len(partition_cols)
+    return tuple(t(k) if t in (int, float) and k != '' else k for k, t in zip(semester, _column_types[table]))
+
+
+def rows_by_semester(df, cols):
+    """學年度 / 學期正規化 (例如 '112.0' -> '112') 後依學期分組，回傳 {學期: 寫入用的 list of tuple}"""
+    df = df.assign(**{c: clean_key(df[c]) for c in partition_cols})
+    return {semester: to_db_values(part[cols]) for semester, part in df.groupby(partition_cols, sort=False)}
+
+
+# 增量模式：只重新計算異動紀錄中的課程所在的學期，成本只與異動的學期有關
+dirty = None  # 待重新計算的 (學年度, 學期, 課號)；None 表示完整重新計算
+# 分析結果或課程成績概況任一張表沒有資料時 (例如升級後概況表尚未計算過)，只算異動的學期會缺少其他學期，改為完整重新計算
+if args.incremental:
+    empty_tables = []
+    for table in (analyze_table, PROFILE_TABLE):
+        db.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        if db.cursor.fetchone()[0] == 0:
+            empty_tables.append(table)
+    if empty_tables:
+        print(f"{'、'.join(empty_tables)} 尚無資料，改為完整重新計算。")
+    else:
+        dirty = dirty_partitions(db.conn, source_table)
+        print(f"增量模式：共 {len(dirty)} 個課程 (學年度/學期/課號) 有異動，"
+              f"重新計算 {len(dirty[partition_cols].drop_duplicates())} 個學期。")
+        if dirty.empty:
+            print("沒有異動的課程，不需重新計算。")
+            db.close()
+            exit()
+
+if dirty is None:
+    queries = [(None, ())]
+else:
+    dirty['semester'] = pd.Series(semester_keys(dirty, partition_cols), index=dirty.index, dtype=object)
+    queries = [("學年度=? AND 學期=?", native_semester(source_table, semester))
+               for semester in dict.fromkeys(dirty['semester'])]
+
+# 4. 依學期順序分批讀取 STscore (只取需要的欄位)，一次只在記憶體保留一個學期：
+#    同一次掃描同時累計分數區間分布 (排除退選成績999) 與計算課程成績概況 (CourseScoreProfile，含退選人數)
+acc_parts = []  # 各學期的累計結果 (見 ScoreDistribution.accumulate_scores)
+profile_parts = []  # 各學期的課程成績概況 (見 CourseScoreProfile.profile_scores)
+read_semesters = {}  # 實際讀到成績的學期：正規化鍵值 -> 未正規化的字串 (舊版寫入分析結果時使用的格式)
+valid_count = 0
 
-# 3. 從 STscore 讀取所有成績資料
-sql = f"SELECT * FROM {source_table}"
 try:
-    df = pd.read_sql(sql, db.conn)  # 讀取成績資料為 pandas DataFrame
+    db.cursor.execute(f"SELECT COUNT(*) FROM {source_table}")
+    print("原始成績資料筆數：", db.cursor.fetchone()[0])
+
+    for where, params in queries:
+        chunks = db.iter_query(
+            source_table,
+            columns=group_cols + ['成績', '等第成績'],
+            where=where,
+            params=params,
+            dtypes={'成績': 'float64'},
+            order_by="學年度, 學期"
+        )
+        for semester_df in iter_semester_frames(chunks, partition_cols):
+            read_semesters[semester_keys(semester_df.head(1), partition_cols)[0]] = \
+                tuple(semester_df[partition_cols].iloc[0].astype(str))
+            profile_parts.append(profile_scores(semester_df))
+            scored = semester_df[semester_df['成績'] != WITHDRAW_SCORE]  # 未退選 (含空白成績)
+            if valid_count == 0:
+                print("未退選成績資料前5筆：")
+                print(scored.head())
+            valid_count += len(scored)
+            acc_parts.append(accumulate_scores(scored, group_cols, '成績', schemes))
 except Exception as e:
     print("讀取成績資料失敗，請檢查資料庫連線或 SQL 語法。錯誤訊息：", e)
     db.close()
     exit()
 
-# 檢查原始成績資料
-print("原始成績資料筆數：", df.shape[0])
-if df.shape[0] == 0:
+print("未退選有效成績資料筆數：", valid_count)
+if valid_count == 0 and dirty is None:
     print("警告：原始成績資料為空，請確認 STscore 資料表有資料。")
     db.close()
     exit()
-print("原始成績資料前5筆：")
-print(df.head())
-
-# 4. 先過濾掉分數為999（退選）的學生
-df_valid = df[df['成績'] != 999]
-print("未退選有效成績資料筆數：", df_valid.shape[0])
-
-# 5. 設定分數區間與標籤（分布統計用）
-bins = [0,10,20,30,40,50,60,70,80,90,100]
-labels = ["0-9","10-19","20-29","30-39","40-49","50-59","60-69","70-79","80-89","90-100"]
-
-records = []  # 用來存放所有分析結果
-
-# 6. 依「學年度、學期、課號、課程名稱」分組，統計各分數區間人數、平均分數、學生總數
-for (year, sem, course_id, course_name), group in df_valid.groupby(['學年度', '學期', '課號', '課程名稱']):
-    # 計算 total 平均分數（該課該學期所有未退選學生的平均）
-    total_avg_score = group['成績'].mean()
-    total_students = group['成績'].count()
-    # 加入 total 統計
-    records.append({
-        '學年度': str(year),
-        '學期': str(sem),
-        '課號': str(course_id),
-        '課程名稱': str(course_name),
-        '分數區間': 'total',
-        '人數': int(total_students),
-        '平均分數': float(total_avg_score) if pd.notnull(total_avg_score) else 0.0,
-        '學生總數': int(total_students)
-    })
-    # 各分數區間統計
-    dist = pd.cut(group['成績'], bins=bins, labels=labels, right=False)
-    for label in labels:
-        group_label = group[dist == label]
-        label_count = group_label.shape[0]
-        label_avg = group_label['成績'].mean() if label_count > 0 else 0.0
-        records.append({
-            '學年度': str(year),
-            '學期': str(sem),
-            '課號': str(course_id),
-            '課程名稱': str(course_name),
-            '分數區間': str(label),
-            '人數': int(label_count),
-            '平均分數': float(label_avg) if pd.notnull(label_avg) else 0.0,
-            '學生總數': int(total_students)
-        })
-
-# 檢查分析結果
-print("分析結果筆數：", len(records))
-if len(records) == 0:
+
+# 5. 合併各批的累計結果，依「學年度、學期、課號、課程名稱」展開為每課程 total + 各分數區間的人數、平均分數、學生總數
+acc = merge_accumulated(acc_parts or [empty_accumulated(group_cols, '成績', schemes)])
+result_df = distribution_frame(acc, 'ten')
+profile_df = pd.concat(profile_parts, ignore_index=True) if profile_parts else pd.DataFrame(columns=PROFILE_COLUMNS)
+print("課程成績概況筆數：", len(profile_df))
+
+# 檢查分析結果 (增量模式下異動學期的成績可能已全部刪除，結果為空時只刪除舊的分析結果)
+print("分析結果筆數：", len(result_df))
+if len(result_df) == 0 and dirty is None:
     print("警告：分析結果為空，請檢查分組欄位或原始資料內容。")
     db.close()
     exit()
 print("分析結果前5筆：")
-print(records[:5])
+print(result_df.head())
 
-# 7. 逐筆寫入 Access 資料表，避免重複
+# 其他分段方式輸出為 CSV (不寫入 STscoreAnalyze，避免匯出報表重複計算人數)
+for scheme in schemes[1:]:
+    os.makedirs('output_files', exist_ok=True)
+    scheme_path = os.path.join('output_files', f"STscoreDistribution_{scheme}_{datetime.today().strftime('%Y%m%d')}.csv")
+    distribution_frame(acc, scheme).to_csv(scheme_path, index=False, encoding='utf-8-sig')
+    print(f"分段方式 {scheme} 的分布已輸出至 {scheme_path}")
+
+# 6. 以學期 (學年度, 學期) 為單位整批取代 Access 資料表：
+#    每個學期刪除舊的分析結果與課程成績概況後批次寫入新結果，於同一個交易內完成 (不逐筆查重再 UPDATE / INSERT)
+#    增量模式連同清除該學期的異動紀錄在同一個交易內完成；--dry-run 只列出各學期會刪除與新增的筆數
 columns = ['學年度', '學期', '課號', '課程名稱', '分數區間', '人數', '平均分數', '學生總數']
+semester_rows = rows_by_semester(result_df, columns)
+profile_rows = rows_by_semester(profile_df, PROFILE_COLUMNS)
+if dirty is None:
+    semesters = list(dict.fromkeys(list(profile_rows) + list(semester_rows)))
+    dirty_by_semester = {}
+else:
+    # 清除異動紀錄時使用紀錄中的原始值
+    dirty_by_semester = {semester: list(part[dirty.columns.drop('semester')].itertuples(index=False, name=None))
+                         for semester, part in dirty.groupby('semester', sort=False)}
+    semesters = list(dirty_by_semester)
 success_count = 0
 fail_count = 0
+summary = []
+skipped = []  # 拒絕取代的學期 (STscore 仍有成績，卻沒有讀到)
+
+try:
+    for semester in semesters:
+        rows = semester_rows.get(semester, [])
+        # 沒有任何概況資料 = 沒有讀到這個學期的成績；STscore 仍有成績時表示鍵值對不上，不可刪除舊結果後寫入空資料
+        if not profile_rows.get(semester) and semester not in read_semesters:
+            db.cursor.execute(f"SELECT COUNT(*) FROM {source_table} WHERE 學年度=? AND 學期=?",
+                              native_semester(source_table, semester))
+            remaining = db.cursor.fetchone()[0]
+            if remaining:
+                print(f"錯誤：{semester[0]} 學年度第 {semester[1]} 學期在 {source_table} 仍有 {remaining} 筆成績，"
+                      f"但未讀到任何資料，不取代該學期的分析結果 (異動紀錄保留)。")
+                skipped.append(semester)
+                continue
+        with db.transaction(report=False):
+            result = db.replace_partition(analyze_table, partition_cols, native_semester(analyze_table, semester),
+                                          columns, rows, dry_run=args.dry_run)
+            db.replace_partition(PROFILE_TABLE, partition_cols, native_semester(PROFILE_TABLE, semester),
+                                 PROFILE_COLUMNS, profile_rows.get(semester, []), dry_run=args.dry_run)
+            legacy = read_semesters.get(semester)
+            if legacy and legacy != semester and not args.dry_run:
+                # 舊版以未正規化的鍵值寫入的結果 (例如 '112.0') 一併刪除，避免與新結果重複
+                for table in (analyze_table, PROFILE_TABLE):
+                    db.cursor.execute(f"DELETE FROM {table} WHERE 學年度=? AND 學期=?", legacy)
+            if semester in dirty_by_semester and not args.dry_run:
+                clear_partitions(db.cursor, source_table, dirty_by_semester[semester])
+        summary.append((semester, result['deleted'], result['inserted']))
+        success_count += result['inserted']
+    if dirty is None and not args.dry_run and not skipped:
+        with db.transaction(report=False):
+            clear_partitions(db.cursor, source_table)
+except Exception as e:
+    print("批次寫入失敗，已回復該學期尚未提交的變更。")
+    print("錯誤訊息：", e)
+    fail_count = len(result_df) - success_count
 
-for row in records:
-    values = (
-        row['學年度'],
-        row['學期'],
-        row['課號'],
-        row['課程名稱'],
-        row['分數區間'],
-        row['人數'],
-        row['平均分數'],
-        row['學生總數']
-    )
-    where = "學年度=? AND 學期=? AND 課號=? AND 分數區間=?"
-    params = (row['學年度'], row['學期'], row['課號'], row['分數區間'])
-    if db.is_duplicate(analyze_table, where, params):
-        # 主鍵重複時用 UPDATE 更新資料
-        try:
-            update_sql = f"""
-            UPDATE {analyze_table}
-            SET 課程名稱=?, 人數=?, 平均分數=?, 學生總數=?
-            WHERE 學年度=? AND 學期=? AND 課號=? AND 分數區間=?
-            """
-            update_params = (
-                row['課程名稱'], row['人數'], row['平均分數'], row['學生總數'],
-                row['學年度'], row['學期'], row['課號'], row['分數區間']
-            )
-            db.cursor.execute(update_sql, update_params)
-            db.conn.commit()
-            print("已更新重複資料：", values)
-            success_count += 1
-        except Exception as e:
-            print("更新失敗：", values)
-            print("錯誤訊息：", e)
-            fail_count += 1
-        continue
-    try:
-        db.insert_row(analyze_table, columns, values)
-        success_count += 1
-    except Exception as e:
-        print("寫入失敗：", values)
-        print("錯誤訊息：", e)
-        fail_count += 1
+print("-" * 40)
+print("學年度  學期    刪除舊資料      新增")
+for (year, sem), deleted, inserted in summary:
+    print(f"{year:<8}{sem:<6}{deleted:>12}{inserted:>10}")
+print(f"共 {len(summary)} 個學期，刪除 {sum(d for _, d, _ in summary)} 筆，新增 {success_count} 筆。")
+if args.dry_run:
+    print("dry-run 模式：未寫入資料庫。")
+    success_count = 0
+print("-" * 40)
 
 db.close()
 
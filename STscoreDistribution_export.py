@@ -10,7 +10,7 @@ db = AccessHelper()
 
 # 2. 讀取 STscoreAnalyze 資料表（只取分數區間，不含 total）
 sql = "SELECT 學年度, 課號, 課程名稱, 分數區間, 人數 FROM STscoreAnalyze WHERE 分數區間 <> 'total'"
-df = pd.read_sql(sql, db.conn)
+df = db.read_sql_cached(sql)
 db.close()
 
 # 統一課號與課程名稱格式
@@ -1,7 +1,17 @@
+import argparse
+import numpy as np
 import pandas as pd
-import pyodbc
 import os
 import time
+from Accessdb import connect, db_identity
+from ExcelCache import read_excel_cached
+from DataNormalize import clean_key
+from ImportManifest import check_import, record_import
+from IngestEngine import IngestEngine, iter_frame_batches
+from DataValidation import split_valid_rows
+from ImportCheckpoint import ImportCheckpoint, discard_checkpoint
+from KeyHashIndex import KeyHashIndex, key_hashes
+from ChangeLog import ensure_changelog_table, log_partitions
 
 # ==========================================
 # 1. 設定檔案與資料表
@@ -10,44 +20,53 @@ db_path = 'IEETdatabase.accdb'
 data_path = r'input_files\學生成績\電機系109-113學年度大學部及碩士班博士班學生所有成績.xlsx'
 table_name = 'STscore'
 BATCH_SIZE = 1000  # 設定每 1000 筆寫入一次並顯示進度
+CLEAN_CHUNK_SIZE = 10000  # 生產者每次清洗、比對的列數 (再切成 BATCH_SIZE 交給寫入者)
+INSERT_COLS = [
+    '學年度', '學期', '開課系所代碼', '開課系所', '課號', '課程名稱', '必選修',
+    '學號', '姓名', '學分數', '成績', '等第成績'
+]
+KEY_COLS = ['學年度', '學期', '課號', '學號']  # 成績紀錄的比對鍵值
+PARTITION_COLS = ['學年度', '學期', '課號']  # 成績分析的分割區 (異動紀錄鍵值)
+KEY_IDX = [INSERT_COLS.index(c) for c in KEY_COLS]
+PARTITION_IDX = [INSERT_COLS.index(c) for c in PARTITION_COLS]
 
 # ==========================================
 # 2. 資料庫連線工具
 # ==========================================
 def get_db_connection():
-    full_db_path = os.path.abspath(db_path)
-    conn_str = (
-        r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};'
-        rf'DBQ={full_db_path};'
-    )
-    return pyodbc.connect(conn_str)
-
-def clean_key_str(val):
-    """將資料庫或 Excel 的值統一轉為乾淨的字串 (去除 .0 與 空白)"""
-    if pd.isna(val) or val is None:
-        return ""
-    # 先轉字串 -> 去除前後空白 -> 如果有 .0 結尾則去除
-    s = str(val).strip()
-    if s.endswith('.0'):
-        s = s[:-2]
-    return s
+    # 依 IEET_DB_BACKEND 設定連線 (預設 Access)
+    return connect(db_path)
+
+def clean_scores(chunk):
+    """資料清洗 (型別轉換、關鍵欄位正規化、退選標記)，回傳 (清洗後的 DataFrame, 標記為退選的列 (布林陣列))"""
+    chunk = chunk.copy()
+
+    # 型別轉換
+    chunk['學分數'] = pd.to_numeric(chunk['學分數'], errors='coerce').fillna(0)
+    chunk['成績'] = pd.to_numeric(chunk['成績'], errors='coerce').fillna(0)
+    
+    # 強制將關鍵欄位轉為乾淨字串 (比對用，整欄向量化處理)
+    for col in ['學年度', '學期', '學號', '課號', '開課系所代碼']:
+        chunk[col] = clean_key(chunk[col])
+
+    chunk['等第成績'] = chunk['等第成績'].astype(str).replace('nan', '').str.strip()
+
+    # 4. 退選處理 (成績999)
+    withdraw_mask = (chunk['成績'] == 999) & (chunk['等第成績'] == '')
+    chunk.loc[withdraw_mask, '等第成績'] = '退選'
+    return chunk, withdraw_mask.to_numpy()
 
 # ==========================================
 # 3. 主程式邏輯
 # ==========================================
-def import_scores():
-    print(f"正在讀取 Excel 檔案: {os.path.basename(data_path)} ...")
-    
-    if not os.path.exists(data_path):
-        print(f"錯誤：找不到檔案 {data_path}")
-        return
-
-    # 1. 讀取 Excel
+def read_source(data_path):
+    """讀取 Excel、整理欄位並整批檢核，回傳待清洗的 DataFrame (欄位順序與 INSERT 相同)；讀取失敗時回傳 None"""
+    # 1. 讀取 Excel (檔案內容未變動時直接使用快取)
     try:
-        df = pd.read_excel(data_path)
+        df = read_excel_cached(data_path)
     except Exception as e:
         print(f"Excel 讀取失敗: {e}")
-        return
+        return None
 
     # 2. 欄位處理
     df.columns = [c.strip() for c in df.columns]
@@ -64,119 +83,162 @@ def import_scores():
     if '必選修' not in df.columns:
         df['必選修'] = '' 
 
-    # 3. 資料清洗
-    required_cols = [
-        '學年度', '學期', '開課系所代碼', '開課系所', '課號', '課程名稱', '必選修',
-        '學號', '姓名', '學分數', '成績', '等第成績'
-    ]
-    
-    # 確保只有需要的欄位
-    df_import = df[required_cols].copy()
+    # 3. 資料清洗 (逐塊於管線的生產者執行緒進行，見 plan_batches)
+    # 確保只有需要的欄位，並先整批檢核 (學期、成績範圍等)，不合格的列寫入拒收檔
+    return split_valid_rows(df[INSERT_COLS], table_name, data_path).reset_index(drop=True)
+
+
+class ScoreBatch(list):
+    """一批要寫入的資料列 (list of tuple)，附帶提交後檢查點要記錄的來源位置、累計統計與這批資料的鍵值雜湊"""
+
+    def __init__(self, rows, end, stats, hashes):
+        super().__init__(rows)
+        self.end = end
+        self.stats = stats
+        self.hashes = hashes
+
+
+def plan_batches(df_import, index, start, stats):
+    """
+    管線的生產者：從來源第 start 列開始逐塊清洗並與鍵值索引比對，產出要寫入的批次 (ScoreBatch)。
+    stats: 處理到 start 為止的累計統計 {'inserted', 'duplicate', 'excel_dupes', 'withdraw'}，就地累加到全部處理完畢
+    已在資料庫的列略過；Excel 本身重複的列 (有些 Excel 本身就會重複列) 只保留第一筆。
+    (續傳時，與上次已提交的列重複的列會計入資料庫重複)
+    """
+    seen = np.empty(0, dtype=np.uint64)  # 本次執行已排入寫入的鍵值雜湊
+    rows, row_hashes = [], []
+    for chunk_start in range(start, len(df_import), CLEAN_CHUNK_SIZE):
+        chunk, withdrawn = clean_scores(df_import.iloc[chunk_start:chunk_start + CLEAN_CHUNK_SIZE])
+        hashes = key_hashes(chunk, KEY_COLS)
+        in_run = np.isin(hashes, seen)
+        in_db = ~in_run & index.contains(hashes)
+        insert = ~in_run & ~in_db & ~pd.Series(hashes).duplicated(keep='first').to_numpy()
+        seen = np.union1d(seen, hashes[insert])
+
+        # 每一列處理完時的累計統計 (批次結束在哪一列，檢查點就記錄到哪一列)
+        cumulative = {
+            'inserted': np.cumsum(insert), 'duplicate': np.cumsum(in_db),
+            'excel_dupes': np.cumsum(~in_db & ~insert), 'withdraw': np.cumsum(withdrawn),
+        }
+        values = list(chunk.itertuples(index=False, name=None))
+        for pos in np.flatnonzero(insert):
+            rows.append(values[pos])
+            row_hashes.append(hashes[pos])
+            if len(rows) == BATCH_SIZE:
+                batch_stats = {k: stats[k] + int(v[pos]) for k, v in cumulative.items()}
+                yield ScoreBatch(rows, int(chunk_start + pos + 1), batch_stats, np.array(row_hashes, dtype=np.uint64))
+                rows, row_hashes = [], []
+        for k, v in cumulative.items():
+            stats[k] += int(v[-1])
+    if rows:
+        yield ScoreBatch(rows, len(df_import), dict(stats), np.array(row_hashes, dtype=np.uint64))
+
+
+def batch_committed(cursor, probe):
+    """檢查一批是否已寫入資料庫 (一批為一個交易，查這批第一筆資料的鍵值即可)"""
+    cursor.execute(
+        "SELECT COUNT(*) FROM STscore WHERE [學年度]=? AND [學期]=? AND [課號]=? AND [學號]=?",
+        tuple(probe)
+    )
+    return cursor.fetchone()[0] > 0
 
-    # 型別轉換
-    df_import['學分數'] = pd.to_numeric(df_import['學分數'], errors='coerce').fillna(0)
-    df_import['成績'] = pd.to_numeric(df_import['成績'], errors='coerce').fillna(0)
+
+def import_scores(force=False, restart=False):
+    print(f"正在讀取 Excel 檔案: {os.path.basename(data_path)} ...")
     
-    # 強制將關鍵欄位轉為乾淨字串 (比對用)
-    for col in ['學年度', '學期', '學號', '課號', '開課系所代碼']:
-        df_import[col] = df_import[col].apply(clean_key_str)
+    if not os.path.exists(data_path):
+        print(f"錯誤：找不到檔案 {data_path}")
+        return
 
-    df_import['等第成績'] = df_import['等第成績'].astype(str).replace('nan', '').str.strip()
+    # 同一份檔案 (內容未變動) 已匯入過就不再讀檔比對
+    conn = get_db_connection()
+    skip, content_hash = check_import(conn, data_path, table_name, force=force)
+    if skip:
+        conn.close()
+        return
+    cursor = conn.cursor()
+    db_id = db_identity(db_path)  # 檢查點與鍵值索引都依資料庫分開存放
+
+    # 同一份檔案上次匯入同一個資料庫中斷時，從檢查點記錄的來源位置之後繼續 (已提交的部分不再清洗、比對與寫入)
+    if restart:
+        discard_checkpoint(table_name, db_id)
+    checkpoint = ImportCheckpoint.load(table_name, content_hash, db_id)
+    if checkpoint is not None:
+        checkpoint.settle_pending(lambda probe: batch_committed(cursor, probe))
+    else:
+        checkpoint = ImportCheckpoint.create(
+            table_name, content_hash, db_id, stats={'inserted': 0, 'duplicate': 0, 'excel_dupes': 0, 'withdraw': 0})
 
-    # 4. 退選處理 (成績999)
-    withdraw_mask = (df_import['成績'] == 999) & (df_import['等第成績'] == '')
-    if withdraw_mask.sum() > 0:
-        print(f"-> 標記 {withdraw_mask.sum()} 筆退選資料 (成績999)。")
-        df_import.loc[withdraw_mask, '等第成績'] = '退選'
+    df_import = read_source(data_path)
+    if df_import is None:
+        conn.close()
+        return
+    if checkpoint.offset:
+        print(f"-> 從檢查點續傳：已處理 {checkpoint.offset}/{len(df_import)} 列 (已新增 {checkpoint.stats['inserted']} 筆)。")
 
     # ==========================================
-    # 5. 資料庫比對 (嚴格模式)
+    # 5. 資料庫比對 (嚴格模式)：以持久化的鍵值雜湊索引整批比對，不再讀取全部歷史成績
     # ==========================================
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    print("正在讀取資料庫現有資料 (建立比對指紋)...")
-    
-    # 抓取現有的 Key: 學年, 學期, 課號, 學號
-    cursor.execute("SELECT [學年度], [學期], [課號], [學號] FROM STscore")
-    existing_keys = set()
-    
-    rows = cursor.fetchall()
-    for row in rows:
-        # 使用相同的 clean_key_str 邏輯處理資料庫取出的資料
-        key = (
-            clean_key_str(row[0]), # 學年度
-            clean_key_str(row[1]), # 學期
-            clean_key_str(row[2]), # 課號
-            clean_key_str(row[3])  # 學號
-        )
-        existing_keys.add(key)
-    
-    print(f"資料庫現有 {len(existing_keys)} 筆不重複成績紀錄。")
-
-    # 準備要寫入的資料
-    data_to_insert = []
-    duplicate_count = 0
-    excel_internal_dupes = 0
-    
-    # 用來檢查 Excel 內部是否有重複 (有些 Excel 本身就會重複列)
-    current_batch_keys = set()
-
-    for row in df_import.itertuples(index=False):
-        # 建立這筆資料的 Key (順序需與 required_cols 對應)
-        # 0:學年度, 1:學期, 4:課號, 7:學號
-        current_key = (str(row[0]), str(row[1]), str(row[4]), str(row[7]))
-        
-        if current_key in existing_keys:
-            duplicate_count += 1
-        elif current_key in current_batch_keys:
-            excel_internal_dupes += 1
-        else:
-            data_to_insert.append(tuple(row))
-            current_batch_keys.add(current_key) # 加入暫存，避免本次匯入重複
+    index = KeyHashIndex.open(conn, table_name, KEY_COLS, db_id)
+    print(f"資料庫現有 {len(index)} 筆不重複成績紀錄 (鍵值索引)。")
 
     # ==========================================
-    # 6. 分批寫入 (Batch Insert)
+    # 6. 管線匯入：生產者逐塊清洗、比對，寫入者同時分批寫入 (Batch Insert)
+    # 每批提交後更新檢查點，中斷後再次執行會從最後提交的批次之後繼續
     # ==========================================
-    total_insert = len(data_to_insert)
-    
-    if total_insert == 0:
-        print("-" * 30)
+    counts = dict(checkpoint.stats)
+
+    insert_sql = """
+        INSERT INTO STscore (
+            [學年度], [學期], [開課系所代碼], [開課系所], [課號], [課程名稱], [必選修],
+            [學號], [姓名], [學分數], [成績], [等第成績]
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    # 每批寫入的 (學年度, 學期, 課號) 於同一交易記入異動紀錄，供 STscoreAnalyze --incremental 只重算這些課程
+    ensure_changelog_table(conn, table_name)
+    logged_partitions = set()
+
+    def write_batch(batch):
+        cursor.executemany(insert_sql, batch)
+        partitions = {tuple(row[i] for i in PARTITION_IDX) for row in batch}
+        log_partitions(cursor, table_name, sorted(partitions - logged_partitions))
+        logged_partitions.update(partitions)
+        checkpoint.begin_batch(batch.end, batch.stats, [batch[0][i] for i in KEY_IDX])
+        conn.commit() # 每一批次提交一次
+        checkpoint.commit_batch()
+        index.add(batch.hashes, conn)  # 提交後更新鍵值索引
+        print(f"進度: 已寫入 {batch.stats['inserted']} 筆 ... 完成")
+
+    try:
+        conn.autocommit = False
+        IngestEngine(write_batch, label='STscore').run(plan_batches(df_import, index, checkpoint.offset, counts))
+    except Exception as e:
+        conn.rollback()
+        print(f"寫入過程中發生錯誤: {e}")
+        print(f"已提交至來源第 {checkpoint.offset} 列，重新執行即可從檢查點繼續。")
+        conn.close()
+        return
+
+    if counts['withdraw'] > 0:
+        print(f"-> 標記 {counts['withdraw']} 筆退選資料 (成績999)。")
+    print("-" * 30)
+    if counts['inserted'] == 0:
         print("沒有需要寫入的新資料。")
-        print(f"資料庫重複: {duplicate_count} 筆")
-        print(f"Excel內部重複: {excel_internal_dupes} 筆")
+        print(f"資料庫重複: {counts['duplicate']} 筆")
+        print(f"Excel內部重複: {counts['excel_dupes']} 筆")
     else:
-        print(f"準備寫入 {total_insert} 筆新資料...")
-        if duplicate_count > 0:
-            print(f"(已過濾掉 {duplicate_count} 筆資料庫重複資料)")
-        
-        insert_sql = """
-            INSERT INTO STscore (
-                [學年度], [學期], [開課系所代碼], [開課系所], [課號], [課程名稱], [必選修],
-                [學號], [姓名], [學分數], [成績], [等第成績]
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        
-        try:
-            conn.autocommit = False
-            
-            for i in range(0, total_insert, BATCH_SIZE):
-                batch = data_to_insert[i : i + BATCH_SIZE]
-                cursor.executemany(insert_sql, batch)
-                conn.commit() # 每一批次提交一次
-                
-                # 顯示進度
-                current_count = min(i + BATCH_SIZE, total_insert)
-                print(f"進度: {current_count} / {total_insert} ... 完成")
-                
-            print("-" * 30)
-            print(f"全數匯入完成！共新增 {total_insert} 筆資料。")
-            
-        except Exception as e:
-            conn.rollback()
-            print(f"寫入過程中發生錯誤: {e}")
-        finally:
-            conn.close()
+        if counts['duplicate'] > 0:
+            print(f"(已過濾掉 {counts['duplicate']} 筆資料庫重複資料)")
+        print(f"全數匯入完成！共新增 {counts['inserted']} 筆資料。")
+    record_import(conn, data_path, table_name, counts['inserted'], content_hash)
+    checkpoint.finish()
+    index.compact()
+    conn.close()
 
 if __name__ == "__main__":
-    import_scores()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="學生成績匯入")
+    parser.add_argument('--force', action='store_true', help="檔案已匯入過仍強制重新匯入")
+    parser.add_argument('--restart', action='store_true', help="捨棄上次中斷的檢查點，重新讀檔比對")
+    args = parser.parse_args()
+    import_scores(force=args.force, restart=args.restart)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# 成績分布計算核心：整張成績表一次算出每個成績的區間代碼，再依 (課程分組, 區間) 的整數代碼一次累計人數 (np.bincount) 與分數總和 (groupby)
+# 不再逐課程 pd.cut、逐區間篩選，也不逐筆組 dict；結果為欄位式 (columnar) DataFrame
+# 同一次計算可同時產生多種分段方式 (十分一段、五分一段、等第)
+
+# 分段方式：edges 為區間端點 (左閉右開 [a, b))，labels 為各區間標籤
+# include_top: 最高端點 (100 分) 是否併入最後一個區間；
+#              'ten' 沿用 STscoreAnalyze 原本 pd.cut(right=False) 的結果，100 分只計入 total，不計入 90-100
+BIN_SCHEMES = {
+    'ten': {
+        'edges': [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100],
+        'labels': ["0-9", "10-19", "20-29", "30-39", "40-49", "50-59", "60-69", "70-79", "80-89", "90-100"],
+        'include_top': False,
+    },
+    'five': {
+        'edges': list(range(0, 101, 5)),
+        'labels': [f"{lo}-{lo + 4}" for lo in range(0, 95, 5)] + ["95-100"],
+        'include_top': True,
+    },
+    'letter': {
+        # 百分制與等第對照 (A+ 90-100、A 85-89、A- 80-84 ... C- 60-62、F 60 以下)
+        'edges': [0, 60, 63, 67, 70, 73, 77, 80, 85, 90, 100],
+        'labels': ["F", "C-", "C", "C+", "B-", "B", "B+", "A-", "A", "A+"],
+        'include_top': True,
+    },
+}
+
+TOTAL_LABEL = 'total'
+
+
+def bucket_codes(scores, scheme):
+    """整欄計算區間代碼 (0 ~ 區間數-1)，空值或超出範圍為 -1"""
+    spec = BIN_SCHEMES[scheme]
+    edges = np.asarray(spec['edges'], dtype='float64')
+    scores = np.asarray(scores, dtype='float64')
+    codes = np.searchsorted(edges, scores, side='right') - 1
+    if spec['include_top']:
+        codes[scores == edges[-1]] = len(edges) - 2
+    codes[(codes < 0) | (codes >= len(edges) - 1)] = -1  # NaN 排在最後，也會落在這裡
+    return codes
+
+
+def _group_sums(codes, values, size):
+    """依整數代碼加總 (pandas groupby 為補償加總，結果與原本的 groupby().sum() 逐位元相同)"""
+    sums = np.zeros(size, dtype='float64')
+    if len(codes):
+        grouped = pd.Series(values).groupby(codes).sum()
+        sums[grouped.index.to_numpy()] = grouped.to_numpy()
+    return sums
+
+
+def accumulate_scores(df, group_cols, score_col='成績', schemes=('ten',)):
+    """
+    累計一批成績 (可分批呼叫後以 merge_accumulated 合併)。
+    df: 含分組欄位與成績欄位的 DataFrame；成績為空值的列只讓該組出現 (人數為 0)
+    回傳以 group_cols 為索引的寬表，欄位為 (分段方式, 區間標籤, 'sum' / 'count')；
+    全部成績的總計在 ('total', 'total', ...)。
+    """
+    df = df[df[group_cols].notna().all(axis=1)]  # 與 groupby 相同，分組鍵值為空的列不列入
+    group_codes, groups = pd.MultiIndex.from_frame(df[group_cols]).factorize()
+    n_groups = len(groups)
+    scores = df[score_col].to_numpy(dtype='float64')
+    valid = ~np.isnan(scores)
+
+    columns = {
+        (TOTAL_LABEL, TOTAL_LABEL, 'sum'): _group_sums(group_codes[valid], scores[valid], n_groups),
+        (TOTAL_LABEL, TOTAL_LABEL, 'count'): np.bincount(group_codes[valid], minlength=n_groups),
+    }
+    for scheme in schemes:
+        labels = BIN_SCHEMES[scheme]['labels']
+        codes = bucket_codes(scores, scheme)
+        in_bin = codes >= 0
+        flat = group_codes[in_bin] * len(labels) + codes[in_bin]
+        sums = _group_sums(flat, scores[in_bin], n_groups * len(labels)).reshape(n_groups, len(labels))
+        counts = np.bincount(flat, minlength=n_groups * len(labels)).reshape(n_groups, len(labels))
+        for i, label in enumerate(labels):
+            columns[(scheme, label, 'sum')] = sums[:, i]
+            columns[(scheme, label, 'count')] = counts[:, i]
+
+    return pd.DataFrame(columns, index=groups.set_names(group_cols))
+
+
+def empty_accumulated(group_cols, score_col='成績', schemes=('ten',)):
+    """沒有任何成績時的累計結果 (欄位與 accumulate_scores 相同，沒有分組)"""
+    return accumulate_scores(pd.DataFrame(columns=group_cols + [score_col]), group_cols, score_col, schemes)
+
+
+def merge_accumulated(parts):
+    """合併多批 accumulate_scores 的結果 (依分組鍵值排序)"""
+    merged = pd.concat(parts)
+    return merged.groupby(level=list(range(merged.index.nlevels))).sum().sort_index()
+
+
+def distribution_frame(acc, scheme='ten', label_col='分數區間'):
+    """
+    將累計結果展開為長表：每個分組一列 total，接著依序每個區間一列。
+    回傳欄位：分組欄位 + [分數區間, 人數, 平均分數, 學生總數]；沒有人的區間平均分數為 0.0
+    """
+    labels = [TOTAL_LABEL] + BIN_SCHEMES[scheme]['labels']
+    sums = np.column_stack([acc[(TOTAL_LABEL, TOTAL_LABEL, 'sum')]] +
+                           [acc[(scheme, label, 'sum')] for label in labels[1:]]).astype('float64')
+    counts = np.column_stack([acc[(TOTAL_LABEL, TOTAL_LABEL, 'count')]] +
+                             [acc[(scheme, label, 'count')] for label in labels[1:]]).astype('int64')
+    averages = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+
+    per_group = len(labels)
+    out = acc.index.to_frame(index=False).loc[np.repeat(np.arange(len(acc)), per_group)].reset_index(drop=True)
+    out = out.astype(str)
+    out[label_col] = np.tile(labels, len(acc))
+    out['人數'] = counts.ravel()
+    out['平均分數'] = averages.ravel()
+    out['學生總數'] = np.repeat(counts[:, 0], per_group)
+    return out
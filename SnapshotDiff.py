@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from DataNormalize import clean_key
+
+# 累積快照差異比對：問卷系統每次匯出的檔案都包含先前所有回覆再加上新回覆 (例如 data_大學部問券0725/0804/0805)
+# 每次匯入後將快照的「鍵值 + 整列雜湊」存成狀態檔，下次匯入新快照時只比對雜湊，
+# 只把新增或內容有變動的列送進資料庫，不必整份重新比對
+# 狀態檔依資料庫識別 (後端 + 檔案路徑，見 Accessdb.db_identity) 分開存放，並記錄寫入後資料表的筆數；
+# 換了資料庫、還原舊的資料庫檔或有人在別處刪改過資料 (筆數不符) 時不使用狀態檔，改為整份比對匯入
+
+# 狀態檔資料夾，可由環境變數調整
+SNAPSHOT_STATE_DIR = os.environ.get('IEET_SNAPSHOT_DIR', os.path.join('cache', 'snapshot'))
+
+HASH_COLUMN = '_row_hash'
+
+
+def _state_base(state_name, db_id):
+    digest = hashlib.sha1(db_id.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(SNAPSHOT_STATE_DIR, f"{state_name}_{digest}")
+
+
+def _table_count(conn, table):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    count = int(cursor.fetchone()[0])
+    cursor.close()
+    return count
+
+
+def snapshot_hashes(df, key_columns, value_columns=None):
+    """
+    計算快照每一列的鍵值與雜湊。
+    key_columns: 鍵欄位 list (以 clean_key 正規化後比對)
+    value_columns: 納入雜湊的欄位 list，預設全部欄位
+    回傳 DataFrame：鍵欄位 + _row_hash (uint64)，索引與 df 相同
+    """
+    value_columns = value_columns or list(df.columns)
+    keys = pd.DataFrame({col: clean_key(df[col]) for col in key_columns}, index=df.index)
+    values = df[value_columns].astype(object).where(df[value_columns].notna(), '').astype(str)
+    keys[HASH_COLUMN] = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return keys
+
+
+def load_snapshot_state(state_name, conn, table, db_id):
+    """
+    讀取上一次匯入的快照狀態。
+    conn / table: 資料庫連線與目標資料表 (比對狀態檔記錄的筆數)；db_id: 資料庫識別字串 (Accessdb.db_identity)
+    沒有狀態檔、狀態檔屬於別的資料庫或筆數與資料表不符時回傳 None (改為整份比對匯入)
+    """
+    base = _state_base(state_name, db_id)
+    try:
+        with open(base + '.json', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None  # 沒有狀態檔 (或舊版沒有資料庫資訊的狀態檔)
+    row_count = _table_count(conn, table)
+    if meta.get('db_id') != db_id or meta.get('row_count') != row_count:
+        print(f"-> {table} 快照狀態與資料庫不一致 (狀態 {meta.get('row_count')} 筆 / 資料庫 {row_count} 筆)，"
+              "改為整份比對匯入。")
+        return None
+    for ext, reader in (('.parquet', pd.read_parquet), ('.pkl', pd.read_pickle)):
+        if os.path.exists(base + ext):
+            try:
+                return reader(base + ext)
+            except Exception:
+                pass  # 狀態檔損毀或缺少 pyarrow，視為沒有狀態
+    return None
+
+
+def save_snapshot_state(state_name, hashes, conn, table, db_id):
+    """
+    資料庫寫入 (commit) 成功後儲存本次快照狀態，連同資料庫識別與資料表目前筆數
+    (先寫暫存檔再取代，避免中斷時留下不完整的狀態)
+    """
+    os.makedirs(SNAPSHOT_STATE_DIR, exist_ok=True)
+    base = _state_base(state_name, db_id)
+    state = hashes.drop_duplicates(subset=[c for c in hashes.columns if c != HASH_COLUMN]).reset_index(drop=True)
+    try:
+        state.to_parquet(base + '.parquet.tmp', index=False)
+        os.replace(base + '.parquet.tmp', base + '.parquet')
+        if os.path.exists(base + '.pkl'):
+            os.remove(base + '.pkl')
+    except Exception:
+        # 未安裝 pyarrow 時改存 pickle
+        if os.path.exists(base + '.parquet.tmp'):
+            os.remove(base + '.parquet.tmp')
+        state.to_pickle(base + '.pkl')
+    with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'db_id': db_id, 'table': table, 'row_count': _table_count(conn, table)}, f, ensure_ascii=False)
+    os.replace(base + '.json.tmp', base + '.json')
+
+
+def diff_snapshot(df, key_columns, previous, value_columns=None):
+    """
+    比對新快照與上一次的快照狀態。
+    df: 新快照 DataFrame
+    key_columns: 鍵欄位 list (例如 ['uid', 'sem', 'sqnum'])
+    previous: load_snapshot_state() 的結果
+    value_columns: 納入雜湊的欄位 list，預設全部欄位
+    回傳 (delta, hashes, stats)：
+      delta  只含新增或內容變動的列 (df 的子集)
+      hashes 新快照的鍵值與雜湊 (寫入成功後交給 save_snapshot_state)
+      stats  {'new': 新增, 'changed': 變動, 'unchanged': 未變動, 'disappeared': 新快照中消失的列數}
+    """
+    hashes = snapshot_hashes(df, key_columns, value_columns)
+    prev = previous.drop_duplicates(subset=key_columns)
+
+    # 左合併 (上一次的鍵值不重複) 結果列數與順序和新快照相同，可直接當遮罩使用
+    # 鍵值存在但鍵值+雜湊對不上的就是內容變動的列；雜湊為 uint64，不可經過 NaN 轉成 float 比較
+    key_found = hashes[key_columns].merge(prev[key_columns], on=key_columns, how='left', indicator=True)['_merge'] == 'both'
+    row_found = hashes.merge(prev, on=key_columns + [HASH_COLUMN], how='left', indicator=True)['_merge'] == 'both'
+    is_new = ~key_found.to_numpy()
+    is_changed = key_found.to_numpy() & ~row_found.to_numpy()
+
+    current_keys = pd.MultiIndex.from_frame(hashes[key_columns])
+    disappeared = int((~pd.MultiIndex.from_frame(prev[key_columns]).isin(current_keys)).sum())
+
+    stats = {
+        'new': int(is_new.sum()),
+        'changed': int(is_changed.sum()),
+        'unchanged': int(len(hashes) - is_new.sum() - is_changed.sum()),
+        'disappeared': disappeared,
+    }
+    delta = df[is_new | is_changed]
+    return delta, hashes, stats
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 測試一律使用 SQLite 後端並關閉查詢效能紀錄 (須在匯入 Accessdb / QueryProfiler 之前設定)
+os.environ.setdefault('IEET_DB_BACKEND', 'sqlite')
+os.environ['IEET_QUERY_PROFILE'] = '0'
+
+# 專案程式皆為根目錄下的單一模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
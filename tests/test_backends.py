@@ -0,0 +1,15 @@
+import pytest
+
+from Accessdb import get_backend
+
+# 後端 SQL 轉譯測試：DuckDB 無法對應 @@IDENTITY，須在執行前以明確的錯誤拒絕
+
+
+def test_duckdb_translates_access_syntax():
+    sql = get_backend('duckdb').translate("SELECT TOP 1 [學年度], [學期] FROM [STscore]")
+    assert sql == 'SELECT "學年度", "學期" FROM "STscore" LIMIT 1'
+
+
+def test_duckdb_rejects_identity_with_supported_helpers():
+    with pytest.raises(ValueError, match=r"@@IDENTITY.*bulk_insert / upsert_many"):
+        get_backend('duckdb').translate("SELECT @@IDENTITY")
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import pandas as pd
+import pytest
+
+import Accessdb
+import Course_Matrix_Builder
+from ChangeLog import ensure_changelog_table, log_partitions
+
+# 課程成績概況升級路徑測試：資料庫在加入 CourseScoreProfile 之前已分析過 (STscoreAnalyze 有資料、概況表沒有)，
+# 匯入新學期後執行增量分析，Course_Matrix_Builder 讀到的概況仍須涵蓋 STscore 的每個學期
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STSCORE_DDL = """
+    CREATE TABLE STscore (id INTEGER PRIMARY KEY AUTOINCREMENT, 學年度 TEXT, 學期 TEXT, 開課系所代碼 TEXT,
+        開課系所 TEXT, 課號 TEXT, 課程名稱 TEXT, 必選修 TEXT, 學號 TEXT, 姓名 TEXT, 學分數 REAL, 成績 REAL, 等第成績 TEXT)
+"""
+ANALYZE_DDL = """
+    CREATE TABLE STscoreAnalyze (id INTEGER PRIMARY KEY AUTOINCREMENT, 學年度 TEXT, 學期 TEXT, 課號 TEXT,
+        課程名稱 TEXT, 分數區間 TEXT, 人數 INTEGER, 平均分數 REAL, 學生總數 INTEGER)
+"""
+SCORE_COLUMNS = ['學年度', '學期', '課號', '課程名稱', '學號', '成績', '等第成績']
+
+
+def score_rows(year, sem, n=30):
+    """一個學期的成績資料：3 門課，含一筆退選 (999)"""
+    return [(str(year), str(sem), f'EE{i % 3:03d}', f'課程{i % 3}', f'B{year}{sem}{i:03d}',
+             999.0 if i == 0 else float(50 + (i * 7 + year + sem) % 50), '') for i in range(n)]
+
+
+def insert_scores(db_file, rows, log=False):
+    conn = sqlite3.connect(db_file)
+    conn.executemany(f"INSERT INTO STscore ({','.join(SCORE_COLUMNS)}) VALUES ({','.join(['?'] * len(SCORE_COLUMNS))})",
+                     rows)
+    if log:  # 同 STscoreRead：寫入成績時記錄異動的 (學年度, 學期, 課號)
+        log_partitions(conn.cursor(), 'STscore', sorted({r[:3] for r in rows}), backend='sqlite')
+    conn.commit()
+    conn.close()
+
+
+def run_analyze(db_file, *flags):
+    env = dict(os.environ, IEET_DB_BACKEND='sqlite', IEET_DB_PATH=str(db_file), IEET_QUERY_PROFILE='0')
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'STscoreAnalyze.py'), *flags],
+                   cwd=os.path.dirname(db_file), env=env, check=True, capture_output=True)
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = tmp_path / 'IEETdatabase.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute(STSCORE_DDL)
+    conn.execute(ANALYZE_DDL)
+    conn.commit()
+    ensure_changelog_table(conn, 'STscore', backend='sqlite')
+    conn.close()
+    monkeypatch.setattr(Accessdb, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(Accessdb, 'DB_PATH_OVERRIDE', str(path))
+    return path
+
+
+def upgrade_install(db_file):
+    """升級前的資料庫：112 學年兩個學期已分析，但還沒有課程成績概況"""
+    insert_scores(db_file, score_rows(112, 1) + score_rows(112, 2))
+    run_analyze(db_file)
+    conn = sqlite3.connect(db_file)
+    conn.execute("DROP TABLE CourseScoreProfile")
+    conn.commit()
+    conn.close()
+
+
+def profile_semesters(df):
+    return sorted(set(zip(df['學年度'].astype(str), df['學期'].astype(str))))
+
+
+def averages(df):
+    df = df[df['人數'].astype(int) > 0]
+    return {(str(r.學年度), str(r.學期), r.課號): round(float(r.平均分數), 6) for r in df.itertuples()}
+
+
+def test_incremental_after_upgrade_recomputes_all_semesters(db_file):
+    upgrade_install(db_file)
+    insert_scores(db_file, score_rows(113, 1), log=True)
+    run_analyze(db_file, '--incremental')
+
+    conn = sqlite3.connect(db_file)
+    stored = pd.read_sql("SELECT * FROM CourseScoreProfile", conn)
+    assert conn.execute("SELECT COUNT(*) FROM STscoreChangeLog").fetchone()[0] == 0
+    conn.close()
+    assert profile_semesters(stored) == [('112', '1'), ('112', '2'), ('113', '1')]
+
+    conn = Accessdb.connect()
+    loaded = Course_Matrix_Builder.load_course_profiles(conn)
+    expected = Course_Matrix_Builder.profile_from_scores(conn)
+    conn.close()
+    assert averages(loaded) == averages(expected)
+
+
+def test_builder_recomputes_semesters_missing_from_profile(db_file):
+    # 概況表只有部分學期 (例如舊版增量分析只寫入了新學期)，其餘學期由 STscore 補算
+    upgrade_install(db_file)
+    insert_scores(db_file, score_rows(113, 1))
+    conn = Accessdb.connect()
+    full = Course_Matrix_Builder.profile_from_scores(conn)
+    conn.close()
+
+    conn = sqlite3.connect(db_file)
+    part = full[full['學年度'].astype(str) == '113']
+    conn.execute("CREATE TABLE CourseScoreProfile (學年度 TEXT, 學期 TEXT, 課號 TEXT, 人數 INTEGER, 平均分數 REAL)")
+    conn.executemany("INSERT INTO CourseScoreProfile VALUES (?,?,?,?,?)",
+                     part[['學年度', '學期', '課號', '人數', '平均分數']].itertuples(index=False, name=None))
+    conn.commit()
+    conn.close()
+
+    conn = Accessdb.connect()
+    loaded = Course_Matrix_Builder.load_course_profiles(conn)
+    conn.close()
+    assert profile_semesters(loaded) == [('112', '1'), ('112', '2'), ('113', '1')]
+    assert averages(loaded) == averages(full)
@@ -0,0 +1,233 @@
+import glob
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import pandas as pd
+import pytest
+
+import Accessdb
+import STscoreRead
+from ImportCheckpoint import ImportCheckpoint, CHECKPOINT_DIR
+from IngestEngine import IngestEngine
+
+# STscoreRead 檢查點續傳測試：以 SQLite 取代 Access，匯入中途中斷後再次執行，
+# 結果 (STscore、異動紀錄、匯入紀錄、檢查點) 必須與一次完整匯入相同
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STSCORE_DDL = """
+    CREATE TABLE STscore (id INTEGER PRIMARY KEY AUTOINCREMENT, 學年度 TEXT, 學期 TEXT, 開課系所代碼 TEXT,
+        開課系所 TEXT, 課號 TEXT, 課程名稱 TEXT, 必選修 TEXT, 學號 TEXT, 姓名 TEXT, 學分數 REAL, 成績 REAL, 等第成績 TEXT)
+"""
+SCORE_COLUMNS = STscoreRead.INSERT_COLS
+N_ROWS = 2400
+
+
+def make_scores():
+    """測試用成績資料：含退選 (999)、Excel 內部重複與資料庫已存在的列"""
+    rows = []
+    for i in range(N_ROWS):
+        score = 999 if i % 97 == 0 else (i * 7) % 101
+        rows.append({
+            '學年度': 110 + i % 3, '學期': 1 + i % 2, '系所代碼': 'EE', '系所': '電機系',
+            '課號': f'EE{i % 40:03d}', '課程名稱': f'課程{i % 40}', '必選修': '必',
+            '學號': f'B{i:05d}', '姓名': f'學生{i}', '學分數': 3, '成績': score, '等第成績': None,
+        })
+    df = pd.DataFrame(rows)
+    return pd.concat([df, df.iloc[500:530], df.iloc[1900:1905]], ignore_index=True)  # Excel 內部重複
+
+
+def create_db(db_file):
+    """建立測試用的 SQLite 資料庫 (含兩筆已存在的成績)"""
+    conn = sqlite3.connect(db_file)
+    conn.execute(STSCORE_DDL)
+    # 資料庫已有的成績 (匯入時應略過)
+    conn.executemany(
+        f"INSERT INTO STscore ({','.join(SCORE_COLUMNS)}) VALUES ({','.join(['?'] * len(SCORE_COLUMNS))})",
+        [('111', '1', 'EE', '電機系', 'EE010', '課程10', '必', 'B00010', '學生10', 3.0, 70.0, ''),
+         ('112', '2', 'EE', '電機系', 'EE011', '課程11', '必', 'B00011', '學生11', 3.0, 77.0, '')]
+    )
+    conn.commit()
+    conn.close()
+    return db_file
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """建立一個獨立的工作目錄 (快取、檢查點、索引皆在其中) 與 SQLite 資料庫，回傳建立函式"""
+    source = tmp_path / 'scores.xlsx'
+    make_scores().to_excel(source, index=False)
+    monkeypatch.setattr(STscoreRead, 'data_path', str(source))
+    monkeypatch.setattr(STscoreRead, 'BATCH_SIZE', 100)
+    monkeypatch.setattr(STscoreRead, 'CLEAN_CHUNK_SIZE', 350)
+    monkeypatch.setattr(Accessdb, 'DB_BACKEND', 'sqlite')
+
+    def create(name):
+        root = tmp_path / name
+        root.mkdir()
+        db_file = create_db(root / 'IEETdatabase.sqlite')
+        monkeypatch.chdir(root)
+        monkeypatch.setattr(Accessdb, 'DB_PATH_OVERRIDE', str(db_file))
+        return db_file
+
+    return create
+
+
+def checkpoint_files():
+    return glob.glob(os.path.join(CHECKPOINT_DIR, 'STscore_*.json'))
+
+
+def checkpoint_state():
+    """目前工作目錄中唯一的 STscore 檢查點內容"""
+    files = checkpoint_files()
+    assert len(files) == 1
+    with open(files[0], encoding='utf-8') as f:
+        return json.load(f)
+
+
+def db_state(db_file):
+    """比對用的資料庫內容：STscore (不含自動編號)、異動紀錄的分割區、匯入紀錄的筆數"""
+    conn = sqlite3.connect(db_file)
+    scores = conn.execute(f"SELECT {','.join(SCORE_COLUMNS)} FROM STscore ORDER BY id").fetchall()
+    partitions = sorted(conn.execute("SELECT DISTINCT 學年度, 學期, 課號 FROM STscoreChangeLog").fetchall())
+    manifest = conn.execute("SELECT target_table, rows_imported FROM ImportManifest").fetchall()
+    conn.close()
+    return scores, partitions, manifest
+
+
+def failing_engine(fail_after):
+    """寫入 fail_after 批後拋出例外的 IngestEngine (模擬匯入中途中斷)"""
+
+    class FailingEngine(IngestEngine):
+        def __init__(self, write_batch, **kwargs):
+            written = []
+
+            def write_or_fail(batch):
+                if len(written) == fail_after:
+                    raise RuntimeError("模擬匯入中斷")
+                write_batch(batch)
+                written.append(len(batch))
+
+            super().__init__(write_or_fail, **kwargs)
+
+    return FailingEngine
+
+
+def clean_run(workspace):
+    db_file = workspace('clean')
+    STscoreRead.import_scores()
+    return db_state(db_file)
+
+
+def test_resume_after_failed_batch_matches_clean_run(workspace, monkeypatch):
+    expected = clean_run(workspace)
+    assert len(expected[0]) == 2 + N_ROWS - 2  # 2 筆已存在、Excel 內部重複只匯入一次
+
+    db_file = workspace('resume')
+    with monkeypatch.context() as m:
+        m.setattr(STscoreRead, 'IngestEngine', failing_engine(7))
+        STscoreRead.import_scores()
+
+    # 中斷後：已提交 7 批，檢查點記錄已處理的來源位置，尚未寫入匯入紀錄
+    state = checkpoint_state()
+    assert state['stats']['inserted'] == 700
+    assert state['pending'] is None
+    scores, _, manifest = db_state(db_file)
+    assert len(scores) == 2 + 700
+    assert manifest == []
+
+    STscoreRead.import_scores()
+    assert db_state(db_file) == expected
+    assert checkpoint_files() == []
+
+
+def test_resume_after_crash_between_commit_and_checkpoint(workspace, monkeypatch):
+    expected = clean_run(workspace)
+
+    # 第 4 批 commit 後、檢查點推進前中斷：續傳時須偵測到該批已寫入，不可重複寫入
+    db_file = workspace('pending')
+    commits = []
+    original = ImportCheckpoint.commit_batch
+
+    def crash_on_fourth(self):
+        commits.append(1)
+        if len(commits) == 4:
+            raise RuntimeError("模擬中斷")
+        original(self)
+
+    with monkeypatch.context() as m:
+        m.setattr(ImportCheckpoint, 'commit_batch', crash_on_fourth)
+        STscoreRead.import_scores()
+    assert checkpoint_state()['pending'] is not None
+
+    STscoreRead.import_scores()
+    assert db_state(db_file) == expected
+    assert checkpoint_files() == []
+
+
+# 子程序：第 4 批 conn.commit() 之後、checkpoint.commit_batch() 之前直接終止 (SIGKILL，不經例外處理)
+KILL_SCRIPT = """
+import os, signal, sys
+import STscoreRead
+from ImportCheckpoint import ImportCheckpoint
+STscoreRead.data_path = sys.argv[1]
+STscoreRead.BATCH_SIZE = 100
+STscoreRead.CLEAN_CHUNK_SIZE = 350
+calls = []
+original = ImportCheckpoint.commit_batch
+def kill_on_fourth(self):
+    calls.append(1)
+    if len(calls) == 4:
+        os.kill(os.getpid(), getattr(signal, 'SIGKILL', signal.SIGTERM))
+    original(self)
+ImportCheckpoint.commit_batch = kill_on_fourth
+STscoreRead.import_scores()
+"""
+
+
+def test_resume_after_process_killed_between_commit_and_checkpoint(workspace, tmp_path):
+    expected = clean_run(workspace)
+
+    db_file = workspace('killed')
+    env = dict(os.environ, IEET_DB_BACKEND='sqlite', IEET_DB_PATH=str(db_file), IEET_QUERY_PROFILE='0',
+               PYTHONPATH=REPO_ROOT)
+    proc = subprocess.run([sys.executable, '-c', KILL_SCRIPT, STscoreRead.data_path],
+                          cwd=os.getcwd(), env=env, capture_output=True)
+    assert proc.returncode != 0
+    if hasattr(signal, 'SIGKILL'):
+        assert proc.returncode == -signal.SIGKILL
+
+    # 第 4 批已提交，但檢查點仍停在第 3 批並留有 pending
+    state = checkpoint_state()
+    assert state['pending'] is not None and state['stats']['inserted'] == 300
+    assert len(db_state(db_file)[0]) == 2 + 400
+
+    # 續傳時 settle_pending 以 batch_committed 確認第 4 批已寫入，不可重複寫入
+    STscoreRead.import_scores()
+    assert db_state(db_file) == expected
+    assert checkpoint_files() == []
+
+
+def test_checkpoint_is_not_reused_for_another_database(workspace, monkeypatch):
+    expected = clean_run(workspace)
+
+    db_file = workspace('other_db')
+    with monkeypatch.context() as m:
+        m.setattr(STscoreRead, 'IngestEngine', failing_engine(7))
+        STscoreRead.import_scores()
+    assert checkpoint_state()['offset'] > 0
+
+    # 同一個工作目錄、同一份檔案，改匯入另一個資料庫：不可沿用前一個資料庫的檢查點而略過前面的列
+    other_file = create_db(db_file.parent / 'other.sqlite')
+    monkeypatch.setattr(Accessdb, 'DB_PATH_OVERRIDE', str(other_file))
+    STscoreRead.import_scores()
+    assert db_state(other_file) == expected
+
+    # 原資料庫的檢查點仍保留，續傳後同樣完整
+    monkeypatch.setattr(Accessdb, 'DB_PATH_OVERRIDE', str(db_file))
+    STscoreRead.import_scores()
+    assert db_state(db_file) == expected
+    assert checkpoint_files() == []
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import pytest
+
+import Accessdb
+import QueryCache
+from Accessdb import AccessHelper
+
+# 查詢快取測試：資料未變動時讀取快取；就地 UPDATE (筆數與最大自動編號不變) 後必須重新讀取資料庫
+
+SQL = "SELECT M.matrix_id, M.course_name, C.dept_code FROM Course_Matrix AS M INNER JOIN Courses AS C ON M.course_id = C.id"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / 'IEETdatabase.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Courses (id INTEGER PRIMARY KEY AUTOINCREMENT, dept_code TEXT, course_name TEXT)")
+    conn.execute("CREATE TABLE Course_Matrix (matrix_id INTEGER PRIMARY KEY AUTOINCREMENT, course_id INTEGER, course_name TEXT)")
+    conn.executemany("INSERT INTO Courses (dept_code, course_name) VALUES (?, ?)", [('EE', '電路學'), ('EE', '電磁學')])
+    conn.executemany("INSERT INTO Course_Matrix (course_id, course_name) VALUES (?, ?)", [(1, '電路學'), (2, '電磁學')])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(Accessdb, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(Accessdb, 'DB_PATH_OVERRIDE', str(path))
+    monkeypatch.setattr(QueryCache, 'QUERY_CACHE_ENABLED', True)
+    monkeypatch.setattr(QueryCache, 'QUERY_CACHE_DIR', str(tmp_path / 'cache'))
+    helper = AccessHelper()
+    yield helper
+    helper.close()
+
+
+def cache_files():
+    return sorted(os.listdir(QueryCache.QUERY_CACHE_DIR))
+
+
+def test_unchanged_tables_hit_cache(db):
+    first = db.read_sql_cached(SQL)
+    files = cache_files()
+    assert len(files) == 1
+    second = db.read_sql_cached(SQL)
+    assert cache_files() == files
+    assert second.equals(first)
+
+
+def test_in_place_update_invalidates_cache(db):
+    db.read_sql_cached(SQL)
+    # 課名更正：筆數與最大自動編號都不變
+    db.cursor.execute("UPDATE Courses SET dept_code='EN' WHERE id=1")
+    db.cursor.execute("UPDATE Course_Matrix SET course_name='電路學(一)' WHERE matrix_id=1")
+    db.conn.commit()
+    df = db.read_sql_cached(SQL)
+    assert len(cache_files()) == 2
+    assert df.loc[df['matrix_id'] == 1, ['course_name', 'dept_code']].values.tolist() == [['電路學(一)', 'EN']]
@@ -0,0 +1,52 @@
+import sqlite3
+
+import QueryProfiler
+from QueryProfiler import ProfiledConnection, QueryProfiler as Profiler
+
+# 查詢效能紀錄測試：逐列執行大量語句時只保留每個樣板的累計值與固定大小的抽樣，
+# 統計數字 (次數、筆數、含 fetch 的耗時) 仍須正確
+
+
+def profiled_db(monkeypatch):
+    profiler = Profiler()
+    profiler._registered = True   # 測試不在程式結束時輸出報告
+    monkeypatch.setattr(QueryProfiler, 'PROFILER', profiler)
+    conn = ProfiledConnection(sqlite3.connect(':memory:'))
+    conn.execute("CREATE TABLE T (id INTEGER PRIMARY KEY, v TEXT)")
+    return profiler, conn
+
+
+def test_memory_is_bounded_per_template(monkeypatch):
+    monkeypatch.setattr(QueryProfiler, 'LATENCY_SAMPLES', 50)
+    profiler, conn = profiled_db(monkeypatch)
+    cursor = conn.cursor()
+    for i in range(5000):
+        cursor.execute(f"INSERT INTO T (id, v) VALUES ({i}, 'x{i}')")
+    cursor.execute("SELECT id FROM T WHERE id < 10")
+    assert len(cursor.fetchall()) == 10
+    cursor.close()
+
+    assert profiler._open == {}
+    stats = profiler.stats['INSERT INTO T (id, v) VALUES (?, ?)']
+    assert stats.calls == 5000 and stats.rows == 5000
+    assert len(stats.samples) == 50
+    summary = {s['sql']: s for s in profiler.summary()}
+    insert = summary['INSERT INTO T (id, v) VALUES (?, ?)']
+    assert insert['calls'] == 5000
+    assert insert['p50_ms'] <= insert['p99_ms'] <= insert['max_ms']
+    assert summary['SELECT id FROM T WHERE id < ?']['rows'] == 10
+
+
+def test_slow_queries_keep_only_the_slowest(monkeypatch):
+    monkeypatch.setattr(QueryProfiler, 'SLOW_QUERY_MS', 0)
+    monkeypatch.setattr(QueryProfiler, 'MAX_SLOW_QUERIES', 5)
+    profiler, conn = profiled_db(monkeypatch)
+    cursor = conn.cursor()
+    for i in range(100):
+        cursor.execute("SELECT COUNT(*) FROM T").fetchone()
+    # 尚未結算的呼叫 (cursor 仍開著) 在輸出報告前結算
+    profiler.flush()
+    slow = profiler.slow_queries()
+    assert len(slow) == 5
+    assert [s['ms'] for s in slow] == sorted((s['ms'] for s in slow), reverse=True)
+    assert profiler.stats['SELECT COUNT(*) FROM T'].calls == 100
@@ -0,0 +1,76 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+from ChangeLog import ensure_changelog_table, log_partitions
+
+# STscoreAnalyze 增量模式測試：STscore 的學年度 / 學期為數值欄位 (讀出為 112.0)、異動紀錄為文字 ('112') 時，
+# 增量重新計算的結果仍須與完整重新計算相同 (不可刪除舊結果後寫入空資料)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STSCORE_DDL = """
+    CREATE TABLE STscore (id INTEGER PRIMARY KEY AUTOINCREMENT, 學年度 REAL, 學期 REAL, 開課系所代碼 TEXT,
+        開課系所 TEXT, 課號 TEXT, 課程名稱 TEXT, 必選修 TEXT, 學號 TEXT, 姓名 TEXT, 學分數 REAL, 成績 REAL, 等第成績 TEXT)
+"""
+ANALYZE_DDL = """
+    CREATE TABLE STscoreAnalyze (id INTEGER PRIMARY KEY AUTOINCREMENT, 學年度 TEXT, 學期 TEXT, 課號 TEXT,
+        課程名稱 TEXT, 分數區間 TEXT, 人數 INTEGER, 平均分數 REAL, 學生總數 INTEGER)
+"""
+SCORE_COLUMNS = ['學年度', '學期', '課號', '課程名稱', '學號', '成績', '等第成績']
+
+
+def score_rows(year, sem, start=0, n=30):
+    return [(year, sem, f'EE{i % 3:03d}', f'課程{i % 3}', f'B{year}{sem}{i:03d}', float(40 + (i * 11 + sem) % 60), '')
+            for i in range(start, start + n)]
+
+
+def insert_scores(db_file, rows, log=False):
+    conn = sqlite3.connect(db_file)
+    conn.executemany(f"INSERT INTO STscore ({','.join(SCORE_COLUMNS)}) VALUES ({','.join(['?'] * len(SCORE_COLUMNS))})",
+                     rows)
+    if log:  # STscoreRead 記錄的鍵值為正規化後的字串
+        log_partitions(conn.cursor(), 'STscore', sorted({(str(r[0]), str(r[1]), r[2]) for r in rows}), backend='sqlite')
+    conn.commit()
+    conn.close()
+
+
+def run_analyze(db_file, *flags):
+    env = dict(os.environ, IEET_DB_BACKEND='sqlite', IEET_DB_PATH=str(db_file), IEET_QUERY_PROFILE='0')
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'STscoreAnalyze.py'), *flags],
+                   cwd=os.path.dirname(db_file), env=env, check=True, capture_output=True)
+
+
+def results(db_file):
+    conn = sqlite3.connect(db_file)
+    analyze = sorted(conn.execute("SELECT 學年度, 學期, 課號, 分數區間, 人數, 平均分數, 學生總數 FROM STscoreAnalyze"))
+    profile = sorted(conn.execute("SELECT 學年度, 學期, 課號, 人數, 平均分數 FROM CourseScoreProfile"))
+    pending = conn.execute("SELECT COUNT(*) FROM STscoreChangeLog").fetchone()[0]
+    conn.close()
+    return analyze, profile, pending
+
+
+def test_incremental_with_integer_semester_columns_matches_full_run(tmp_path):
+    db_file = tmp_path / 'IEETdatabase.sqlite'
+    conn = sqlite3.connect(db_file)
+    conn.execute(STSCORE_DDL)
+    conn.execute(ANALYZE_DDL)
+    conn.commit()
+    ensure_changelog_table(conn, 'STscore', backend='sqlite')
+    conn.close()
+    insert_scores(db_file, score_rows(112, 1) + score_rows(112, 2))
+    run_analyze(db_file)
+
+    # 既有學期追加成績，增量重新計算
+    insert_scores(db_file, score_rows(112, 2, start=30, n=12), log=True)
+    run_analyze(db_file, '--incremental')
+    incremental = results(db_file)
+    assert incremental[2] == 0
+    assert {r[:2] for r in incremental[0]} == {('112', '1'), ('112', '2')}
+
+    full_file = tmp_path / 'full' / 'IEETdatabase.sqlite'
+    full_file.parent.mkdir()
+    shutil.copy(db_file, full_file)
+    run_analyze(full_file)
+    assert incremental == results(full_file)